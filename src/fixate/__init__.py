@@ -26,10 +26,15 @@ from fixate._switching import (
     PinValueAddressHandler as PinValueAddressHandler,
     MuxGroup as MuxGroup,
     JigDriver as JigDriver,
+    JigSnapshot as JigSnapshot,
+    SwitchingTrace as SwitchingTrace,
+    SwitchingTracer as SwitchingTracer,
     generate_pin_group as generate_pin_group,
     generate_relay_matrix_pin_list as generate_relay_matrix_pin_list,
 )
 
+from fixate._relay_wear import RelayWearLog as RelayWearLog
+
 from fixate.main import run_main_program as run
 
 __version__ = "0.6.3"
@@ -0,0 +1,107 @@
+"""
+Persistent relay actuation counts, to find relays that are wearing out.
+
+The VirtualAddressMap counts how many times each pin is switched on. When
+actuation counting is enabled with a RelayWearLog, those counts are added to
+a SQLite database periodically, keyed by a jig identity chosen by the test
+script (for example the jig serial number).
+
+The fxrelaywear command prints the most cycled relays from a database::
+
+    fxrelaywear relay_wear.db --jig JIG-0042 --top 20
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sqlite3
+from typing import Mapping, Optional, Sequence, Union
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS relay_actuations (
+    jig TEXT NOT NULL,
+    pin TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (jig, pin)
+)
+"""
+
+
+class RelayWearLog:
+    """
+    A SQLite database of the total number of actuations of each pin of a jig.
+
+    A new connection is made for each operation, so a RelayWearLog can be
+    used from any thread. Writes are expected to be infrequent and batched,
+    see VirtualAddressMap.enable_actuation_count.
+    """
+
+    def __init__(self, path: Union[str, os.PathLike[str]]):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+        conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    def add(self, jig: str, counts: Mapping[str, int]) -> None:
+        """Add counts to the total for each pin of jig, in a single transaction."""
+        rows = [(jig, pin, count) for pin, count in counts.items() if count]
+        if not rows:
+            return
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO relay_actuations (jig, pin, count) VALUES (?, ?, ?) "
+                "ON CONFLICT (jig, pin) DO UPDATE SET count = count + excluded.count",
+                rows,
+            )
+        conn.close()
+
+    def top(self, n: int = 10, jig: Optional[str] = None) -> list[tuple[str, str, int]]:
+        """Return the n most actuated pins as (jig, pin, count), optionally for one jig."""
+        query = "SELECT jig, pin, count FROM relay_actuations"
+        params: tuple[object, ...] = ()
+        if jig is not None:
+            query += " WHERE jig = ?"
+            params = (jig,)
+        query += " ORDER BY count DESC, jig, pin LIMIT ?"
+        with self._connect() as conn:
+            rows = conn.execute(query, params + (n,)).fetchall()
+        conn.close()
+        return [(str(j), str(pin), int(count)) for j, pin, count in rows]
+
+    def jigs(self) -> list[str]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT DISTINCT jig FROM relay_actuations ORDER BY jig"
+            ).fetchall()
+        conn.close()
+        return [str(jig) for jig, in rows]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="fxrelaywear", description="Report the most actuated relays of a jig"
+    )
+    parser.add_argument("database", help="SQLite file written by a RelayWearLog")
+    parser.add_argument("--jig", help="Only report this jig")
+    parser.add_argument("--top", "-n", type=int, default=10, metavar="N")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.database):
+        parser.error(f"{args.database} does not exist")
+
+    rows = RelayWearLog(args.database).top(args.top, args.jig)
+    if not rows:
+        print("No actuations recorded")
+        return
+    jig_width = max(len("Jig"), *(len(jig) for jig, _, _ in rows))
+    pin_width = max(len("Pin"), *(len(pin) for _, pin, _ in rows))
+    print(f"{'Jig':<{jig_width}}  {'Pin':<{pin_width}}  Actuations")
+    for jig, pin, count in rows:
+        print(f"{jig:<{jig_width}}  {pin:<{pin_width}}  {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -29,9 +29,21 @@ called on a mux, the mux determines which pin must be set or cleared
 
 from __future__ import annotations
 
+import hashlib
 import itertools
+import json
+import marshal
+import os
+import sys
+import threading
 import time
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
 from typing import (
+    Any,
+    cast,
     Generic,
     Optional,
     Callable,
@@ -43,11 +55,14 @@ from typing import (
     Dict,
     FrozenSet,
     Iterable,
+    Iterator,
 )
-from dataclasses import dataclass
-from functools import reduce
+from dataclasses import dataclass, field
+from functools import lru_cache, partial, reduce, _CacheInfo
 from operator import or_
 
+from fixate._relay_wear import RelayWearLog
+
 Signal = str
 Pin = str
 PinList = Sequence[Pin]
@@ -72,6 +87,8 @@ class PinUpdate:
     setup: PinSetState = PinSetState()
     final: PinSetState = PinSetState()
     minimum_change_time: float = 0.0
+    # Describes what created the update, for tracing. Not used for comparison.
+    source: str = field(default="", compare=False)
 
     def __or__(self, other: PinUpdate) -> PinUpdate:
         if isinstance(other, PinUpdate):
@@ -87,10 +104,56 @@ class PinUpdate:
 
 PinUpdateCallback = Callable[[PinUpdate, bool], None]
 
+# When a JigDriver is created in compiled mode, each pin is assigned a bit
+# index and pin sets are represented as python ints. The following mirror
+# PinSetState and PinUpdate, but are only used internally between the
+# VirtualMux and VirtualAddressMap.
+PinMask = int
+
+
+@dataclass(frozen=True)
+class PinMaskState:
+    off: PinMask = 0
+    on: PinMask = 0
+
+    def __or__(self, other: PinMaskState) -> PinMaskState:
+        if isinstance(other, PinMaskState):
+            return PinMaskState(self.off | other.off, self.on | other.on)
+        return NotImplemented
+
+
+@dataclass(frozen=True)
+class PinMaskUpdate:
+    setup: PinMaskState = PinMaskState()
+    final: PinMaskState = PinMaskState()
+    minimum_change_time: float = 0.0
+    source: str = field(default="", compare=False)
+
+    def __or__(self, other: PinMaskUpdate) -> PinMaskUpdate:
+        if isinstance(other, PinMaskUpdate):
+            return PinMaskUpdate(
+                setup=self.setup | other.setup,
+                final=self.final | other.final,
+                minimum_change_time=max(
+                    self.minimum_change_time, other.minimum_change_time
+                ),
+            )
+        return NotImplemented
+
+
+PinMaskUpdateCallback = Callable[[PinMaskUpdate, bool], None]
+
 
 class VirtualMux:
     pin_list: PinList = ()
     clearing_time: float = 0.0
+    # The update for each (old_signal, new_signal) pair is cached, since it
+    # normally only depends on the signal map. Subclasses with a stateful
+    # _calculate_pins should set this to 0 to disable the cache.
+    transition_cache_size: int = 256
+    # If set to a directory, the signal map built from map_tree is saved to
+    # disk and reloaded next time, which is faster for very large muxes.
+    map_tree_cache_dir: Optional[Union[str, os.PathLike[str]]] = None
 
     ###########################################################################
     # These methods are the public API for the class
@@ -112,6 +175,25 @@ class VirtualMux:
 
         self._state = ""
 
+        # Only set when the mux is part of a JigDriver in compiled mode. In
+        # that case updates are converted to integer masks before being sent.
+        self._compile_update: Optional[Callable[[PinUpdate], PinMaskUpdate]] = None
+        self._update_masks: Optional[PinMaskUpdateCallback] = None
+
+        # Returns the time at which the update just sent will be complete. The
+        # JigDriver replaces this, so that wait_at_least accounts for deferred settling.
+        self._settled_at: Callable[[], float] = time.monotonic
+
+        # Used by JigDriver.transaction(). While in a transaction, the update
+        # isn't sent until the transaction ends, and only the change from
+        # _transaction_origin to the final state is sent.
+        self._in_transaction = False
+        self._transaction_origin: Optional[Signal] = None
+
+        self._transition = lru_cache(maxsize=self.transition_cache_size)(
+            self._calculate_update
+        )
+
         self._signal_map: SignalMap = self._map_signals()
 
         # Define the implicit signal "" which can be used to turn off all pins.
@@ -157,10 +239,13 @@ class VirtualMux:
             name = self.__class__.__name__
             raise ValueError(f"Signal '{signal}' not valid for multiplexer '{name}'")
 
-        setup, final = self._calculate_pins(self._state, signal)
-        self._update_pins(PinUpdate(setup, final, self.clearing_time), trigger_update)
-        if signal != self._state:
-            self._last_update_time = time.monotonic()
+        if self._in_transaction:
+            if self._transaction_origin is None:
+                self._transaction_origin = self._state
+            self._state = signal
+            return
+
+        self._send_update(self._state, signal, trigger_update)
         self._state = signal
 
     def all_signals(self) -> tuple[Signal, ...]:
@@ -187,6 +272,15 @@ class VirtualMux:
         """
         return self._pin_set
 
+    def transition_cache_info(self) -> _CacheInfo:
+        """
+        Return the hits, misses, maxsize and currsize of the transition cache.
+
+        Every call to multiplex is either a hit or a miss. Once all the
+        transitions used in a loop have been seen, misses should stop increasing.
+        """
+        return self._transition.cache_info()
+
     ###########################################################################
     # The following methods are potential candidates to override in a subclass
 
@@ -208,6 +302,9 @@ class VirtualMux:
         old_signal isn't currently used, but it is provided in case a future
         subclass needs to it calculate the update. In particular, it could be
         useful for make-before-break behaviour.
+
+        The result is cached for each (old_signal, new_signal) pair. If an
+        override depends on anything else, set transition_cache_size = 0.
         """
         setup = PinSetState()
         on_pins = self._signal_map[new_signal]
@@ -218,6 +315,88 @@ class VirtualMux:
     # The following methods are intended as implementation detail and
     # subclasses should avoid overriding.
 
+    def _calculate_update(
+        self, old_signal: Signal, new_signal: Signal
+    ) -> Union[PinUpdate, PinMaskUpdate]:
+        """
+        Create the update sent when switching from old_signal to new_signal.
+
+        The result is memoised by multiplex, see transition_cache_size.
+        """
+        setup, final = self._calculate_pins(old_signal, new_signal)
+        source = f"{self.__class__.__name__}('{new_signal}')"
+        if in_both := (setup.on & setup.off) | (final.on & final.off):
+            raise ValueError(f"{source} turns the following pins on and off {in_both}")
+        update = PinUpdate(setup, final, self.clearing_time, source)
+        if self._compile_update is None:
+            return update
+        return self._compile_update(update)
+
+    def _send_update(
+        self, old_signal: Signal, new_signal: Signal, trigger_update: bool
+    ) -> None:
+        update = self._transition(old_signal, new_signal)
+        if isinstance(update, PinMaskUpdate):
+            assert self._update_masks is not None
+            self._update_masks(update, trigger_update)
+        else:
+            self._update_pins(update, trigger_update)
+        if new_signal != old_signal:
+            self._last_update_time = self._settled_at()
+
+    def _restore(self, signal: Signal) -> None:
+        """
+        Set the state to signal without sending an update.
+
+        Used by JigDriver.restore, which sends the pin changes for all muxes
+        as a single update.
+        """
+        if signal not in self._signal_map:
+            name = self.__class__.__name__
+            raise ValueError(f"Signal '{signal}' not valid for multiplexer '{name}'")
+        if signal != self._state:
+            self._state = signal
+            self._last_update_time = self._settled_at()
+
+    def _begin_transaction(self) -> bool:
+        """Start holding updates. Return False if already in a transaction."""
+        if self._in_transaction:
+            return False
+        self._in_transaction = True
+        self._transaction_origin = None
+        return True
+
+    def _commit_transaction(self) -> None:
+        """Send a single update from the state at the start of the transaction."""
+        self._in_transaction = False
+        origin, self._transaction_origin = self._transaction_origin, None
+        if origin is not None:
+            self._send_update(origin, self._state, trigger_update=False)
+
+    def _rollback_transaction(self) -> None:
+        """Discard the transaction, returning to the state at the start."""
+        self._in_transaction = False
+        origin, self._transaction_origin = self._transaction_origin, None
+        if origin is not None:
+            self._state = origin
+
+    def _transaction_savepoint(self) -> tuple[Signal, Optional[Signal]]:
+        """The state to return to if a (possibly nested) transaction raises."""
+        return self._state, self._transaction_origin
+
+    def _rollback_to(self, savepoint: tuple[Signal, Optional[Signal]]) -> None:
+        self._state, self._transaction_origin = savepoint
+
+    def _compile(
+        self,
+        compile_update: Callable[[PinUpdate], PinMaskUpdate],
+        update_masks: PinMaskUpdateCallback,
+    ) -> None:
+        """Send integer mask updates instead of PinUpdates. Used by the JigDriver."""
+        self._compile_update = compile_update
+        self._update_masks = update_masks
+        self._transition.cache_clear()
+
     def _map_signals(self) -> SignalMap:
         """
         Default implementation of the signal mapping
@@ -231,6 +410,8 @@ class VirtualMux:
         map_tree or map_list.
         """
         if hasattr(self, "map_tree"):
+            if self.map_tree_cache_dir is not None:
+                return self._map_tree_cached(self.map_tree, self.map_tree_cache_dir)
             return self._map_tree(self.map_tree, self.pin_list, fixed_pins=frozenset())
         elif hasattr(self, "map_list"):
             return {sig: frozenset(pins) for sig, *pins in self.map_list}
@@ -398,28 +579,75 @@ class VirtualMux:
             mux_c = TreeMap(("a3_c0", "a3_c1", "a3_c2", None), ("x4", "x5"))
             mux_b = TreeMap(("a1_b0", "a1_b1", "a1_b2", None), ("x2", "x3"))
             map_tree = TreeMap(("a0", mux_b, "a2", mux_c), ("x1", "x0"))
-        """
-        signal_map: SignalMap = dict()
 
-        bits_at_this_level = (len(tree) - 1).bit_length()
-        pins_at_this_level = pins[:bits_at_this_level]
+        Implementation:
+            The address of each signal is calculated as an integer, see
+            _tree_addresses, then each address is converted to a set of pins.
+            Addresses are converted by clearing the lowest set bit, so the set for
+            each address is built from an already converted address with one
+            less pin.
+        """
+        pin_sets: Dict[int, PinSet] = {0: fixed_pins}
+        single_pins = {1 << i: frozenset([pin]) for i, pin in enumerate(pins)}
+
+        def to_pin_set(address: int) -> PinSet:
+            if (pin_set := pin_sets.get(address)) is None:
+                lowest_bit = address & -address
+                pin_set = to_pin_set(address ^ lowest_bit) | single_pins[lowest_bit]
+                pin_sets[address] = pin_set
+            return pin_set
+
+        return {
+            signal: to_pin_set(address)
+            for signal, address in _tree_addresses(tree, len(pins)).items()
+        }
 
-        for signal_or_tree, pins_for_signal in zip(
-            tree, _generate_bit_sets(pins_at_this_level)
-        ):
-            if signal_or_tree is None:
-                continue
-            if isinstance(signal_or_tree, Signal):
-                signal_map[signal_or_tree] = frozenset(pins_for_signal) | fixed_pins
-            else:
-                signal_map.update(
-                    self._map_tree(
-                        tree=signal_or_tree,
-                        pins=pins[bits_at_this_level:],
-                        fixed_pins=frozenset(pins_for_signal) | fixed_pins,
-                    )
-                )
+    def _map_tree_cached(
+        self, tree: TreeDef, cache_dir: Union[str, os.PathLike[str]]
+    ) -> SignalMap:
+        """
+        As per _map_tree, but use a copy saved in cache_dir if there is one.
 
+        The file name is a hash of the pin_list and map_tree, so any change to
+        the mux definition results in a new file. marshal is used because it
+        is fast to load and the cache is local to this machine. The marshal
+        format can change between python versions, so that is included in
+        the hash.
+        """
+        try:
+            # A TreeDef can't be statically checked as marshallable. If it
+            # isn't, marshal raises a ValueError. Version 2 of the format is
+            # used for the key since later versions depend on reference counts,
+            # so the output isn't repeatable.
+            key = marshal.dumps(
+                (sys.version_info[:2], tuple(self.pin_list), cast(Any, tree)), 2
+            )
+        except ValueError:
+            # map_tree contains something marshal doesn't support, so we can't cache.
+            return self._map_tree(tree, self.pin_list, fixed_pins=frozenset())
+        path = os.path.join(cache_dir, f"{hashlib.sha256(key).hexdigest()}.marshal")
+
+        try:
+            with open(path, "rb") as f:
+                # loads of the whole file is much faster than marshal.load(f)
+                signal_map = marshal.loads(f.read())
+            if isinstance(signal_map, dict):
+                return signal_map
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+
+        signal_map = self._map_tree(tree, self.pin_list, fixed_pins=frozenset())
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            # write to a temporary file, so another process never sees a partial file
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(marshal.dumps(signal_map))
+            os.replace(tmp_path, path)
+        except OSError:
+            # The cache is only an optimisation. Not being able to write it
+            # shouldn't stop the jig from working.
+            pass
         return signal_map
 
     def __repr__(self) -> str:
@@ -518,12 +746,16 @@ class AddressHandler:
 
     Further, calling close() may "uninitialize" the driver. The
     next time set_pins is called, the handler will re-open hardware.
+
+    An AddressHandler can also have digital inputs, named by input_pins.
+    All the inputs of a handler are read in one operation by read_pins.
     """
 
-    def __init__(self, pins: Sequence[Pin]) -> None:
+    def __init__(self, pins: Sequence[Pin], input_pins: Sequence[Pin] = ()) -> None:
         # we convert the pin list to an immutable tuple, incase the
         # caller passing in a mutable sequence that gets modified...
         self.pin_list = tuple(pins)
+        self.input_pin_list = tuple(input_pins)
         if hasattr(self, "pin_defaults"):
             raise ValueError("'pin_defaults' should not be set on a AddressHandler")
 
@@ -539,6 +771,17 @@ class AddressHandler:
         """
         raise NotImplementedError
 
+    def read_pins(self) -> Collection[Pin]:
+        """
+        Called by the VirtualAddressMap to read the input pins.
+
+        Only called if the handler has input pins. If the underlying hardware
+        required for the IO isn't open, open it.
+
+        :return: the input pins that are active.
+        """
+        raise NotImplementedError
+
     def close(self) -> None:
         """
         Optional close method to clean-up resources.
@@ -552,47 +795,494 @@ class AddressHandler:
 class PinValueAddressHandler(AddressHandler):
     """Maps pins to bit values then combines the bit values for an update"""
 
-    def __init__(self, pins: Sequence[Pin]) -> None:
-        super().__init__(pins)
+    def __init__(self, pins: Sequence[Pin], input_pins: Sequence[Pin] = ()) -> None:
+        super().__init__(pins, input_pins)
         self._pin_lookup = {
             pin: bit for pin, bit in zip(self.pin_list, _bit_generator())
         }
+        self._input_lookup = {
+            pin: bit for pin, bit in zip(self.input_pin_list, _bit_generator())
+        }
 
     def set_pins(self, pins: Collection[Pin]) -> None:
         value = sum(self._pin_lookup[pin] for pin in pins)
         self._update_output(value)
 
+    def read_pins(self) -> Collection[Pin]:
+        value = self._read_input()
+        return [pin for pin, bit in self._input_lookup.items() if value & bit]
+
     def _update_output(self, value: int) -> None:
         bits = len(self.pin_list)
         print(f"0b{value:0{bits}b}")
 
+    def _read_input(self) -> int:
+        """Return the input value, with the first input pin as the LSB"""
+        raise NotImplementedError
+
+
+@dataclass
+class HandlerWriteTrace:
+    """A single call to AddressHandler.set_pins. Times are in seconds."""
+
+    handler: str
+    phase: str
+    start: float
+    duration: float
+
+
+@dataclass
+class SwitchingTrace:
+    """
+    A record of one update sent by the VirtualAddressMap to the AddressHandlers.
+
+    All times are time.monotonic() values, or durations in seconds. setup and
+    final hold the pins that actually changed in each phase. sources describe
+    the muxes and signals that were collated into the update.
+    """
+
+    start: float
+    sources: tuple[str, ...] = ()
+    setup: PinSetState = PinSetState()
+    final: PinSetState = PinSetState()
+    settle_start: float = 0.0
+    settle_time: float = 0.0
+    end: float = 0.0
+    handler_writes: list[HandlerWriteTrace] = field(default_factory=list)
+
+    def record_phase(
+        self,
+        phase: str,
+        virtual_map: VirtualAddressMap,
+        active: PinMask,
+        new_state: PinMaskState,
+        settle_start: float,
+    ) -> None:
+        new_active = (active | new_state.on) & ~new_state.off
+        changes = PinSetState(
+            off=virtual_map.mask_pins(active & ~new_active),
+            on=virtual_map.mask_pins(new_active & ~active),
+        )
+        if phase == "setup":
+            self.setup = changes
+        else:
+            self.final = changes
+            self.settle_start = settle_start
+            self.settle_time = time.monotonic() - settle_start
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "start": self.start,
+            "sources": list(self.sources),
+            "setup": {"off": sorted(self.setup.off), "on": sorted(self.setup.on)},
+            "final": {"off": sorted(self.final.off), "on": sorted(self.final.on)},
+            "settle_start": self.settle_start,
+            "settle_time": self.settle_time,
+            "end": self.end,
+            "handler_writes": [
+                {
+                    "handler": write.handler,
+                    "phase": write.phase,
+                    "start": write.start,
+                    "duration": write.duration,
+                }
+                for write in self.handler_writes
+            ],
+        }
+
+
+class SwitchingTracer:
+    """
+    Keeps the most recent SwitchingTrace records of a VirtualAddressMap.
+
+    Created by VirtualAddressMap.enable_trace(). The records can be saved as
+    JSON lines, or in the Chrome trace event format, which can be viewed with
+    chrome://tracing or https://ui.perfetto.dev
+    """
+
+    def __init__(self, max_records: int = 1000):
+        self._records: deque[SwitchingTrace] = deque(maxlen=max_records)
+
+    def add(self, record: SwitchingTrace) -> None:
+        self._records.append(record)
+
+    def records(self) -> list[SwitchingTrace]:
+        return list(self._records)
+
+    def clear(self) -> None:
+        self._records.clear()
+
+    def write_json_lines(self, path: Union[str, os.PathLike[str]]) -> None:
+        """Write one JSON object per record."""
+        with open(path, "w", encoding="utf-8") as f:
+            for record in self.records():
+                f.write(json.dumps(record.to_dict()) + "\n")
+
+    def write_chrome_trace(self, path: Union[str, os.PathLike[str]]) -> None:
+        """
+        Write the records in the Chrome trace event format.
+
+        Each update, settle time and handler write is a complete ("X") event.
+        Updates and settle times are shown on their own rows, and each handler
+        gets a separate row.
+        """
+        rows = {"update": 0, "settle": 1}
+        events: list[dict[str, Any]] = []
+
+        def add_event(name: str, row: str, start: float, duration: float) -> None:
+            events.append(
+                {
+                    "name": name,
+                    "ph": "X",
+                    "pid": 1,
+                    "tid": rows.setdefault(row, len(rows)),
+                    "ts": start * 1e6,
+                    "dur": duration * 1e6,
+                }
+            )
+
+        for record in self.records():
+            add_event(
+                ", ".join(record.sources) or "update",
+                "update",
+                record.start,
+                max(record.end - record.start, 0.0),
+            )
+            events[-1]["args"] = record.to_dict()
+            if record.settle_time:
+                add_event("settle", "settle", record.settle_start, record.settle_time)
+            for write in record.handler_writes:
+                add_event(write.phase, write.handler, write.start, write.duration)
+
+        events.extend(
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": 1,
+                "tid": tid,
+                "args": {"name": row},
+            }
+            for row, tid in rows.items()
+        )
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+@dataclass
+class _DeferredFinal:
+    """The final phase of an update, waiting for the settle time to pass"""
+
+    deadline: float
+    final: PinMaskState
+    settle_start: float
+    trace: Optional[SwitchingTrace]
+
+
+class _HandlerMask:
+    """
+    The bits of the active pin mask that belong to a single AddressHandler.
+
+    For a PinValueAddressHandler whose pins were allocated consecutive bits,
+    the handler value is just a shifted slice of the mask, so we can skip
+    converting back to pin names and write the value directly.
+
+    The last value written is kept, so that a handler is only written when
+    its own pins change. It starts as None, since we don't know the state of
+    the hardware until the first write.
+    """
+
+    def __init__(
+        self, handler: AddressHandler, pin_bits: Dict[Pin, PinMask], name: str
+    ):
+        self.handler = handler
+        self.name = name
+        bits = [pin_bits[pin] for pin in handler.pin_list]
+        self.mask: PinMask = reduce(or_, bits, 0)
+        self._bit_pins = {bit: pin for pin, bit in zip(handler.pin_list, bits)}
+        self.written: Optional[PinMask] = None
+
+        self._write_value: Optional[Callable[[int], None]] = None
+        self._shift = 0
+        if (
+            isinstance(handler, PinValueAddressHandler)
+            and type(handler).set_pins is PinValueAddressHandler.set_pins
+            and bits
+            and bits == [bits[0] << i for i in range(len(bits))]
+        ):
+            self._write_value = handler._update_output
+            self._shift = bits[0].bit_length() - 1
+
+    def needs_write(self, active: PinMask) -> bool:
+        """Return False if the handler's subset of active hasn't changed since the last write."""
+        return active & self.mask != self.written
+
+    def set_pins(self, active: PinMask) -> None:
+        """Write out the handler's subset of active."""
+        value = active & self.mask
+        # If the write raises, we can't be sure what state the hardware is in.
+        self.written = None
+        if self._write_value is not None:
+            self._write_value(value >> self._shift)
+        else:
+            self.handler.set_pins(_mask_to_pins(value, self._bit_pins))
+        self.written = value
+
+    def timed_set_pins(self, active: PinMask) -> tuple[float, float]:
+        """As per set_pins, and return the start time and duration of the write."""
+        start = time.monotonic()
+        self.set_pins(active)
+        return start, time.monotonic() - start
+
+
+class _HandlerInput:
+    """
+    The bits of the input pin mask that belong to a single AddressHandler.
+
+    As per _HandlerMask, a PinValueAddressHandler with consecutive input bits
+    is read as an integer and shifted into place.
+    """
+
+    def __init__(self, handler: AddressHandler, input_bits: Dict[Pin, PinMask]):
+        self.handler = handler
+        bits = [input_bits[pin] for pin in handler.input_pin_list]
+        self._pin_bits = dict(zip(handler.input_pin_list, bits))
+        self._mask: PinMask = reduce(or_, bits, 0)
+
+        self._read_value: Optional[Callable[[], int]] = None
+        self._shift = 0
+        if (
+            isinstance(handler, PinValueAddressHandler)
+            and type(handler).read_pins is PinValueAddressHandler.read_pins
+            and bits
+            and bits == [bits[0] << i for i in range(len(bits))]
+        ):
+            self._read_value = handler._read_input
+            self._shift = bits[0].bit_length() - 1
+
+    def read(self) -> PinMask:
+        if self._read_value is not None:
+            return (self._read_value() << self._shift) & self._mask
+        pin_bits = self._pin_bits
+        return reduce(or_, (pin_bits[pin] for pin in self.handler.read_pins()), 0)
+
+
+InputCallback = Callable[[Pin, bool], None]
+
 
 class VirtualAddressMap:
     """
     The supervisor loops through the attached virtual multiplexers each time a mux update is triggered.
+
+    Every pin is assigned a bit index when the map is created. Internally the
+    active pins and pending updates are integer masks, so collating updates and
+    working out what to send to each AddressHandler is a few bitwise operations.
+    Updates can be added as a PinUpdate, or as a PinMaskUpdate by a VirtualMux
+    that has been compiled by the JigDriver.
+
+    If concurrent_dispatch is True, when more than one AddressHandler needs
+    to be written in the same phase, the writes are done in parallel on a
+    thread pool. All writes complete before the next phase starts. This helps
+    when the handlers are I/O bound, but requires that each handler can be
+    written independently of the others from any thread.
+
+    If deferred_settle is True, an update with a minimum_change_time doesn't
+    block until the final phase is written. The setup phase is written and
+    the final phase is written from a timer thread once the change time has
+    elapsed. The next update, reset or wait_settled() will first wait for any
+    outstanding final phase. This allows a test script to do other work, like
+    configuring instruments, while relays settle. An error raised by a handler
+    on the timer thread is raised from the next call to the map that waits.
+
+    Input pins of all the handlers are read together, and the result is cached
+    for input_ttl seconds, so polling an input in a tight loop doesn't read the
+    hardware every time. Callbacks added with add_input_callback are called
+    when a read finds an input has changed. start_input_poller() reads the
+    inputs on a background thread, so the callbacks are called without the
+    test script needing to read.
     """
 
-    def __init__(self, handlers: Sequence[AddressHandler]):
+    def __init__(
+        self,
+        handlers: Sequence[AddressHandler],
+        concurrent_dispatch: bool = False,
+        deferred_settle: bool = False,
+        input_ttl: float = 0.0,
+    ):
+        # Allocate bits in handler order. If a pin is defined by more than one
+        # handler, it keeps the bit from the first handler.
+        self._pin_bits: Dict[Pin, PinMask] = {}
+        for pin in itertools.chain.from_iterable(h.pin_list for h in handlers):
+            if pin not in self._pin_bits:
+                self._pin_bits[pin] = 1 << len(self._pin_bits)
+        self._bit_pins = {bit: pin for pin, bit in self._pin_bits.items()}
+        self._all_pins: PinMask = (1 << len(self._pin_bits)) - 1
+
         # used to work out which pins get routed to which address handler
-        self._handler_pin_sets: list[tuple[PinSet, AddressHandler]] = []
-        for handler in handlers:
-            self._handler_pin_sets.append((frozenset(handler.pin_list), handler))
-        self._all_pins = frozenset(
-            itertools.chain.from_iterable(handler.pin_list for handler in handlers)
-        )
+        self._handler_masks = [
+            _HandlerMask(h, self._pin_bits, f"{i}:{type(h).__name__}")
+            for i, h in enumerate(handlers)
+        ]
 
         # a list of updates that haven't been sent to address handlers yet. This
         # allows a few mux changes to get updated at the same time.
-        self._pending_updates: list[PinUpdate] = []
-        self._active_pins: set[Pin] = set()
+        self._pending_updates: list[PinMaskUpdate] = []
+        # Pins of the exclusive muxes with a pending update, and whether any
+        # pending update could conflict with another. See add_update.
+        self._pending_exclusive: PinMask = 0
+        self._check_conflicts = False
+        self._active_pins: PinMask = 0
+
+        # Count of AddressHandler.set_pins calls made, and calls skipped because
+        # none of the handler's pins changed.
+        self.handler_writes = 0
+        self.suppressed_writes = 0
+
+        # The pool is created on first use, and shutdown by close()
+        self._concurrent_dispatch = concurrent_dispatch
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+        # Input pins get their own bits, separate to the output pins.
+        self._input_bits: Dict[Pin, PinMask] = {}
+        for pin in itertools.chain.from_iterable(h.input_pin_list for h in handlers):
+            if pin in self._input_bits:
+                raise ValueError(
+                    f"Input pin '{pin}' is defined by more than one AddressHandler"
+                )
+            self._input_bits[pin] = 1 << len(self._input_bits)
+        self._input_bit_pins = {bit: pin for pin, bit in self._input_bits.items()}
+        self._input_handlers = [
+            _HandlerInput(h, self._input_bits) for h in handlers if h.input_pin_list
+        ]
+        self.input_ttl = input_ttl
+        self._inputs: PinMask = 0
+        self._inputs_read_at = float("-inf")
+        self._input_lock = threading.Lock()
+        self._input_callbacks: list[tuple[PinMask, InputCallback]] = []
+        self._poller: Optional[threading.Thread] = None
+        self._poller_stop = threading.Event()
+        self._poller_error: Optional[BaseException] = None
+
+        # The deadline and final phase of an update that is waiting to settle.
+        # The lock serialises dispatch between the caller and the timer thread.
+        self._deferred_settle = deferred_settle
+        self._deferred_final: Optional[_DeferredFinal] = None
+        self._deferred_error: Optional[BaseException] = None
+        self._settle_timer: Optional[threading.Timer] = None
+        self._lock = threading.RLock()
+
+        # While > 0, trigger_update is ignored and updates are held until the
+        # outermost transaction ends.
+        self._transaction_depth = 0
+
+        self._tracer: Optional[SwitchingTracer] = None
+
+        # Masks of the pins switched on by each dispatch, waiting to be added
+        # to the per-pin totals. None when actuation counting isn't enabled.
+        # See enable_actuation_count.
+        self._switched_on: Optional[list[PinMask]] = None
+        self._actuations = array("Q", bytes(8 * len(self._pin_bits)))
+        self._flushed_actuations = array("Q", self._actuations)
+        self._wear_log: Optional[RelayWearLog] = None
+        self._wear_jig = ""
+        self._flush_interval = 0.0
+        self._flush_timer: Optional[threading.Timer] = None
+        self._flush_lock = threading.Lock()
+
+        # Set by close(). The handlers may reopen with the hardware in any
+        # state, so the next dispatch writes them even if no pins change.
+        self._handlers_closed = False
+
+    def add_update(
+        self,
+        pin_update: PinUpdate,
+        trigger_update: bool = True,
+        exclusive_pins: PinMask = 0,
+    ) -> None:
+        """
+        This method should be registered with each virtual mux to route pin changes.
 
-    def add_update(self, pin_update: PinUpdate, trigger_update: bool = True) -> None:
-        """This method should be registered with each virtual mux to route pin changes."""
+        exclusive_pins is an optimisation used by the JigDriver. It is the mask
+        of pins of a mux that shares no pins with any other mux. Updates from
+        such a mux can't conflict with other muxes, so the check for pins that
+        need to be both on and off is skipped when every pending update comes
+        from a different exclusive mux.
+        """
+        self.add_mask_update(
+            self.compile_update(pin_update), trigger_update, exclusive_pins
+        )
+
+    def add_mask_update(
+        self,
+        pin_update: PinMaskUpdate,
+        trigger_update: bool = True,
+        exclusive_pins: PinMask = 0,
+    ) -> None:
+        """As per add_update, for a VirtualMux that has been compiled by the JigDriver."""
         self._pending_updates.append(pin_update)
+        if exclusive_pins and not exclusive_pins & self._pending_exclusive:
+            self._pending_exclusive |= exclusive_pins
+        else:
+            self._check_conflicts = True
+
+        if trigger_update and self._transaction_depth == 0:
+            self._do_pending_updates()
 
-        if trigger_update:
+    def in_transaction(self) -> bool:
+        return self._transaction_depth > 0
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Hold all updates until the end of the with block, then send them together.
+
+        If the block raises, updates added within the block are discarded.
+        Transactions can be nested, in which case only the outermost sends
+        the updates.
+        """
+        start = len(self._pending_updates)
+        self._transaction_depth += 1
+        try:
+            yield
+        except BaseException:
+            del self._pending_updates[start:]
+            raise
+        finally:
+            self._transaction_depth -= 1
+        if self._transaction_depth == 0 and self._pending_updates:
             self._do_pending_updates()
 
+    def compile_update(self, pin_update: PinUpdate) -> PinMaskUpdate:
+        """Convert a PinUpdate to the equivalent PinMaskUpdate."""
+        return PinMaskUpdate(
+            setup=PinMaskState(
+                self.pin_mask(pin_update.setup.off), self.pin_mask(pin_update.setup.on)
+            ),
+            final=PinMaskState(
+                self.pin_mask(pin_update.final.off), self.pin_mask(pin_update.final.on)
+            ),
+            minimum_change_time=pin_update.minimum_change_time,
+            source=pin_update.source,
+        )
+
+    def pin_mask(self, pins: Collection[Pin]) -> PinMask:
+        """Convert a collection of pins to the integer mask used by this map."""
+        mask = 0
+        try:
+            for pin in pins:
+                mask |= self._pin_bits[pin]
+        except KeyError:
+            # check all pins actually have an address handler to send to
+            unknown_pins = sorted(set(pins) - self._pin_bits.keys())
+            raise ValueError(
+                f"Can't switch unknown pin(s) {', '.join(unknown_pins)}."
+            ) from None
+        return mask
+
+    def mask_pins(self, mask: PinMask) -> frozenset[Pin]:
+        """Convert an integer mask used by this map to the set of pins."""
+        return _mask_to_pins(mask, self._bit_pins)
+
     def _do_pending_updates(self) -> None:
         """
         Collate pending updates and send pins to respective address handlers.
@@ -605,37 +1295,374 @@ class VirtualAddressMap:
         5.  Do the setup phase
         6.  Wait the required change time
         7.  Do the final phase
+
+        With deferred_settle, 6 & 7 happen on a timer thread.
+        """
+        with self._lock:
+            # Any earlier update must be complete before this one starts.
+            self._complete_deferred_final()
+
+            trace = None
+            if self._tracer is not None:
+                trace = SwitchingTrace(
+                    start=time.monotonic(),
+                    sources=tuple(u.source for u in self._pending_updates if u.source),
+                )
+                self._tracer.add(trace)
+
+            collated = reduce(or_, self._pending_updates, PinMaskUpdate())
+            self._pending_updates = []
+            check_conflicts = self._check_conflicts
+            self._pending_exclusive = 0
+            self._check_conflicts = False
+
+            if check_conflicts:
+                if in_both := collated.setup.on & collated.setup.off:
+                    raise ValueError(
+                        f"The following pins need to be on and off {self.mask_pins(in_both)}"
+                    )
+
+                if in_both := collated.final.on & collated.final.off:
+                    raise ValueError(
+                        f"The following pins need to be on and off {self.mask_pins(in_both)}"
+                    )
+
+            self._dispatch_pin_state(collated.setup, trace, "setup")
+            if self._deferred_settle and collated.minimum_change_time > 0:
+                self._defer_final(collated, trace)
+            else:
+                settle_start = time.monotonic()
+                # Even sleep(0) takes significant time compared to the rest of
+                # the update, so skip it when not needed.
+                if collated.minimum_change_time > 0:
+                    time.sleep(collated.minimum_change_time)
+                self._dispatch_pin_state(collated.final, trace, "final", settle_start)
+
+    def _defer_final(
+        self, collated: PinMaskUpdate, trace: Optional[SwitchingTrace]
+    ) -> None:
+        now = time.monotonic()
+        deferred = _DeferredFinal(
+            now + collated.minimum_change_time, collated.final, now, trace
+        )
+        self._deferred_final = deferred
+        self._settle_timer = threading.Timer(
+            collated.minimum_change_time, self._settle_timer_expired, (deferred,)
+        )
+        self._settle_timer.daemon = True
+        self._settle_timer.start()
+
+    def _settle_timer_expired(self, deferred: _DeferredFinal) -> None:
+        with self._lock:
+            # If the caller has already completed this update, nothing to do.
+            if self._deferred_final is not deferred:
+                return
+            try:
+                self._complete_deferred_final()
+            except BaseException as e:
+                self._deferred_error = e
+
+    def _complete_deferred_final(self) -> None:
         """
-        collated = reduce(or_, self._pending_updates, PinUpdate())
-        self._pending_updates = []
+        Wait for the remaining settle time and write any deferred final phase.
 
-        if in_both := collated.setup.on & collated.setup.off:
-            raise ValueError(f"The following pins need to be on and off {in_both}")
+        If the final phase failed on the timer thread, raise that error here.
+        """
+        if self._deferred_error is not None:
+            error, self._deferred_error = self._deferred_error, None
+            raise error
+
+        if (deferred := self._deferred_final) is None:
+            return
+        self._deferred_final = None
+        if self._settle_timer is not None:
+            self._settle_timer.cancel()
+            self._settle_timer = None
+
+        remaining = deferred.deadline - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+        self._dispatch_pin_state(
+            deferred.final, deferred.trace, "final", deferred.settle_start
+        )
 
-        if in_both := collated.final.on & collated.final.off:
-            raise ValueError(f"The following pins need to be on and off {in_both}")
+    def wait_settled(self) -> None:
+        """
+        Block until any deferred final phase has been written.
 
-        self._dispatch_pin_state(collated.setup)
-        time.sleep(collated.minimum_change_time)
-        self._dispatch_pin_state(collated.final)
+        This only waits for the remaining settle time, so any work done since
+        the update was triggered overlaps with the settling.
+        """
+        with self._lock:
+            self._complete_deferred_final()
 
-    def _dispatch_pin_state(self, new_state: PinSetState) -> None:
-        # check all pins actually have an address handler to send to
-        if unknown_pins := (new_state.on | new_state.off) - self._all_pins:
-            raise ValueError(f"Can't switch unknown pin(s) {', '.join(unknown_pins)}.")
+    def settled_at(self) -> float:
+        """
+        Return the time.monotonic() value at which the last update is complete.
 
-        new_active_pins = (self._active_pins | new_state.on) - new_state.off
-        if new_active_pins != self._active_pins:
+        This is the current time if there is no deferred final phase outstanding.
+        """
+        now = time.monotonic()
+        if (deferred := self._deferred_final) is not None:
+            return max(now, deferred.deadline)
+        return now
+
+    def _dispatch_pin_state(
+        self,
+        new_state: PinMaskState,
+        trace: Optional[SwitchingTrace] = None,
+        phase: str = "",
+        settle_start: float = 0.0,
+    ) -> None:
+        """
+        Write the new state to the address handlers.
+
+        If trace is given, the pin changes and handler timing are recorded
+        in it for the given phase ("setup" or "final"). For the final phase,
+        settle_start is when the setup phase finished.
+        """
+        if trace is not None:
+            trace.record_phase(phase, self, self._active_pins, new_state, settle_start)
+
+        old_active_pins = self._active_pins
+        new_active_pins = (old_active_pins | new_state.on) & ~new_state.off
+        if new_active_pins != old_active_pins:
             self._active_pins = new_active_pins
-            for pin_set, handler in self._handler_pin_sets:
-                # Note that we might send an empty set here. We need to do that
-                # so if there are pins to clear, they get cleared. This might
-                # end up in redundant handler updates, but unless we track active_pins
-                # per-handler I don't think we can avoid that.
-                handler.set_pins(pin_set & self._active_pins)
+            if self._switched_on is not None:
+                self._switched_on.append(new_active_pins & ~old_active_pins)
+                if len(self._switched_on) >= _ACTUATION_BATCH:
+                    self._count_actuations()
+        if new_active_pins != old_active_pins or self._handlers_closed:
+            # Note that we might send an empty set here. We need to do that
+            # so if there are pins to clear, they get cleared. Handlers whose
+            # pins haven't changed are skipped.
+            to_write = [
+                handler_mask
+                for handler_mask in self._handler_masks
+                if handler_mask.needs_write(new_active_pins)
+            ]
+            self.handler_writes += len(to_write)
+            self.suppressed_writes += len(self._handler_masks) - len(to_write)
+
+            if self._concurrent_dispatch and len(to_write) > 1:
+                self._set_pins_concurrent(to_write, new_active_pins, trace, phase)
+            elif trace is None:
+                for handler_mask in to_write:
+                    handler_mask.set_pins(new_active_pins)
+            else:
+                for handler_mask in to_write:
+                    start, duration = handler_mask.timed_set_pins(new_active_pins)
+                    trace.handler_writes.append(
+                        HandlerWriteTrace(handler_mask.name, phase, start, duration)
+                    )
+            self._handlers_closed = False
+
+        if trace is not None and phase == "final":
+            trace.end = time.monotonic()
+
+    def _set_pins_concurrent(
+        self,
+        handler_masks: Sequence[_HandlerMask],
+        active: PinMask,
+        trace: Optional[SwitchingTrace] = None,
+        phase: str = "",
+    ) -> None:
+        """
+        Write each handler on the thread pool and wait for all to finish.
+
+        We always wait for every write to complete, even if one fails, so that
+        no write is still in progress when the exception is raised. If more
+        than one handler raised, the first (in handler order) is propagated.
+        """
+        executor = self._get_executor()
+        futures = [
+            executor.submit(handler_mask.timed_set_pins, active)
+            for handler_mask in handler_masks
+        ]
+        wait(futures)
+        for handler_mask, future in zip(handler_masks, futures):
+            start, duration = future.result()
+            if trace is not None:
+                trace.handler_writes.append(
+                    HandlerWriteTrace(handler_mask.name, phase, start, duration)
+                )
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=len(self._handler_masks),
+                    thread_name_prefix="VirtualAddressMap",
+                )
+            return self._executor
 
     def active_pins(self) -> frozenset[Pin]:
-        return frozenset(self._active_pins)
+        return self.mask_pins(self._active_pins)
+
+    def expected_pins(self) -> PinMask:
+        """The active pins once any deferred and pending updates are sent."""
+        with self._lock:
+            states = []
+            if self._deferred_final is not None:
+                states.append(self._deferred_final.final)
+            if self._pending_updates:
+                pending = reduce(or_, self._pending_updates)
+                states += [pending.setup, pending.final]
+            active = self._active_pins
+            for state in states:
+                active = (active | state.on) & ~state.off
+            return active
+
+    def restore_pins(self, pins: PinMask, minimum_change_time: float = 0.0) -> None:
+        """
+        Set the active pins to exactly pins, as a single update.
+
+        If minimum_change_time is given, pins that need to turn off are cleared
+        in the setup phase, and pins that need to turn on are set in the final
+        phase, after minimum_change_time. Otherwise all pins are changed in the
+        final phase. Any pending updates are discarded, since they are superseded.
+        """
+        with self._lock:
+            self._complete_deferred_final()
+            self._pending_updates = []
+            self._pending_exclusive = 0
+            self._check_conflicts = False
+
+            turn_off = self._active_pins & ~pins
+            turn_on = pins & ~self._active_pins
+            if turn_off and turn_on and minimum_change_time > 0:
+                update = PinMaskUpdate(
+                    setup=PinMaskState(off=turn_off),
+                    final=PinMaskState(on=turn_on),
+                    minimum_change_time=minimum_change_time,
+                    source="restore",
+                )
+            else:
+                update = PinMaskUpdate(
+                    final=PinMaskState(off=turn_off, on=turn_on), source="restore"
+                )
+            self._pending_updates.append(update)
+            self._do_pending_updates()
+
+    def enable_trace(self, max_records: int = 1000) -> SwitchingTracer:
+        """
+        Start recording a SwitchingTrace for each update sent to the handlers.
+
+        Only the most recent max_records are kept. When tracing isn't enabled
+        there is no overhead other than checking if it is enabled.
+        """
+        self._tracer = SwitchingTracer(max_records)
+        return self._tracer
+
+    def disable_trace(self) -> None:
+        self._tracer = None
+
+    def enable_actuation_count(
+        self,
+        wear_log: Optional[RelayWearLog] = None,
+        jig: str = "",
+        flush_interval: float = 300.0,
+    ) -> None:
+        """
+        Start counting the number of times each pin is switched on.
+
+        If wear_log is given, the counts are added to it for jig every
+        flush_interval seconds, and when the VirtualAddressMap is closed.
+        Switching only records a mask of the pins that turned on; the masks
+        are added to the per-pin totals in batches.
+        """
+        with self._lock:
+            if self._switched_on is None:
+                self._switched_on = []
+            self._wear_log = wear_log
+            self._wear_jig = jig
+            self._flush_interval = flush_interval
+            if wear_log is not None:
+                self._schedule_flush()
+
+    def actuation_counts(self) -> dict[Pin, int]:
+        """Number of times each pin has been switched on since counting was enabled."""
+        with self._lock:
+            self._count_actuations()
+            return {
+                self._bit_pins[1 << i]: count
+                for i, count in enumerate(self._actuations)
+                if count
+            }
+
+    def flush_actuations(self) -> None:
+        """Add the actuations since the last flush to the RelayWearLog."""
+        if self._wear_log is None:
+            return
+        with self._flush_lock:
+            with self._lock:
+                self._count_actuations()
+                totals = array("Q", self._actuations)
+            counts = {
+                self._bit_pins[1 << i]: total - flushed
+                for i, (total, flushed) in enumerate(
+                    zip(totals, self._flushed_actuations)
+                )
+                if total != flushed
+            }
+            # Only mark the counts as flushed once they are safely stored
+            self._wear_log.add(self._wear_jig, counts)
+            self._flushed_actuations = totals
+
+    def _count_actuations(self) -> None:
+        """Add the recorded masks to the per-pin totals. Must hold the lock."""
+        if not self._switched_on:
+            return
+        actuations = self._actuations
+        for mask in self._switched_on:
+            while mask:
+                low_bit = mask & -mask
+                actuations[low_bit.bit_length() - 1] += 1
+                mask ^= low_bit
+        self._switched_on.clear()
+
+    def _schedule_flush(self) -> None:
+        """Must hold the lock, so close() can't miss the new timer."""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+        self._flush_timer = threading.Timer(
+            self._flush_interval, self._flush_timer_expired
+        )
+        self._flush_timer.daemon = True
+        self._flush_timer.start()
+
+    def _flush_timer_expired(self) -> None:
+        try:
+            self.flush_actuations()
+        finally:
+            # close() clears the timer to stop any more flushes
+            with self._lock:
+                if self._flush_timer is not None:
+                    self._schedule_flush()
+
+    def close(self) -> None:
+        """
+        Complete any deferred final phase and shutdown the dispatch thread pool,
+        if one was started. Actuation counts are flushed to the RelayWearLog.
+        """
+        try:
+            self.stop_input_poller()
+            self.wait_settled()
+            with self._lock:
+                if self._flush_timer is not None:
+                    self._flush_timer.cancel()
+                    self._flush_timer = None
+            self.flush_actuations()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+            self._executor = None
+            with self._lock:
+                # The JigDriver closes the handlers, and they may reopen with
+                # the hardware in any state, so the next update writes them all.
+                for handler_mask in self._handler_masks:
+                    handler_mask.written = None
+                self._handlers_closed = True
 
     def reset(self) -> None:
         """
@@ -645,14 +1672,115 @@ class VirtualAddressMap:
         possible the state of each VirtualMux and its related pins will not
         be in sync.
         """
-        self._dispatch_pin_state(PinSetState(off=self._all_pins))
+        with self._lock:
+            self._complete_deferred_final()
+            self._dispatch_pin_state(PinMaskState(off=self._all_pins))
 
     def update_input(self) -> None:
+        """Read all the input pins from the AddressHandlers, ignoring the cache."""
+        self._read_inputs(max_age=0.0)
+
+    def read_input(self, pin: Pin, max_age: Optional[float] = None) -> bool:
         """
-        Currently not implemented. A few jigs implement digital input, but not many. It is the intention
-        to implement this eventually, but for now, the old jig_mapping.py version can be used.
+        Return True if the input pin is active.
+
+        The inputs are read from the AddressHandlers if the cached value is
+        older than max_age seconds. max_age defaults to input_ttl.
         """
-        raise NotImplementedError
+        try:
+            bit = self._input_bits[pin]
+        except KeyError:
+            raise ValueError(f"Can't read unknown input pin '{pin}'") from None
+        return bool(self._read_inputs(max_age) & bit)
+
+    def active_inputs(self, max_age: Optional[float] = None) -> frozenset[Pin]:
+        """Return the active input pins. See read_input for max_age."""
+        return _mask_to_pins(self._read_inputs(max_age), self._input_bit_pins)
+
+    def add_input_callback(
+        self, callback: InputCallback, pins: Optional[Collection[Pin]] = None
+    ) -> None:
+        """
+        Call callback(pin, value) when a read finds that an input has changed.
+
+        If pins is given, only changes of those pins are reported. Callbacks are
+        called from the thread that read the inputs, which will be the poller
+        thread if start_input_poller() has been called.
+        """
+        if pins is None:
+            mask = reduce(or_, self._input_bits.values(), 0)
+        else:
+            unknown = set(pins) - self._input_bits.keys()
+            if unknown:
+                raise ValueError(f"Can't watch unknown input pin(s) {sorted(unknown)}")
+            mask = reduce(or_, (self._input_bits[pin] for pin in pins), 0)
+        self._input_callbacks.append((mask, callback))
+
+    def start_input_poller(self, interval: float) -> None:
+        """Read the inputs every interval seconds on a background thread."""
+        self.stop_input_poller()
+        self._poller_stop = threading.Event()
+        self._poller = threading.Thread(
+            target=self._poll_inputs,
+            args=(interval, self._poller_stop),
+            name="VirtualAddressMap-input-poller",
+            daemon=True,
+        )
+        self._poller.start()
+
+    def stop_input_poller(self) -> None:
+        if self._poller is not None:
+            self._poller_stop.set()
+            self._poller.join()
+            self._poller = None
+
+    def _poll_inputs(self, interval: float, stop: threading.Event) -> None:
+        while not stop.wait(interval):
+            try:
+                self._read_inputs(max_age=0.0)
+            except BaseException as e:
+                # Raised from the next read by the test script
+                self._poller_error = e
+                return
+
+    def _read_inputs(self, max_age: Optional[float]) -> PinMask:
+        if self._poller_error is not None:
+            error, self._poller_error = self._poller_error, None
+            raise error
+        if max_age is None:
+            max_age = self.input_ttl
+
+        with self._input_lock:
+            now = time.monotonic()
+            if now - self._inputs_read_at < max_age:
+                return self._inputs
+
+            if self._concurrent_dispatch and len(self._input_handlers) > 1:
+                executor = self._get_executor()
+                futures = [executor.submit(h.read) for h in self._input_handlers]
+                wait(futures)
+                new_inputs = reduce(or_, (f.result() for f in futures), 0)
+            else:
+                new_inputs = 0
+                for handler_input in self._input_handlers:
+                    new_inputs |= handler_input.read()
+
+            # There is nothing to compare against on the first read
+            first_read = self._inputs_read_at == float("-inf")
+            changed = self._inputs ^ new_inputs
+            self._inputs = new_inputs
+            self._inputs_read_at = now
+
+        if changed and not first_read:
+            for mask, callback in self._input_callbacks:
+                bits = changed & mask
+                while bits:
+                    lowest_bit = bits & -bits
+                    callback(
+                        self._input_bit_pins[lowest_bit], bool(new_inputs & lowest_bit)
+                    )
+                    bits ^= lowest_bit
+        return new_inputs
 
 
 class MuxGroup:
@@ -687,39 +1815,198 @@ class MuxGroup:
 JigSpecificMuxGroup = TypeVar("JigSpecificMuxGroup", bound=MuxGroup)
 
 
+@dataclass(frozen=True)
+class JigSnapshot:
+    """The signal of every mux and the active pins of a JigDriver. See JigDriver.snapshot"""
+
+    signals: tuple[tuple[VirtualMux, Signal], ...]
+    active_pins: frozenset[Pin]
+
+
 class JigDriver(Generic[JigSpecificMuxGroup]):
     """
     Combine multiple VirtualMux's and multiple AddressHandler's.
 
     The jig driver joins muxes to handlers by matching up pin definitions.
+
+    If compiled is True, each VirtualMux is compiled against the pin bit
+    indexes of the VirtualAddressMap, so that the updates sent from a mux are
+    integer masks rather than sets of pin names. This is faster for jigs with
+    many pins, but means that replacing the `_update_pins` callback on a mux
+    will have no effect.
+
+    If concurrent_dispatch is True, AddressHandlers that need updating at the
+    same time are written in parallel. See VirtualAddressMap.
+
+    If deferred_settle is True, switching returns without waiting for the
+    clearing_time of the muxes. Use wait_settled() before a measurement that
+    depends on the new signals being connected. See VirtualAddressMap.
+
+    Signals can be switched by name alone with route(), without needing to
+    know which mux defines them.
+
+    Input pins are read with read_input(). Reads are cached for input_ttl
+    seconds. See VirtualAddressMap for input callbacks and polling.
     """
 
     def __init__(
         self,
         mux_group_factory: Callable[[], JigSpecificMuxGroup],
         handlers: Sequence[AddressHandler],
+        compiled: bool = False,
+        concurrent_dispatch: bool = False,
+        deferred_settle: bool = False,
+        input_ttl: float = 0.0,
     ):
         # keep a reference to handlers so that we can close them if required.
         self._handlers = handlers
-        self.virtual_map = VirtualAddressMap(handlers)
+        self.virtual_map = VirtualAddressMap(
+            handlers, concurrent_dispatch, deferred_settle, input_ttl
+        )
 
         self.mux = mux_group_factory()
+        for mux in self.mux.get_multiplexers():
+            mux._settled_at = self.virtual_map.settled_at
+
+        self._validate()
+
         for mux in self.mux.get_multiplexers():
             # Perhaps we should instantiate the virtual mux here
             # and pass in the virtual_map.add_update. But we'd have to do some
             # magic in the MuxGroup call to pass add_update to each VirtualMux
             # constructor, and I was hoping to just use a dataclass...
-            mux._update_pins = self.virtual_map.add_update
-
-        self._validate()
+            # Muxes that share no pins with another mux don't need their
+            # updates checked for conflicts. See VirtualAddressMap.add_update
+            exclusive_pins = 0
+            if not mux.pins() & self._shared_pins.keys():
+                exclusive_pins = self.virtual_map.pin_mask(mux.pins())
+            mux._update_pins = partial(
+                self.virtual_map.add_update, exclusive_pins=exclusive_pins
+            )
+            if compiled:
+                mux._compile(
+                    self.virtual_map.compile_update,
+                    partial(
+                        self.virtual_map.add_mask_update, exclusive_pins=exclusive_pins
+                    ),
+                )
 
     def close(self) -> None:
-        for handler in self._handlers:
-            handler.close()
+        try:
+            self.virtual_map.close()
+        finally:
+            for handler in self._handlers:
+                handler.close()
 
     def active_pins(self) -> frozenset[Pin]:
         return self.virtual_map.active_pins()
 
+    def read_input(self, pin: Pin, max_age: Optional[float] = None) -> bool:
+        return self.virtual_map.read_input(pin, max_age)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Group switching into a single update::
+
+            with jig.transaction():
+                jig.mux.mux_one("sig1")
+                jig.mux.mux_two("sig5")
+                jig.mux.mux_one("sig2")
+
+        Nothing is switched until the with block exits. Then each mux that was
+        changed sends one update, from its signal at the start of the block to
+        its final signal, and all the updates are collated and sent to the
+        AddressHandlers together. In the example above, mux_one never connects
+        sig1. debug_set_pin(s) calls in the block are also held.
+
+        If the block raises, nothing is switched and each mux returns to the
+        signal it had at the start of the block. For a nested transaction, the
+        outer transaction keeps the changes made before the inner block.
+        """
+        multiplexers = self.mux.get_multiplexers()
+        muxes = [mux for mux in multiplexers if mux._begin_transaction()]
+        # Taken at every level, so a nested transaction that raises is rolled
+        # back even if the outer transaction goes on to commit.
+        savepoints = [(mux, mux._transaction_savepoint()) for mux in multiplexers]
+        with self.virtual_map.transaction():
+            try:
+                yield
+            except BaseException:
+                for mux, savepoint in savepoints:
+                    mux._rollback_to(savepoint)
+                for mux in muxes:
+                    mux._rollback_transaction()
+                raise
+            for mux in muxes:
+                mux._commit_transaction()
+
+    def snapshot(self) -> JigSnapshot:
+        """
+        Capture the signal of each mux and the active pins, to restore later.
+
+        Any pending updates (from trigger_update=False) are included as if
+        they had been sent. Can't be used inside a transaction, where the
+        signals of the muxes are ahead of the pins.
+        """
+        if self.virtual_map.in_transaction():
+            raise RuntimeError("Can't take a snapshot inside a transaction")
+        signals = tuple((mux, mux._state) for mux in self.mux.get_multiplexers())
+        active = self.virtual_map.mask_pins(self.virtual_map.expected_pins())
+        return JigSnapshot(signals, active)
+
+    def restore(self, snapshot: JigSnapshot) -> None:
+        """
+        Return every mux and pin to the state captured by snapshot().
+
+        Only pins that differ from the snapshot are switched, in a single
+        update. Pins to turn off are cleared first, then after the longest
+        clearing_time of the muxes that changed, pins to turn on are set.
+        """
+        if self.virtual_map.in_transaction():
+            raise RuntimeError("Can't restore a snapshot inside a transaction")
+
+        clearing_time = max(
+            (
+                mux.clearing_time
+                for mux, signal in snapshot.signals
+                if mux._state != signal
+            ),
+            default=0.0,
+        )
+        self.virtual_map.restore_pins(
+            self.virtual_map.pin_mask(snapshot.active_pins), clearing_time
+        )
+        for mux, signal in snapshot.signals:
+            mux._restore(signal)
+
+    @contextmanager
+    def preserve_state(self) -> Iterator[JigSnapshot]:
+        """
+        Restore the jig to its current state at the end of the with block::
+
+            with jig.preserve_state():
+                jig.mux.mux_one("sig1")
+                measure()
+
+        This can be nested. The jig is restored even if the block raises.
+        It can contain a transaction, but can't be used inside one.
+        """
+        snapshot = self.snapshot()
+        try:
+            yield snapshot
+        finally:
+            self.restore(snapshot)
+
+    def wait_settled(self) -> None:
+        """
+        Block until all switching is complete.
+
+        Only required when the JigDriver was created with deferred_settle=True,
+        otherwise switching is always complete when multiplex returns.
+        """
+        self.virtual_map.wait_settled()
+
     def debug_set_pin(self, pin: Pin, value: bool) -> None:
         # pin is a str, which is iterable... so we can't just throw it into
         # frozen set, or we end up with frozenset deconstructing it! so
@@ -739,6 +2026,44 @@ class JigDriver(Generic[JigSpecificMuxGroup]):
     def all_mux_signals(self) -> tuple[tuple[VirtualMux, tuple[Signal, ...]], ...]:
         return tuple(((mux, mux.all_signals()) for mux in self.mux.get_multiplexers()))
 
+    def route(self, signal: Signal, trigger_update: bool = True) -> None:
+        """
+        Switch signal on the mux that defines it.
+
+        jig.route("5V_RAIL") is the same as jig.mux.<mux_name>("5V_RAIL"), where
+        <mux_name> is the only mux with a signal called "5V_RAIL". A ValueError is
+        raised if no mux, or more than one mux, defines the signal. The empty
+        signal "" is defined by every mux, so it can't be routed.
+        """
+        try:
+            mux = self._signal_routes[signal]
+        except KeyError:
+            if muxes := self._ambiguous_signals.get(signal):
+                names = ", ".join(mux.__class__.__name__ for mux in muxes)
+                raise ValueError(
+                    f"Signal '{signal}' is ambiguous, it is defined by: {names}"
+                ) from None
+            raise ValueError(f"Signal '{signal}' is not defined by any mux") from None
+        mux.multiplex(signal, trigger_update)
+
+    def shared_pins(self) -> dict[Pin, tuple[VirtualMux, ...]]:
+        """
+        Pins used by more than one mux, and the muxes using them.
+
+        Switching muxes that share a pin at the same time can require the pin
+        to be both on and off, which raises a ValueError when the update is
+        sent. Found when the JigDriver is created.
+        """
+        return dict(self._shared_pins)
+
+    def ambiguous_signals(self) -> dict[Signal, tuple[VirtualMux, ...]]:
+        """
+        Signals that are defined by more than one mux, and the muxes defining them.
+
+        These can't be switched with route(). Found when the JigDriver is created.
+        """
+        return dict(self._ambiguous_signals)
+
     def reset(self) -> None:
         """
         Reset all VirtualMux's to the default signal "" (all pins off)
@@ -751,6 +2076,9 @@ class JigDriver(Generic[JigSpecificMuxGroup]):
 
         - Ensure all pins that are used in muxes are defined by
           some address handler.
+        - Build the signal index used by route(), and record any
+          signals defined by more than one mux as ambiguous.
+        - Record pins that are shared by more than one mux.
 
         Note: It is O.K. for there to be AddressHandler pins that
             are not used anywhere. Eventually we might choose to
@@ -760,31 +2088,88 @@ class JigDriver(Generic[JigSpecificMuxGroup]):
             or_, (set(handler.pin_list) for handler in self._handlers), set()
         )
         mux_missing_pins = []
+        signal_muxes: dict[Signal, list[VirtualMux]] = {}
+        pin_muxes: dict[Pin, list[VirtualMux]] = {}
 
         for mux in self.mux.get_multiplexers():
             if unknown_pins := mux.pins() - all_handler_pins:
                 mux_missing_pins.append((mux, unknown_pins))
+            for pin in mux.pins():
+                pin_muxes.setdefault(pin, []).append(mux)
+            for signal in mux.all_signals():
+                if signal:
+                    signal_muxes.setdefault(signal, []).append(mux)
 
         if mux_missing_pins:
             raise ValueError(
                 f"One or more VirtualMux uses unknown pins:\n{mux_missing_pins}"
             )
 
+        self._signal_routes = {
+            signal: muxes[0]
+            for signal, muxes in signal_muxes.items()
+            if len(muxes) == 1
+        }
+        self._ambiguous_signals = {
+            signal: tuple(muxes)
+            for signal, muxes in signal_muxes.items()
+            if len(muxes) > 1
+        }
+        self._shared_pins = {
+            pin: tuple(muxes) for pin, muxes in pin_muxes.items() if len(muxes) > 1
+        }
+
+
+# Number of switched on masks held by the VirtualAddressMap before they are
+# added to the per-pin actuation totals. Bounds memory use between flushes.
+_ACTUATION_BATCH = 4096
 
-_T = TypeVar("_T")
 
+def _tree_addresses(
+    tree: TreeDef, pin_count: int, shift: int = 0, base: int = 0
+) -> Dict[Signal, int]:
+    """
+    Calculate the address of each signal in a map_tree, in O(signals x depth).
+
+    Bit n of the address corresponds to pin n of the pin_list. Each level of
+    the tree uses enough bits to address all its entries, starting from shift.
+    Entries that would need more than pin_count pins are ignored, as are None
+    entries.
 
-def _generate_bit_sets(bits: Sequence[_T]) -> Generator[set[_T], None, None]:
+    _tree_addresses(("a", "b", ("c", "d")), 3) -> {"a": 0, "b": 1, "c": 2, "d": 6}
     """
-    Create subsets of bits, representing bits of a list of integers
+    addresses: Dict[Signal, int] = {}
+    bits_at_this_level = (len(tree) - 1).bit_length()
+    pins_at_this_level = min(bits_at_this_level, pin_count - shift)
+    entries = 1 << pins_at_this_level if pins_at_this_level > 0 else 0
+
+    for index, signal_or_tree in enumerate(tree[:entries]):
+        if signal_or_tree is None:
+            continue
+        address = base | (index << shift)
+        if isinstance(signal_or_tree, Signal):
+            addresses[signal_or_tree] = address
+        else:
+            addresses.update(
+                _tree_addresses(
+                    signal_or_tree, pin_count, shift + bits_at_this_level, address
+                )
+            )
+    return addresses
 
-    This is easier to explain with an example
-    list(generate_bit_set(["x0", "x1"])) -> [set(), {'x0'}, {'x1'}, {'x0', 'x1'}]
+
+def _mask_to_pins(mask: PinMask, bit_pins: Dict[PinMask, Pin]) -> frozenset[Pin]:
     """
-    int_list = range(1 << len(bits)) if len(bits) != 0 else range(0)
-    return (
-        {bit for i, bit in enumerate(bits) if (1 << i) & index} for index in int_list
-    )
+    Convert an integer mask to a set of pins, using a map of single bit values to pins.
+
+    Only the set bits are visited, so this is cheap for sparse masks.
+    """
+    pins = []
+    while mask:
+        lowest_bit = mask & -mask
+        pins.append(bit_pins[lowest_bit])
+        mask ^= lowest_bit
+    return frozenset(pins)
 
 
 def _bit_generator() -> Generator[int, None, None]:
@@ -23,6 +23,8 @@ import re
 import platformdirs
 from pathlib import Path
 import logging
+import threading
+import contextlib
 
 logger = logging.getLogger(__name__)
 
@@ -35,6 +37,33 @@ COMPUTERNAME = platform.node()  # Computer name, or empty string if unavailable.
 INSTRUMENTS = []
 RESOURCES = {}
 
+# The sequencer of the UUT slot being run by the current thread. See use_sequencer.
+_thread_resources = threading.local()
+
+
+def current_sequencer():
+    """
+    The sequencer running in this thread, for checks, reports and user requests.
+    This is the slot's sequencer in a ParallelSequencer thread, otherwise RESOURCES["SEQUENCER"],
+    or None if no sequencer has been created.
+    """
+    sequencer = getattr(_thread_resources, "sequencer", None)
+    if sequencer is None:
+        return RESOURCES.get("SEQUENCER")
+    return sequencer
+
+
+@contextlib.contextmanager
+def use_sequencer(sequencer):
+    """Make sequencer the current_sequencer() of this thread within the with block"""
+    previous = getattr(_thread_resources, "sequencer", None)
+    _thread_resources.sequencer = sequencer
+    try:
+        yield sequencer
+    finally:
+        _thread_resources.sequencer = previous
+
+
 DEBUG = False
 
 # Begin default "plugins"
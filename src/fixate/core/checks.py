@@ -85,7 +85,7 @@ class _CheckClass:
 def _message_parse(target: Callable[[_CheckClass], bool], **kwargs) -> bool:
     chk = _CheckClass(target=target, **kwargs)
     chkresult = chk.get_result()
-    return fixate.config.RESOURCES["SEQUENCER"].check(chkresult)
+    return fixate.config.current_sequencer().check(chkresult)
 
 
 def _format_range(chk: _CheckClass) -> str:
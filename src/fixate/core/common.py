@@ -325,6 +325,16 @@ def deprecated(func):
     return inner
 
 
+# How long the set_up of a TestList or TestClass lasts before tear_down is called.
+# "test": around every test (and every attempt of a TestClass). This is the default.
+# "list": set up before the first test run in a TestList, torn down when the list exits.
+# "sequence": set up before the first test run in a TestList, torn down when the sequence ends.
+# For a TestClass, "list" and "sequence" both keep the set_up across retries of a test
+# that failed a check. If a test raises an exception instead, the scoped set_up of the
+# test and of the lists containing it are torn down and set up again before the retry.
+FIXTURE_SCOPES = ("test", "list", "sequence")
+
+
 # The first line of the doc string will be reflected in the test logs. Please don't change.
 class TestList:
     """
@@ -333,6 +343,8 @@ class TestList:
     They operate similar to a python list except that it has additional methods that can be overridden to provide additional functionality
     """
 
+    fixture_scope = "test"
+
     def __init__(self, seq=None):
         self.tests = []
         if seq is None:
@@ -421,6 +433,7 @@ class TestClass:
     skip_exceptions = []
     abort_exceptions = [KeyboardInterrupt, AttributeError, NameError]
     skip_on_fail = False
+    fixture_scope = "test"
 
     def __init__(self, skip=False):
         self.skip = skip
@@ -0,0 +1,293 @@
+"""
+Run jig definitions written for fixate.core.jig_mapping on the switching engine
+in fixate._switching.
+
+Existing VirtualMux and AddressHandler definitions (map_tree, map_list,
+map_shifted, shift_nested, custom clear_callback etc.) are used as they are.
+Only the JigDriver import needs to change::
+
+    from fixate.core.jig_mapping import VirtualMux, AddressHandler
+    from fixate.core.jig_mapping_compat import JigDriver
+
+    class Jig123(JigDriver):
+        multiplexers = (MuxOne(), MuxTwo())
+        address_handlers = (Handler(),)
+
+The legacy muxes still calculate their own addresses, but the bit for each pin
+is looked up in a dict rather than searched for in a list, the pin values for
+each signal are only calculated once, and updates are collated and written by
+fixate._switching.VirtualAddressMap. Only handlers whose pins change are
+written.
+"""
+from __future__ import annotations
+
+import warnings
+from typing import Any, Callable, Iterable, Iterator, Optional, Sequence
+
+from fixate._switching import (
+    PinMaskState,
+    PinMaskUpdate,
+    PinValueAddressHandler,
+    VirtualAddressMap as _VirtualAddressMap,
+)
+from fixate.core.jig_mapping import (
+    AddressHandler,
+    JigMeta,
+    MuxWarning,
+    VirtualMux,
+)
+
+
+class _LegacyHandler(PinValueAddressHandler):
+    """Adapt a jig_mapping.AddressHandler to the fixate._switching interface"""
+
+    def __init__(self, handler: AddressHandler):
+        super().__init__(handler.pin_list)
+        self.legacy_handler = handler
+
+    def _update_output(self, value: int) -> None:
+        self.legacy_handler.update_output(value)
+
+
+class _PinValues(tuple):
+    """
+    The (index, value) pairs of a legacy mux update, along with the equivalent
+    on and off pin masks, so the masks only need to be calculated once.
+    """
+
+    on: int
+    off: int
+
+    def __new__(cls, values: Iterable[tuple[int, bool]]) -> _PinValues:
+        self = super().__new__(cls, values)
+        self.on = sum(1 << index for index, value in self if value)
+        self.off = sum(1 << index for index, value in self if not value)
+        return self
+
+
+def _pin_values_masks(values: Iterable[tuple[int, bool]]) -> tuple[int, int]:
+    if not isinstance(values, _PinValues):
+        values = _PinValues(values)
+    return values.on, values.off
+
+
+class VirtualAddressMap:
+    """
+    Provides the interface of jig_mapping.VirtualAddressMap on top of
+    fixate._switching.VirtualAddressMap, which is available as `engine`.
+
+    Pin indexes used by the legacy muxes are the bit indexes of the engine.
+    """
+
+    def __init__(self, address_handlers: Sequence[AddressHandler]):
+        self.address_handlers = []
+        self.virtual_pin_list: list[str] = []
+        seen: set[str] = set()
+        for handler in address_handlers:
+            if common_elements := seen.intersection(handler.pin_list):
+                raise ValueError(
+                    "Duplicate pin identifiers not allowed\n{}".format(
+                        ", ".join(common_elements)
+                    )
+                )
+            seen.update(handler.pin_list)
+            self.virtual_pin_list.extend(handler.pin_list)
+            self.address_handlers.append((len(self.virtual_pin_list), handler))
+
+        self.engine = _VirtualAddressMap(
+            [_LegacyHandler(handler) for handler in address_handlers]
+        )
+        self._pin_index = {
+            pin: index for index, pin in enumerate(self.virtual_pin_list)
+        }
+        self.mux_assigned_pins: dict[str, VirtualMux] = {}
+        # Clearing state set by a mux's clear_callback, sent with its next update
+        self._clearing: Optional[tuple[int, int, float]] = None
+
+    def install_multiplexer(self, mux: VirtualMux) -> None:
+        """
+        Route the legacy mux callbacks to the switching engine.
+
+        As per jig_mapping.VirtualAddressMap.install_multiplexer, except the
+        pin values calculated for each address are cached on the mux.
+        """
+        pin_mask = []
+        for itm in mux.pin_list:
+            if itm in self.mux_assigned_pins:
+                warnings.warn(
+                    "Pin {} in {} already assigned in {}".format(
+                        itm, mux, self.mux_assigned_pins[itm]
+                    ),
+                    MuxWarning,
+                )
+            try:
+                pin_mask.append(self._pin_index[itm])
+            except KeyError:
+                raise ValueError(
+                    "Multiplexer pin {} not found in Virtual Address Map".format(itm)
+                ) from None
+            self.mux_assigned_pins[itm] = mux
+        mux.pin_mask = pin_mask
+        mux.update_callback = self.update_pin_values
+        mux._clear_callback = self.update_clearing_pin_values
+        mux._build_values_update = _cached_values_update(mux)
+
+    def update_pin_values(
+        self, values: Iterable[tuple[int, bool]], trigger_update: bool = True
+    ) -> None:
+        """
+        :param values: is a list of (index, value) tuples
+        Set each pin index to value, after any clearing state from the mux's
+        clear_callback has been set for its clearing time.
+        """
+        on, off = _pin_values_masks(values)
+        setup = PinMaskState()
+        clearing_time = 0.0
+        if self._clearing is not None:
+            clear_on, clear_off, clearing_time = self._clearing
+            self._clearing = None
+            # As per jig_mapping, there is no clearing step if the update
+            # wouldn't change any pins, such as re-selecting the current
+            # signal, or if the clearing state itself wouldn't change any pins.
+            expected = self.engine.expected_pins()
+            if (expected | on) & ~off != expected and (
+                expected | clear_on
+            ) & ~clear_off != expected:
+                setup = PinMaskState(off=clear_off, on=clear_on)
+            else:
+                clearing_time = 0.0
+        self.engine.add_mask_update(
+            PinMaskUpdate(setup, PinMaskState(off=off, on=on), clearing_time),
+            trigger_update,
+        )
+
+    def update_clearing_pin_values(
+        self, values: Iterable[tuple[int, bool]], clearing_time: float
+    ) -> None:
+        on, off = _pin_values_masks(values)
+        self._clearing = (on, off, clearing_time)
+
+    def update_defaults(self) -> None:
+        """Clear all pins, then set the default pins of each address handler"""
+        pins = [
+            pin for _, handler in self.address_handlers for pin, _ in handler.defaults()
+        ]
+        self.engine.restore_pins(self.engine.pin_mask(pins))
+
+    def update_pin_by_name(
+        self, name: str, value: bool, trigger_update: bool = True
+    ) -> None:
+        self.update_pins_by_name([(name, value)], trigger_update)
+
+    def update_pins_by_name(
+        self, pins: Iterable[tuple[str, bool]], trigger_update: bool = True
+    ) -> None:
+        try:
+            values = [(self._pin_index[name], value) for name, value in pins]
+        except KeyError as e:
+            raise ValueError(f"{e.args[0]} is not in list") from None
+        self.update_pin_values(values, trigger_update)
+
+    def update_input(self) -> None:
+        """Read the legacy address handlers. Inputs are read by __getitem__"""
+        for _, handler in self.address_handlers:
+            handler.update_input()
+
+    @property
+    def pin_values(self) -> list[tuple[str, bool]]:
+        active = self.engine.pin_mask(self.engine.active_pins())
+        return [
+            (pin, bool(active & (1 << index)))
+            for index, pin in enumerate(self.virtual_pin_list)
+        ]
+
+    def active_pins(self) -> list[tuple[str, Any]]:
+        return [
+            (pin, self.mux_assigned_pins.get(pin))
+            for pin in sorted(
+                self.engine.active_pins(), key=self._pin_index.__getitem__
+            )
+        ]
+
+    def __getitem__(self, item: str) -> bool:
+        index = self._pin_index[item]
+        start_addr = 0
+        for addr, handler in self.address_handlers:
+            if index < addr:
+                values = handler.update_input()
+                if values is not None:
+                    return bool(values & (1 << (index - start_addr)))
+                break
+            start_addr = addr
+        return bool(self.engine.expected_pins() & (1 << index))
+
+    def __setitem__(self, key: str, value: bool) -> None:
+        self.update_pin_by_name(key, value)
+
+
+def _cached_values_update(mux: VirtualMux) -> Callable[[int], _PinValues]:
+    """Memoise mux._build_values_update, which is called for every multiplex"""
+    build_values_update = mux._build_values_update
+    cache: dict[int, _PinValues] = {}
+
+    def cached(virtual_address: int) -> _PinValues:
+        try:
+            return cache[virtual_address]
+        except KeyError:
+            values = _PinValues(build_values_update(virtual_address))
+            cache[virtual_address] = values
+            return values
+
+    return cached
+
+
+class JigDriver(metaclass=JigMeta):
+    """
+    A drop-in replacement for jig_mapping.JigDriver, using fixate._switching.
+
+    :attribute address_handlers: Iterable of jig_mapping.AddressHandler instances
+    :attribute multiplexers: Iterable of jig_mapping.VirtualMux instances
+    """
+
+    multiplexers: Sequence[VirtualMux] = ()
+    address_handlers: Sequence[AddressHandler] = ()
+    defaults = ()
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.virtual_map = VirtualAddressMap(self.address_handlers)
+        for mux in self.multiplexers:
+            self.virtual_map.install_multiplexer(mux)
+
+    def __setitem__(self, key: str, value: bool) -> None:
+        self.virtual_map.update_pin_by_name(key, value)
+
+    def __getitem__(self, item: str) -> bool:
+        return self.virtual_map[item]
+
+    def active_pins(self) -> list[tuple[str, Any]]:
+        return self.virtual_map.active_pins()
+
+    def reset(self) -> None:
+        """Reset the multiplexers to the default values"""
+        self.virtual_map.update_defaults()
+        for mux in self.multiplexers:
+            mux.defaults()
+
+    def close(self) -> None:
+        self.virtual_map.engine.close()
+
+    def iterate_all_mux_paths(self) -> Iterator[str]:
+        for mux in self.multiplexers:
+            yield from self.iterate_mux_paths(mux)
+
+    def iterate_mux_paths(self, mux: VirtualMux) -> Iterator[str]:
+        """
+        :param mux: Multiplexer as an object
+        :return: Generator of multiplexer signal paths
+        """
+        for pth in mux.signal_map:
+            if pth is not None:
+                mux(pth)
+                yield "{}: {}".format(mux.__class__.__name__, pth)
+        mux.defaults()
@@ -1,15 +1,20 @@
 """
 This module details user input api
 """
+import threading
 import time
 from queue import Queue, Empty
 from pubsub import pub
-from fixate.config import RESOURCES
+from fixate.config import current_sequencer
 from collections import OrderedDict
 
 USER_YES_NO = ("YES", "NO")
 USER_RETRY_ABORT_FAIL = ("RETRY", "ABORT", "FAIL")
 
+# Held for the whole of a request to the user, so the slots of a
+# ParallelSequencer prompt one at a time.
+_request_lock = threading.RLock()
+
 
 def _user_req_input(msg, target=None, attempts=5, **kwargs):
     """
@@ -26,12 +31,18 @@ def _user_req_input(msg, target=None, attempts=5, **kwargs):
      Returns the user response
     """
     q = Queue()
-    pub.sendMessage("UI_block_start")
-    pub.sendMessage(
-        "UI_req_input", msg=msg, q=q, target=target, attempts=attempts, kwargs=kwargs
-    )
-    resp = q.get()
-    pub.sendMessage("UI_block_end")
+    with _request_lock:
+        pub.sendMessage("UI_block_start")
+        pub.sendMessage(
+            "UI_req_input",
+            msg=msg,
+            q=q,
+            target=target,
+            attempts=attempts,
+            kwargs=kwargs,
+        )
+        resp = q.get()
+        pub.sendMessage("UI_block_end")
     return resp
 
 
@@ -54,17 +65,18 @@ def _user_req_choices(msg, choices, target=None, attempts=5):
             "Requires at least two choices to work, {} provided".format(choices)
         )
     q = Queue()
-    pub.sendMessage("UI_block_start")
-    pub.sendMessage(
-        "UI_req_choices",
-        msg=msg,
-        q=q,
-        choices=choices,
-        target=target,
-        attempts=attempts,
-    )
-    resp = q.get()
-    pub.sendMessage("UI_block_end")
+    with _request_lock:
+        pub.sendMessage("UI_block_start")
+        pub.sendMessage(
+            "UI_req_choices",
+            msg=msg,
+            q=q,
+            choices=choices,
+            target=target,
+            attempts=attempts,
+        )
+        resp = q.get()
+        pub.sendMessage("UI_block_end")
     return resp
 
 
@@ -142,23 +154,24 @@ def user_action(msg, target):
             self.target_finished_callback = callback
 
     callback_obj = UserActionCallback()
-    pub.sendMessage("UI_action", msg=msg, callback_obj=callback_obj)
-    try:
-        while True:
-            try:
-                callback_obj.user_cancel_queue.get_nowait()
-                return False
-            except Empty:
-                pass
-
-            if target():
-                return True
-
-            # Yield control for other threads but don't slow down target
-            time.sleep(0)
-    finally:
-        # No matter what, if we exit, we want to reset the UI
-        callback_obj.target_finished_callback()
+    with _request_lock:
+        pub.sendMessage("UI_action", msg=msg, callback_obj=callback_obj)
+        try:
+            while True:
+                try:
+                    callback_obj.user_cancel_queue.get_nowait()
+                    return False
+                except Empty:
+                    pass
+
+                if target():
+                    return True
+
+                # Yield control for other threads but don't slow down target
+                time.sleep(0)
+        finally:
+            # No matter what, if we exit, we want to reset the UI
+            callback_obj.target_finished_callback()
 
 
 def user_ok(msg):
@@ -169,10 +182,11 @@ def user_ok(msg):
      A message that will be shown to the user
     """
     q = Queue()
-    pub.sendMessage("UI_block_start")
-    pub.sendMessage("UI_req", msg=msg, q=q)
-    resp = q.get()
-    pub.sendMessage("UI_block_end")
+    with _request_lock:
+        pub.sendMessage("UI_block_start")
+        pub.sendMessage("UI_req", msg=msg, q=q)
+        resp = q.get()
+        pub.sendMessage("UI_block_end")
     return resp
 
 
@@ -225,9 +239,10 @@ def user_post_sequence_info_pass(msg):
     :param msg: String as it should be displayed
     :return:
     """
-    if "_post_sequence_info" not in RESOURCES["SEQUENCER"].context_data:
-        RESOURCES["SEQUENCER"].context_data["_post_sequence_info"] = OrderedDict()
-    RESOURCES["SEQUENCER"].context_data["_post_sequence_info"][msg] = "PASSED"
+    context_data = current_sequencer().context_data
+    if "_post_sequence_info" not in context_data:
+        context_data["_post_sequence_info"] = OrderedDict()
+    context_data["_post_sequence_info"][msg] = "PASSED"
 
 
 def user_post_sequence_info_fail(msg):
@@ -237,9 +252,10 @@ def user_post_sequence_info_fail(msg):
     :param msg: String as it should be displayed
     :return:
     """
-    if "_post_sequence_info" not in RESOURCES["SEQUENCER"].context_data:
-        RESOURCES["SEQUENCER"].context_data["_post_sequence_info"] = OrderedDict()
-    RESOURCES["SEQUENCER"].context_data["_post_sequence_info"][msg] = "FAILED"
+    context_data = current_sequencer().context_data
+    if "_post_sequence_info" not in context_data:
+        context_data["_post_sequence_info"] = OrderedDict()
+    context_data["_post_sequence_info"][msg] = "FAILED"
 
 
 def user_post_sequence_info(msg):
@@ -249,6 +265,7 @@ def user_post_sequence_info(msg):
     :param msg: String as it should be displayed
     :return:
     """
-    if "_post_sequence_info" not in RESOURCES["SEQUENCER"].context_data:
-        RESOURCES["SEQUENCER"].context_data["_post_sequence_info"] = OrderedDict()
-    RESOURCES["SEQUENCER"].context_data["_post_sequence_info"][msg] = "ALL"
+    context_data = current_sequencer().context_data
+    if "_post_sequence_info" not in context_data:
+        context_data["_post_sequence_info"] = OrderedDict()
+    context_data["_post_sequence_info"][msg] = "ALL"
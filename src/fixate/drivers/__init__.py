@@ -1,4 +1,20 @@
-from typing import Protocol
+import contextlib
+import dataclasses
+import itertools
+import threading
+import time
+import weakref
+from typing import (
+    Any,
+    ContextManager,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Protocol,
+    Set,
+    Tuple,
+)
 
 import pubsub.pub
 
@@ -27,6 +43,7 @@ class DriverProtocol(Protocol):
 def log_instrument_open(instrument: DriverProtocol) -> None:
     """"""
     instrument_name = type(instrument).__name__
+    arbiter.register(instrument)
     pubsub.pub.sendMessage(
         "driver_open",
         instr_type=instrument_name,
@@ -34,6 +51,185 @@ def log_instrument_open(instrument: DriverProtocol) -> None:
     )
 
 
+class LeaseTimeoutError(Exception):
+    pass
+
+
+@dataclasses.dataclass
+class LeaseStats:
+    """Lease metrics for one instrument. Times are in seconds."""
+
+    name: str
+    leases: int = 0
+    # Leases that had to wait for another holder
+    contended: int = 0
+    wait_time: float = 0.0
+    max_wait: float = 0.0
+    held_time: float = 0.0
+
+    @property
+    def mean_wait(self) -> float:
+        return self.wait_time / self.leases if self.leases else 0.0
+
+
+class InstrumentArbiter:
+    """
+    Grants leases on instruments shared by sequences running at the same time,
+    such as the slots of a ParallelSequencer.
+
+    A lease holds all of its drivers at once, or waits until it can. Waiting
+    leases are granted in priority order, then in the order they were requested,
+    and a lease never overtakes an earlier one that needs the same driver. A
+    thread can lease a driver it already holds.
+
+    Lease all the drivers a step needs together. A thread that holds one lease
+    and waits on another can deadlock with a thread doing the reverse.
+    """
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        # id(driver) -> [thread ident, lease depth]
+        self._owners: Dict[int, List[int]] = {}
+        # ((-priority, request order), ids of the drivers requested)
+        self._waiting: List[Tuple[Tuple[int, int], Set[int]]] = []
+        self._order = itertools.count()
+        self._stats: "weakref.WeakKeyDictionary[Any, LeaseStats]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def register(self, driver: Any, name: Optional[str] = None) -> LeaseStats:
+        """Start recording metrics for driver, optionally renaming it."""
+        with self._cond:
+            return self._register(driver, name)
+
+    def _register(self, driver: Any, name: Optional[str] = None) -> LeaseStats:
+        stats = self._stats.get(driver)
+        if stats is None:
+            stats = self._stats[driver] = LeaseStats(name or type(driver).__name__)
+        elif name is not None:
+            stats.name = name
+        return stats
+
+    def stats(self) -> List[LeaseStats]:
+        """A copy of the metrics of each driver, longest total wait first"""
+        with self._cond:
+            return sorted(
+                (dataclasses.replace(stats) for stats in self._stats.values()),
+                key=lambda stats: stats.wait_time,
+                reverse=True,
+            )
+
+    def reset_stats(self) -> None:
+        with self._cond:
+            for driver, stats in self._stats.items():
+                self._stats[driver] = LeaseStats(stats.name)
+
+    @contextlib.contextmanager
+    def lease(
+        self, *drivers: Any, priority: int = 0, timeout: Optional[float] = None
+    ) -> Iterator[None]:
+        """
+        Hold drivers for the duration of the with block.
+
+        :param priority: Waiting leases with a higher priority are granted first
+        :param timeout: Raise LeaseTimeoutError if not granted within timeout seconds
+        """
+        drivers = tuple({id(driver): driver for driver in drivers}.values())
+        me = threading.get_ident()
+        start = time.perf_counter()
+        with self._cond:
+            request = ((-priority, next(self._order)), {id(d) for d in drivers})
+            # A thread that already holds a lease doesn't queue behind leases
+            # that may be waiting for it
+            holding = any(owner[0] == me for owner in self._owners.values())
+            contended = not self._grantable(request, me, holding)
+            self._waiting.append(request)
+            try:
+                granted = self._cond.wait_for(
+                    lambda: self._grantable(request, me, holding), timeout
+                )
+            finally:
+                self._waiting.remove(request)
+                # Leases queued behind this one may be grantable now
+                self._cond.notify_all()
+            if not granted:
+                raise LeaseTimeoutError(
+                    "Timed out after {}s waiting to lease {}".format(
+                        timeout,
+                        ", ".join(self._register(d).name for d in drivers),
+                    )
+                )
+            wait = time.perf_counter() - start
+            outer = []
+            for driver in drivers:
+                owner = self._owners.setdefault(id(driver), [me, 0])
+                owner[1] += 1
+                if owner[1] > 1:
+                    continue
+                outer.append(driver)
+                stats = self._register(driver)
+                stats.leases += 1
+                stats.contended += contended
+                stats.wait_time += wait
+                stats.max_wait = max(stats.max_wait, wait)
+        granted_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            held = time.perf_counter() - granted_at
+            with self._cond:
+                for driver in drivers:
+                    owner = self._owners[id(driver)]
+                    owner[1] -= 1
+                    if not owner[1]:
+                        del self._owners[id(driver)]
+                for driver in outer:
+                    self._register(driver).held_time += held
+                self._cond.notify_all()
+
+    def _grantable(
+        self, request: Tuple[Tuple[int, int], Set[int]], me: int, holding: bool
+    ) -> bool:
+        key, wanted = request
+        for driver_id in wanted:
+            owner = self._owners.get(driver_id)
+            if owner is not None and owner[0] != me:
+                return False
+        if holding:
+            return True
+        return not any(
+            other_key < key and other_wanted & wanted
+            for other_key, other_wanted in self._waiting
+        )
+
+
+arbiter = InstrumentArbiter()
+
+
+def lease(
+    *drivers: Any, priority: int = 0, timeout: Optional[float] = None
+) -> ContextManager[None]:
+    """
+    Lease instruments shared with other sequences for the duration of the with block,
+    so their commands aren't interleaved::
+
+        with lease(dm.dmm, dm.funcgen):
+            dm.funcgen.channel1(True)
+            v = dm.dmm.measurement()
+
+    See InstrumentArbiter.lease.
+    """
+    return arbiter.lease(*drivers, priority=priority, timeout=timeout)
+
+
+def lease_stats() -> List[LeaseStats]:
+    """
+    Lease metrics of each instrument, longest total wait first. An instrument that
+    spends a long time waiting is the one limiting throughput.
+    """
+    return arbiter.stats()
+
+
 #######################################################################################
 # Pretty sure that nothing below here is actually used...
 from inspect import isfunction  # noqa
@@ -137,6 +333,24 @@ class DriverManager:
             World
         """
         self.drivers.update(kwargs)
+        for id, driver in kwargs.items():
+            # Lease metrics are reported with the name used in the test script
+            arbiter.register(driver, name=id)
+
+    def lease(
+        self, *ids: str, priority: int = 0, timeout: Optional[float] = None
+    ) -> ContextManager[None]:
+        """
+        Lease drivers by id, see fixate.drivers.lease
+
+        Example:
+            >>> with dm.lease("dmm", "pps"):
+            >>>     dm.pps.voltage(5)
+            >>>     dm.dmm.measurement()
+        """
+        return lease(
+            *(self.drivers[id] for id in ids), priority=priority, timeout=timeout
+        )
 
     def remove_drivers(self, *ids):
         """
@@ -6,7 +6,7 @@ import re
 
 import fixate.drivers
 from fixate.core.common import bits
-from fixate.core.exceptions import InstrumentNotConnected
+from fixate.core.exceptions import InstrumentNotConnected, ParameterError
 
 from fixate.drivers._ftdi import ftdI2xx
 
@@ -83,6 +83,22 @@ class BIT_MODE(object):
     FT_BITMODE_SYNC_FIFO = DWORD(0x40)
 
 
+class MPSSE(object):
+    """Command opcodes for the MPSSE engine, see FTDI AN_108"""
+
+    CLOCK_BYTES_OUT_RISING_MSB = 0x10
+    CLOCK_BYTES_OUT_FALLING_MSB = 0x11
+    SET_LOW_BYTE = 0x80
+    DISABLE_LOOPBACK = 0x85
+    SET_CLOCK_DIVISOR = 0x86
+    DISABLE_CLOCK_DIVIDE_BY_5 = 0x8A
+    DISABLE_3_PHASE_CLOCKING = 0x8D
+    DISABLE_ADAPTIVE_CLOCKING = 0x97
+    # Clock with the divide by 5 disabled. Only Hi-Speed devices have MPSSE
+    # with a 60 MHz base clock (FT232H, FT2232H, FT4232H).
+    BASE_CLOCK = 60_000_000
+
+
 class FT_DEVICE_LIST_INFO_NODE(ctypes.Structure):
     _fields_ = [
         ("Flags", DWORD),
@@ -182,6 +198,10 @@ class FTDI2xx(object):
         self.bb_latch = 1 << 2
         self.bb_bytes = 1
         self.bb_inv_mask = 0
+        self.bb_chains = (self.bb_data,)
+        self._bb_table = []
+        self._bb_table_key = None
+        self._bb_data_tables = {}
 
     def _connect(self):
         check_return(
@@ -359,18 +379,71 @@ class FTDI2xx(object):
         raise ValueError("Please ensure that word length, stop bits and parity are set")
 
     def serial_shift_bit_bang(self, data, bytes_required=None):
+        """
+        Shift data out to a shift register chain, MSB first, then latch it.
+
+        In ``FT_BITMODE_SYNC_BITBANG`` and ``FT_BITMODE_MPSSE`` this only
+        returns once the device has clocked out all of the data.
+        """
         bytes_required = bytes_required or self.bb_bytes
-        if self.bit_mode == BIT_MODE.FT_BITMODE_CBUS_BITBANG:
-            bit_bang = self._serial_shift_bit_bang(
-                data,
-                bytes_required,
-                bb_mask=(self.bb_clk + self.bb_data + self.bb_latch) << 4,
+        if len(self.bb_chains) > 1:
+            raise ValueError(
+                "Configured for {} chains, use serial_shift_bit_bang_chains".format(
+                    len(self.bb_chains)
+                )
+            )
+        if self.bit_mode == BIT_MODE.FT_BITMODE_MPSSE:
+            self.write(self._serial_shift_mpsse(data, bytes_required))
+            return
+        self._write_bit_bang(
+            self._serial_shift_bit_bang_table(
+                data, bytes_required, self._bit_bang_output_mask()
+            )
+        )
+
+    def serial_shift_bit_bang_chains(self, values, bytes_required=None):
+        """
+        Shift a value into each of the chains set by ``chain_data_masks`` in
+        configure_bit_bang, then latch them all. The chains share the clock and
+        latch, so they are shifted in parallel by a single write.
+
+        Every chain is shifted bytes_required bytes, a shorter chain just
+        discards the leading bits.
+        """
+        bytes_required = bytes_required or self.bb_bytes
+        if len(values) != len(self.bb_chains):
+            raise ValueError(
+                "Expected a value for each of the {} chains, got {}".format(
+                    len(self.bb_chains), len(values)
+                )
+            )
+        if self.bit_mode == BIT_MODE.FT_BITMODE_MPSSE:
+            self.write(self._serial_shift_mpsse(values[0], bytes_required))
+            return
+        self._write_bit_bang(
+            self._serial_shift_chains(
+                values, bytes_required, self._bit_bang_output_mask()
             )
+        )
+
+    def _write_bit_bang(self, bit_bang):
+        if self.bit_mode == BIT_MODE.FT_BITMODE_CBUS_BITBANG:
             for byte in bit_bang:
                 self.write_bit_mode(byte)
         else:
-            bit_bang = self._serial_shift_bit_bang(data, bytes_required, bb_mask=0)
             self.write(bit_bang)
+            if self.bit_mode == BIT_MODE.FT_BITMODE_SYNC_BITBANG:
+                # Each byte written is sampled back to the receive buffer once
+                # it has been output. Reading them all keeps the buffer empty,
+                # and waits for the frame to be clocked out.
+                self._read_exact(len(bit_bang))
+
+    def _bit_bang_output_mask(self):
+        # In CBUS bit bang mode the upper nibble sets the clock, data and latch
+        # pins as outputs
+        if self.bit_mode == BIT_MODE.FT_BITMODE_CBUS_BITBANG:
+            return (self.bb_clk + sum(self.bb_chains) + self.bb_latch) << 4
+        return 0
 
     def configure_bit_bang(
         self,
@@ -380,9 +453,12 @@ class FTDI2xx(object):
         clk_mask=2,
         data_mask=4,
         invert_mask=0b000,
+        clock_rate=1_000_000,
+        chain_data_masks=None,
     ):
         """
-        :param bit_mode:
+        :param bit_mode: ``FT_BITMODE_ASYNC_BITBANG``, ``FT_BITMODE_SYNC_BITBANG``,
+            ``FT_BITMODE_CBUS_BITBANG`` or ``FT_BITMODE_MPSSE``
         :param bytes_required:
         :param latch_mask: CBUS Pin for latch. 1 Default for Relay Matrix
         :param clk_mask: CBUS Pin for clock. 2 Default for Relay Matrix
@@ -390,12 +466,39 @@ class FTDI2xx(object):
         :param invert_mask: Mask for inverting. Based on ``0b<latch><clock><data>``
 
             e.g. ``0b100`` Would mean the latch bit is inverted. ``0b011`` would mean the clock and data bits are inverted.
+        :param clock_rate: Shift clock frequency in Hz for ``FT_BITMODE_MPSSE``.
+            The bit bang modes are clocked by the baud rate instead.
+        :param chain_data_masks: Data pin of each shift register chain, for chains
+            sharing the clock and latch. Replaces data_mask. Shift them with
+            serial_shift_bit_bang_chains. Not supported in ``FT_BITMODE_MPSSE``.
         :return:
+
+        In ``FT_BITMODE_MPSSE`` the clock must be ADBUS0 (``clk_mask=1``) and the data
+        ADBUS1 (``data_mask=2``). The latch can be any other ADBUS pin.
         """
+        chains = (data_mask,)
+        if chain_data_masks:
+            chains = tuple(chain_data_masks)
+            if len(set(chains)) != len(chains) or any(
+                not chain or chain & (chain - 1) or chain & (clk_mask | latch_mask)
+                for chain in chains
+            ):
+                raise ValueError(
+                    "Chain data masks must be single, distinct pins, "
+                    "separate from the clock and latch"
+                )
+            data_mask = chains[0]
+        if bit_mode == BIT_MODE.FT_BITMODE_MPSSE:
+            if len(chains) > 1:
+                raise ValueError("MPSSE can only shift a single chain")
+            if clk_mask != 1 or data_mask != 2:
+                raise ValueError("MPSSE requires clk_mask=1 and data_mask=2")
+            if latch_mask & 0b11 or not 0 < latch_mask < 0x100:
+                raise ValueError("MPSSE latch must be one of ADBUS2 to ADBUS7")
         self.bb_bytes = bytes_required
         self.bit_mode = bit_mode
-        self.write_bit_mode(self.pin_value_mask)
         self.bb_data = data_mask
+        self.bb_chains = chains
         self.bb_clk = clk_mask
         self.bb_latch = latch_mask
         self.bb_inv_mask = 0
@@ -404,9 +507,170 @@ class FTDI2xx(object):
         if (1 << 1) & invert_mask:
             self.bb_inv_mask += self.bb_clk
         if 1 & invert_mask:
-            self.bb_inv_mask += self.bb_data
+            self.bb_inv_mask += sum(self.bb_chains)
+        if bit_mode == BIT_MODE.FT_BITMODE_MPSSE:
+            self._configure_mpsse(clock_rate)
+        else:
+            self.write_bit_mode(self.pin_value_mask)
+            self._bit_bang_table(self._bit_bang_output_mask())
+
+    def _configure_mpsse(self, clock_rate):
+        check_return(
+            ftdI2xx.FT_SetBitMode(self.handle, UCHAR(0), BIT_MODE.FT_BITMODE_RESET)
+        )
+        check_return(
+            ftdI2xx.FT_SetBitMode(self.handle, UCHAR(0), BIT_MODE.FT_BITMODE_MPSSE)
+        )
+        # Round the divisor up, so the clock is never faster than requested
+        divisor = max(0, -(-MPSSE.BASE_CLOCK // (2 * clock_rate)) - 1)
+        if divisor > 0xFFFF:
+            raise ValueError(f"MPSSE clock rate {clock_rate} Hz is too low")
+        self.write(
+            bytes(
+                [
+                    MPSSE.DISABLE_CLOCK_DIVIDE_BY_5,
+                    MPSSE.DISABLE_ADAPTIVE_CLOCKING,
+                    MPSSE.DISABLE_3_PHASE_CLOCKING,
+                    MPSSE.DISABLE_LOOPBACK,
+                    MPSSE.SET_CLOCK_DIVISOR,
+                    divisor & 0xFF,
+                    divisor >> 8,
+                    MPSSE.SET_LOW_BYTE,
+                    self.bb_inv_mask,
+                    self.bb_clk + self.bb_data + self.bb_latch,
+                ]
+            )
+        )
+
+    def _serial_shift_mpsse(self, data, bytes_required):
+        """
+        Encode data as MPSSE commands. The data is clocked out of ADBUS1 with
+        ADBUS0 as the clock, then the latch is pulsed as a GPIO.
+        """
+        data_bytes = self._data_bytes(data, bytes_required)
+        if self.bb_inv_mask & self.bb_data:
+            data_bytes = bytes(byte ^ 0xFF for byte in data_bytes)
+        # Change the data on the edge before the one the shift register samples
+        if self.bb_inv_mask & self.bb_clk:
+            clock_out = MPSSE.CLOCK_BYTES_OUT_RISING_MSB
+        else:
+            clock_out = MPSSE.CLOCK_BYTES_OUT_FALLING_MSB
+        direction = self.bb_clk + self.bb_data + self.bb_latch
+        idle = self.bb_inv_mask
+        latch = self.bb_latch ^ self.bb_inv_mask
+        length = len(data_bytes) - 1
+        return b"".join(
+            [
+                bytes([clock_out, length & 0xFF, length >> 8]),
+                data_bytes,
+                bytes(
+                    [MPSSE.SET_LOW_BYTE, latch, direction]
+                    + [MPSSE.SET_LOW_BYTE, idle, direction]
+                ),
+            ]
+        )
+
+    def _data_bytes(self, data, bytes_required):
+        try:
+            return data.to_bytes(bytes_required, "big")
+        except OverflowError:
+            raise ParameterError(
+                "Number {} doesn't fit in {} number of bytes".format(
+                    data, bytes_required
+                )
+            ) from None
+
+    def _read_exact(self, size):
+        buffer = ctypes.create_string_buffer(size)
+        bytes_read = DWORD()
+        check_return(
+            ftdI2xx.FT_Read(self.handle, buffer, DWORD(size), ctypes.byref(bytes_read))
+        )
+        return buffer.raw[: bytes_read.value]
+
+    def _bit_bang_table(self, bb_mask):
+        """
+        Return a list of the 16 byte clock/data frame for each possible data byte,
+        for the current pin masks. The table is only rebuilt if the masks change.
+        """
+        key = (bb_mask, self.bb_data, self.bb_clk, self.bb_latch, self.bb_inv_mask)
+        if key != self._bb_table_key:
+            # Drop the start byte and the 3 latch bytes of a single byte frame
+            self._bb_table = [
+                bytes(self._serial_shift_bit_bang(value, 1, bb_mask)[1:-3])
+                for value in range(256)
+            ]
+            self._bb_table_key = key
+        return self._bb_table
+
+    def _serial_shift_bit_bang_table(self, data, bytes_required, bb_mask):
+        """
+        Equivalent to _serial_shift_bit_bang, but looks up the frame for each
+        data byte in a table instead of encoding each bit.
+        """
+        table = self._bit_bang_table(bb_mask)
+        data_bytes = self._data_bytes(data, bytes_required)
+        idle = bb_mask + self.bb_inv_mask
+        latch = bb_mask + self.bb_latch ^ self.bb_inv_mask
+        return b"".join(
+            [
+                bytes((idle,)),
+                *[table[byte] for byte in data_bytes],
+                bytes((idle, latch, idle)),
+            ]
+        )
+
+    def _data_table(self, data_mask):
+        """
+        Return a list of the data pin values for each possible data byte, as
+        16 bytes with the clock, latch and inversion left out.
+        """
+        try:
+            return self._bb_data_tables[data_mask]
+        except KeyError:
+            table = [
+                bytes(
+                    level
+                    for b in bits(value)
+                    for level in ((data_mask, data_mask) if b else (0, 0))
+                )
+                for value in range(256)
+            ]
+            self._bb_data_tables[data_mask] = table
+            return table
+
+    def _serial_shift_chains(self, values, bytes_required, bb_mask):
+        """
+        Interleave a frame for each chain into a single frame. The data pins of
+        each chain are combined as one big integer, so the cost per chain is a
+        table lookup per byte.
+        """
+        frame_bytes = 16 * bytes_required
+        frame = int.from_bytes(
+            bytes([bb_mask, bb_mask + self.bb_clk]) * 8 * bytes_required, "big"
+        )
+        for data_mask, value in zip(self.bb_chains, values):
+            table = self._data_table(data_mask)
+            data_bytes = self._data_bytes(value, bytes_required)
+            frame |= int.from_bytes(
+                b"".join([table[byte] for byte in data_bytes]), "big"
+            )
+        frame ^= int.from_bytes(bytes([self.bb_inv_mask]) * frame_bytes, "big")
+        idle = bb_mask + self.bb_inv_mask
+        latch = bb_mask + self.bb_latch ^ self.bb_inv_mask
+        return b"".join(
+            [
+                bytes((idle,)),
+                frame.to_bytes(frame_bytes, "big"),
+                bytes((idle, latch, idle)),
+            ]
+        )
 
     def _serial_shift_bit_bang(self, data, bytes_required, bb_mask):
+        """
+        Encode data one bit at a time. This is the reference for the table
+        driven encoder used by serial_shift_bit_bang.
+        """
         data_out = bytearray()
 
         data_out.append(bb_mask + self.bb_inv_mask)
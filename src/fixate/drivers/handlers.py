@@ -4,10 +4,17 @@ can be used to implement IO for the fixate.core.switching module.
 """
 from __future__ import annotations
 
-from typing import Sequence, Optional
+import threading
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Collection, Mapping, Sequence, Optional
 
 from fixate import Pin, PinValueAddressHandler
-from fixate.drivers import ftdi
+
+if TYPE_CHECKING:
+    # Imported when first opened, so that SimulatedAddressHandler can be
+    # used on a machine without the FTDI driver installed.
+    from fixate.drivers import ftdi
 
 
 class FTDIAddressHandler(PinValueAddressHandler):
@@ -17,29 +24,107 @@ class FTDIAddressHandler(PinValueAddressHandler):
     We create this concrete address handler because we use it most
     often. FT232 is used to bit-bang to shift register that are control
     the switching in a jig.
+
+    The last value shifted out is remembered, and writing the same value
+    again is skipped. If min_write_interval is set, a write that comes less
+    than min_write_interval seconds after the previous one is delayed, and
+    replaced by any later write that arrives in the meantime, so only the
+    final value is shifted. The outputs can then lag behind set_pins by up
+    to min_write_interval, call flush() to wait for them.
+
+    Delayed writes keep break-before-make phases apart. A pending write that
+    turns pins off is never merged with a later one that turns pins on, and a
+    write that turns pins on is delayed by at least as much as the write
+    that broke them, so the time between the phases is not shortened.
+
+    skipped_writes and merged_writes count the writes that were elided.
+
+    mode selects how the chain is shifted:
+
+    * "async": asynchronous bit-bang, with data on D2, clock on D1 and latch on D0.
+    * "sync": synchronous bit-bang on the same pins. Each write waits until the
+      frame has been clocked out.
+    * "mpsse": the MPSSE engine of a Hi-Speed device (FT232H, FT2232H), with
+      clock on ADBUS0, data on ADBUS1 and latch on ADBUS3, clocked at clock_rate Hz.
     """
 
     def __init__(
         self,
         pins: Sequence[Pin],
         ftdi_description: str,
+        min_write_interval: float = 0.0,
+        mode: str = "async",
+        clock_rate: int = 1_000_000,
     ) -> None:
+        if mode not in ("async", "sync", "mpsse"):
+            raise ValueError(f"Unknown FTDI mode {mode!r}, use async, sync or mpsse")
         super().__init__(pins)
+        self.mode = mode
+        self.clock_rate = clock_rate
         self._ftdi_description = ftdi_description
         self._ftdi: Optional[ftdi.FTDI2xx] = None
+        self.min_write_interval = min_write_interval
+        self.writes = 0
+        self.skipped_writes = 0
+        self.merged_writes = 0
 
-    def _open(self) -> ftdi.FTDI2xx:
+        self._lock = threading.RLock()
+        # None until the first write, since the shift registers could hold anything
+        self._latched: Optional[int] = None
+        self._last_write = float("-inf")
+        # How late the last write that turned pins off was shifted out
+        self._break_lag = 0.0
+        self._pending: Optional[int] = None
+        self._pending_since = 0.0
+        self._pending_deadline = 0.0
+        self._write_timer: Optional[threading.Timer] = None
+        self._write_error: Optional[BaseException] = None
+
+    @property
+    def elided_writes(self) -> int:
+        """Total number of writes that were not shifted out"""
+        return self.skipped_writes + self.merged_writes
+
+    def _bytes_required(self) -> int:
         # how many bytes? enough for every pin to get a bit. We might
         # end up with some left-over bits. The +7 in the expression
         # ensures we round up.
-        bytes_required = (len(self.pin_list) + 7) // 8
+        return (len(self.pin_list) + 7) // 8
+
+    def _data_masks(self) -> dict[str, Any]:
+        """Data pin arguments for FTDI2xx.configure_bit_bang in the bit-bang modes"""
+        return {"data_mask": 4}
+
+    def _open(self) -> ftdi.FTDI2xx:
+        from fixate.drivers import ftdi
+
+        bytes_required = self._bytes_required()
         ftdi_handle = ftdi.open(ftdi_description=self._ftdi_description)
+        # Calculated time to clock out a 5 byte chain, excluding the USB transfer
+        # mode      USB bytes   shift time
+        # async     84          ~91 us (at 115_200 baud, see below)
+        # sync      84          ~91 us, plus reading back 84 bytes
+        # mpsse     14          ~40 us (at 1 MHz)
+        # test/benchmark_ftdi_update_rate.py measures the update rate on hardware.
+        if self.mode == "mpsse":
+            ftdi_handle.configure_bit_bang(
+                ftdi.BIT_MODE.FT_BITMODE_MPSSE,
+                bytes_required=bytes_required,
+                data_mask=2,
+                clk_mask=1,
+                latch_mask=8,
+                clock_rate=self.clock_rate,
+            )
+            return ftdi_handle
+
         ftdi_handle.configure_bit_bang(
-            ftdi.BIT_MODE.FT_BITMODE_ASYNC_BITBANG,
+            ftdi.BIT_MODE.FT_BITMODE_SYNC_BITBANG
+            if self.mode == "sync"
+            else ftdi.BIT_MODE.FT_BITMODE_ASYNC_BITBANG,
             bytes_required=bytes_required,
-            data_mask=4,
             clk_mask=2,
             latch_mask=1,
+            **self._data_masks(),
         )
         # Measurement of baudrate vs bit-bang. The programming manual say 16 x, but that
         # only appears to be true for lower clock rates. Keeping the actual value at 115200
@@ -53,13 +138,236 @@ class FTDIAddressHandler(PinValueAddressHandler):
         return ftdi_handle
 
     def close(self) -> None:
-        if self._ftdi is not None:
-            self._ftdi.close()
-        self._ftdi = None
+        with self._lock:
+            try:
+                self.flush()
+            finally:
+                if self._ftdi is not None:
+                    self._ftdi.close()
+                self._ftdi = None
+                self._latched = None
+
+    def flush(self) -> None:
+        """Block until any delayed write has been shifted out"""
+        with self._lock:
+            if self._pending is not None:
+                delay = self._pending_deadline - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                self._write_pending()
+            self._raise_write_error()
 
     def _update_output(self, value: int) -> None:
+        with self._lock:
+            self._raise_write_error()
+            current = self._latched if self._pending is None else self._pending
+            if value == current:
+                self.skipped_writes += 1
+                return
+            if not self.min_write_interval:
+                self._shift(value, lag=0.0)
+                return
+
+            now = time.monotonic()
+            if self._pending is not None:
+                makes = value & ~self._pending
+                if not (makes and self._breaks(self._pending)):
+                    self._pending = value
+                    if makes:
+                        self._pending_deadline = max(
+                            self._pending_deadline, now + self._break_lag
+                        )
+                    self.merged_writes += 1
+                    return
+                # The pending write is the break phase of this one
+                self.flush()
+                now = time.monotonic()
+
+            deadline = self._last_write + self.min_write_interval
+            if value & ~(self._latched or 0):
+                deadline = max(deadline, now + self._break_lag)
+            if deadline <= now:
+                self._shift(value, lag=0.0)
+            else:
+                self._pending = value
+                self._pending_since = now
+                self._pending_deadline = deadline
+                self._start_write_timer(deadline - now)
+
+    def _breaks(self, value: int) -> bool:
+        return self._latched is not None and bool(self._latched & ~value)
+
+    def _shift(self, value: int, lag: float) -> None:
         # We implement the required semantics of set_pin here,
         # by ensuring the ftdi device is open.
         if self._ftdi is None:
             self._ftdi = self._open()
-        self._ftdi.serial_shift_bit_bang(value)
+        if self._breaks(value):
+            self._break_lag = lag
+        self._serial_shift(self._ftdi, value)
+        self._latched = value
+        self._last_write = time.monotonic()
+        self.writes += 1
+
+    def _serial_shift(self, ftdi_handle: ftdi.FTDI2xx, value: int) -> None:
+        ftdi_handle.serial_shift_bit_bang(value)
+
+    def _write_pending(self) -> None:
+        if self._write_timer is not None:
+            self._write_timer.cancel()
+            self._write_timer = None
+        if self._pending is not None:
+            value, self._pending = self._pending, None
+            self._shift(value, lag=time.monotonic() - self._pending_since)
+
+    def _start_write_timer(self, delay: float) -> None:
+        self._write_timer = threading.Timer(delay, self._write_timer_expired)
+        self._write_timer.daemon = True
+        self._write_timer.start()
+
+    def _write_timer_expired(self) -> None:
+        with self._lock:
+            # A cancelled timer may still get here, after another has started.
+            if self._write_timer is not threading.current_thread():
+                return
+            self._write_timer = None
+            delay = self._pending_deadline - time.monotonic()
+            if delay > 0:
+                # A merged write extended the deadline
+                self._start_write_timer(delay)
+                return
+            try:
+                self._write_pending()
+            except BaseException as e:
+                self._write_error = e
+
+    def _raise_write_error(self) -> None:
+        """Raise an error from a write on the timer thread"""
+        if self._write_error is not None:
+            error, self._write_error = self._write_error, None
+            raise error
+
+
+class MultiChainFTDIAddressHandler(FTDIAddressHandler):
+    """
+    An FTDIAddressHandler for several shift register chains driven from one
+    FTDI. The chains share the clock (D1) and latch (D0), each has its own data
+    pin, and they are shifted in parallel by a single USB write.
+
+    chains maps the data pin mask of each chain to the pins of that chain, e.g.
+    ``{0b0000_0100: relay_pins, 0b0000_1000: io_pins}``. The pin list of the
+    handler is the pins of each chain in order.
+
+    MPSSE only has a single data output, so mode must be "async" or "sync".
+    """
+
+    def __init__(
+        self,
+        chains: Mapping[int, Sequence[Pin]],
+        ftdi_description: str,
+        min_write_interval: float = 0.0,
+        mode: str = "async",
+    ) -> None:
+        if mode == "mpsse":
+            raise ValueError("MPSSE can only shift a single chain")
+        super().__init__(
+            [pin for pins in chains.values() for pin in pins],
+            ftdi_description,
+            min_write_interval,
+            mode,
+        )
+        self.chains = {mask: tuple(pins) for mask, pins in chains.items()}
+        # (offset, mask) to extract each chain from the handler value
+        self._chain_fields = []
+        offset = 0
+        for pins in self.chains.values():
+            self._chain_fields.append((offset, (1 << len(pins)) - 1))
+            offset += len(pins)
+
+    def _bytes_required(self) -> int:
+        return max((len(pins) + 7) // 8 for pins in self.chains.values())
+
+    def _data_masks(self) -> dict[str, Any]:
+        return {"chain_data_masks": tuple(self.chains)}
+
+    def _serial_shift(self, ftdi_handle: ftdi.FTDI2xx, value: int) -> None:
+        ftdi_handle.serial_shift_bit_bang_chains(
+            [value >> offset & mask for offset, mask in self._chain_fields]
+        )
+
+
+@dataclass(frozen=True)
+class SimulatedWrite:
+    """A write made by a SimulatedAddressHandler. start is a time.monotonic() value"""
+
+    start: float
+    value: int
+    latency: float
+
+
+class SimulatedAddressHandler(PinValueAddressHandler):
+    """
+    An address handler that emulates an FTDIAddressHandler without any hardware.
+
+    Each write takes fixed_latency plus byte_latency for each byte of the shift
+    register chain. The defaults are estimates for an FT232 bit-banging at the
+    115_200 baud used by FTDIAddressHandler: 16 bit-bang updates per byte at
+    ~926 kHz, plus the USB write. If realtime is False the latency is only added
+    to total_latency, rather than slept, so long sequences can be run quickly.
+
+    Every write is recorded in writes. If break_before_make_pins is given, a
+    ValueError is raised if a single write turns on some of those pins while
+    turning off others, or turns on a pin less than break_time seconds after
+    the last time any of them were turned off.
+    """
+
+    def __init__(
+        self,
+        pins: Sequence[Pin],
+        fixed_latency: float = 1e-3,
+        byte_latency: float = 16 / 926e3,
+        realtime: bool = True,
+        break_before_make_pins: Collection[Pin] = (),
+        break_time: float = 0.0,
+    ) -> None:
+        super().__init__(pins)
+        bytes_required = (len(self.pin_list) + 7) // 8
+        self.latency = fixed_latency + byte_latency * bytes_required
+        self.realtime = realtime
+        self.writes: list[SimulatedWrite] = []
+        self.total_latency = 0.0
+        self.value = 0
+
+        self._bbm_mask = sum(self._pin_lookup[pin] for pin in break_before_make_pins)
+        self._break_time = break_time
+        self._last_break = float("-inf")
+
+    def _update_output(self, value: int) -> None:
+        start = time.monotonic()
+        if self._bbm_mask:
+            self._check_break_before_make(start, value)
+        if self.realtime:
+            time.sleep(self.latency)
+        self.writes.append(SimulatedWrite(start, value, self.latency))
+        self.total_latency += self.latency
+        self.value = value
+
+    def _check_break_before_make(self, now: float, value: int) -> None:
+        made = value & ~self.value & self._bbm_mask
+        broken = self.value & ~value & self._bbm_mask
+        if made and broken:
+            raise ValueError(
+                f"Break-before-make violated, pins {self._pins(made)} turned on in "
+                f"the same write that turned off {self._pins(broken)}"
+            )
+        if made and now - self._last_break < self._break_time:
+            raise ValueError(
+                f"Break-before-make violated, pins {self._pins(made)} turned on "
+                f"{now - self._last_break:.6f} s after a break, expected at "
+                f"least {self._break_time} s"
+            )
+        if broken:
+            self._last_break = now
+
+    def _pins(self, mask: int) -> list[Pin]:
+        return [pin for pin, bit in self._pin_lookup.items() if bit & mask]
@@ -107,9 +107,19 @@ def get_parser():
         action="append",
         default=[],
     )
-    parser.add_argument(
+    serial_group = parser.add_mutually_exclusive_group()
+    serial_group.add_argument(
         "--serial_number", "--serial-number", help=("Serial number of the DUT.")
     )
+    serial_group.add_argument(
+        "--slots",
+        nargs="+",
+        metavar="SLOT[=SERIAL]",
+        help="""Test several DUTs at once, such as the boards of a panel. One sequence is run per slot,
+                        each with its own serial number and log file. Slots given without a serial
+                        number are prompted for. Mutually exclusive with --serial_number
+                        Eg. --slots A=1234567890 B=1234567891""",
+    )
     parser.add_argument(
         "--log-file", action="store", help="Specify a file to write the log to"
     )
@@ -136,6 +146,7 @@ def load_test_suite(script_path: str, zip_path: str, zip_selector: str):
     """
     Attempts to load a Fixate Script file from an absolute path.
     Try loading from zip, then direct script otherwise
+    Each call imports the script again, as a new module.
     :param script_path:
     :param zip_path:
     :param zip_selector:
@@ -145,14 +156,20 @@ def load_test_suite(script_path: str, zip_path: str, zip_selector: str):
         raise ValueError("Cannot load test suite without appropriate path selected")
     if script_path is not None:
         # Do a script file load
-        importer = SourceFileLoader("module.loaded_tests", script_path)
+        module_name = "module.loaded_tests"
+        importer = SourceFileLoader(module_name, script_path)
         loader = importer.load_module
-        sys.path.insert(0, os.path.dirname(script_path))
+        if os.path.dirname(script_path) not in sys.path:
+            sys.path.insert(0, os.path.dirname(script_path))
     else:
         # Use Zip File
         importer = zipimporter(zip_path)
-        loader = partial(importer.load_module, zip_selector.split(".")[0])
-        sys.path.append(zip_path)
+        module_name = zip_selector.split(".")[0]
+        loader = partial(importer.load_module, module_name)
+        if zip_path not in sys.path:
+            sys.path.append(zip_path)
+    # load_module would otherwise run the script again in the module already loaded
+    sys.modules.pop(module_name, None)
     logger.debug("Sys Path Appended")
     logger.debug("Source File Loaded")
     loaded_script = loader()
@@ -241,6 +258,9 @@ class FixateWorker:
         self.start = False
         self.clean = False
         self.config = None
+        # Set when run with --slots. self.sequencer is then the first slot, which
+        # the test tree and progress of the UI follow.
+        self.parallel = None
 
     def get_task_count(self):
         return self.sequencer.count_tests()
@@ -253,7 +273,10 @@ class FixateWorker:
 
     def stop(self):
         """This function is called in case of unusual termination, and runs in the main thread"""
-        self.sequencer._handle_sequence_abort()
+        if self.parallel is not None:
+            self.parallel.abort()
+        else:
+            self.sequencer._handle_sequence_abort()
         pub.sendMessage(
             "Sequence_Abort", exception=SequenceAbort("Application Closing")
         )
@@ -272,7 +295,13 @@ class FixateWorker:
             if self.args.dev:
                 fixate.config.DEBUG = True
 
-            if self.args.serial_number is None:
+            if self.args.slots:
+                serial_numbers = self._slot_serial_numbers()
+                if serial_numbers is None:
+                    serial_response = "ABORT_FORCE"
+                    return ReturnCodes.ABORTED
+                serial_number = ", ".join(serial_numbers.values())
+            elif self.args.serial_number is None:
                 serial_response = user_serial("Please enter serial number")
                 if serial_response == "ABORT_FORCE":
                     return ReturnCodes.ABORTED
@@ -300,11 +329,10 @@ class FixateWorker:
 
                 self.sequencer.context_data["index"] = self.args.index
             # Load test suite
-            test_suite = load_test_suite(
-                self.args.path, self.args.zip, self.args.zip_selector
-            )
-            test_data = retrieve_test_data(test_suite, self.args.index)
-            self.sequencer.load(test_data)
+            if self.args.slots:
+                self._create_parallel_sequencer(serial_numbers, self._load_test_data)
+            else:
+                self.sequencer.load(self._load_test_data())
 
             if self.args.local_log:
                 try:
@@ -314,7 +342,10 @@ class FixateWorker:
                 except (AttributeError, KeyError):
                     pass
 
-            self.sequencer.run_sequence()
+            if self.parallel is not None:
+                self.parallel.run_sequence()
+            else:
+                self.sequencer.run_sequence()
             if not self.sequencer.non_interactive:
                 user_ok("Finished testing")
 
@@ -332,6 +363,8 @@ class FixateWorker:
                 return ReturnCodes.ERROR
             # Let the supervisor know that the program is finishing normally
             self.clean = True
+            if self.parallel is not None:
+                return parallel_return_code(self.parallel.sequencers.values())
             if self.sequencer.end_status == "FAILED":
                 return ReturnCodes.FAIL
             elif self.sequencer.status == "Aborted":
@@ -342,6 +375,65 @@ class FixateWorker:
                 # Default to Error
                 return ReturnCodes.ERROR
 
+    def _slot_serial_numbers(self):
+        """
+        Parse --slots into a dict of slot to serial number, prompting for any not given.
+        :return: None if the user aborted
+        """
+        serial_numbers = {}
+        for slot_arg in self.args.slots:
+            slot, _, serial_number = slot_arg.partition("=")
+            if slot in serial_numbers:
+                raise ValueError("Slot {} given more than once".format(slot))
+            if not serial_number:
+                serial_response = user_serial(
+                    "Please enter serial number for slot {}".format(slot)
+                )
+                if serial_response == "ABORT_FORCE":
+                    return None
+                elif serial_response[0] == "Exception":
+                    raise serial_response[1]
+                serial_number = serial_response[1]
+            serial_numbers[slot] = serial_number
+        return serial_numbers
+
+    def _load_test_data(self):
+        test_suite = load_test_suite(
+            self.args.path, self.args.zip, self.args.zip_selector
+        )
+        return retrieve_test_data(test_suite, self.args.index)
+
+    def _create_parallel_sequencer(self, serial_numbers, test_factory):
+        """
+        Run the tests from test_factory on each slot, with the context data and settings
+        given to self.sequencer. test_factory is called for each slot, since test instances
+        keep state.
+
+        self.sequencer and RESOURCES["SEQUENCER"] are then the first slot's sequencer, for
+        the UI and for any code that runs outside of a slot.
+        """
+        self.parallel = fixate.sequencer.ParallelSequencer(serial_numbers)
+        self.parallel.non_interactive = self.sequencer.non_interactive
+        for sequencer in self.parallel.sequencers.values():
+            for key, value in self.sequencer.context_data.items():
+                sequencer.context_data.setdefault(key, value)
+        self.parallel.load(test_factory)
+        self.sequencer = next(iter(self.parallel.sequencers.values()))
+        fixate.config.RESOURCES["SEQUENCER"] = self.sequencer
+
+
+def parallel_return_code(sequencers):
+    """The return code for all slots, from the worst result of any slot"""
+    sequencers = list(sequencers)
+    if any(seq.status == "Aborted" for seq in sequencers):
+        return ReturnCodes.ABORTED
+    end_status = {seq.end_status for seq in sequencers}
+    if end_status == {"PASSED"}:
+        return ReturnCodes.PASS
+    elif end_status <= {"PASSED", "FAILED"}:
+        return ReturnCodes.FAIL
+    return ReturnCodes.ERROR
+
 
 def retrieve_test_data(test_suite, index):
     """
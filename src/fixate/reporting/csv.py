@@ -86,6 +86,7 @@ Test End
 """
 import csv
 import datetime
+import functools
 import sys
 import os
 import time
@@ -112,7 +113,14 @@ class TestClassImp(TestClass):
 
 
 class CSVWriter:
-    def __init__(self):
+    def __init__(self, sequencer=None):
+        """
+        :param sequencer:
+         Only report messages published while this sequencer is fixate.config.current_sequencer().
+         Used by ParallelSequencer, so each slot writes its own file. Default is to report every message
+         for the sequencer in fixate.config.RESOURCES.
+        """
+        self.sequencer = sequencer
         self.csv_queue = Queue()
         self.csv_writer = None
 
@@ -127,18 +135,38 @@ class CSVWriter:
         self.data.update(fixate.config.get_plugin_data("plg_csv"))
         self.exception = None
 
+        # pubsub only keeps weak references to listeners, so the filtered listeners are kept here
         self._topics = [
-            (self.test_start, "Test_Start"),
-            (self.test_comparison, "Check"),
-            (self.test_exception, "Test_Exception"),
-            (self.test_complete, "Test_Complete"),
-            (self.sequence_update, "Sequence_Update"),
-            (self.sequence_complete, "Sequence_Complete"),
-            (self.user_wait_start, "UI_block_start"),
-            (self.user_wait_end, "UI_block_end"),
-            (self.driver_open, "driver_open"),
+            (self._filter_sequencer(callback), topic)
+            for callback, topic in [
+                (self.test_start, "Test_Start"),
+                (self.test_comparison, "Check"),
+                (self.test_exception, "Test_Exception"),
+                (self.test_complete, "Test_Complete"),
+                (self.sequence_update, "Sequence_Update"),
+                (self.sequence_complete, "Sequence_Complete"),
+                (self.user_wait_start, "UI_block_start"),
+                (self.user_wait_end, "UI_block_end"),
+                (self.driver_open, "driver_open"),
+            ]
         ]
 
+    def _filter_sequencer(self, callback):
+        if self.sequencer is None:
+            return callback
+
+        @functools.wraps(callback)
+        def listener(*args, **kwargs):
+            if fixate.config.current_sequencer() is self.sequencer:
+                callback(*args, **kwargs)
+
+        return listener
+
+    def _current_sequencer(self):
+        if self.sequencer is None:
+            return fixate.config.current_sequencer()
+        return self.sequencer
+
     def install(self):
         self.csv_writer = ExcThread(target=self._csv_write, name="csv-writer")
         self.csv_writer.start()
@@ -168,7 +196,7 @@ class CSVWriter:
     def sequence_update(self, status):
         # Do Start Sequence Reporting
         if status in ["Running"]:
-            sequencer = fixate.config.RESOURCES["SEQUENCER"]
+            sequencer = self._current_sequencer()
             self.data.update(sequencer.context_data)
             # Create new csv path
             self.data["start_date_time"] = self.data["tpl_time_stamp"].format(
@@ -183,6 +211,14 @@ class CSVWriter:
                         self.data["tpl_csv_path"], **self.data, self=self
                     )
                 )
+            slot = getattr(sequencer, "slot", None)
+            if slot is not None and (
+                fixate.config.log_file
+                or "{slot}" not in "".join(self.data["tpl_csv_path"])
+            ):
+                # Each slot of a ParallelSequencer needs its own file
+                root, ext = os.path.splitext(self.csv_path)
+                self.csv_path = f"{root}-{slot}{ext}"
             self.data["fixate_version"] = fixate.__version__
             # Add dev if installed in editable mode
             if "site-packages" not in __file__:
@@ -288,7 +324,7 @@ class CSVWriter:
     def test_complete(self, data, test_index, status):
         self.current_test = test_index
         try:
-            sequencer = fixate.config.RESOURCES["SEQUENCER"]
+            sequencer = self._current_sequencer()
             passed = sequencer.chk_pass
             failed = sequencer.chk_fail
 
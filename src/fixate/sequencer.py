@@ -1,8 +1,10 @@
 import sys
-import time
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pubsub import pub
-from fixate.core.common import TestList, TestClass
+import fixate.config
+from fixate.core.common import TestList, TestClass, FIXTURE_SCOPES
 from fixate.core.exceptions import SequenceAbort, CheckFail
 from fixate.core.ui import user_retry_abort_fail
 from fixate.core.checks import CheckResult
@@ -83,6 +85,16 @@ def test_list_repr(test_list):
     return ret_list
 
 
+class TestTreeIndex:
+    """The test tree, flattened once by test_list_repr when the tests are loaded"""
+
+    def __init__(self, test_list):
+        self.entries = test_list_repr(test_list)
+        self.test_count = sum(
+            1 for entry in self.entries if entry["test_type"] == "test"
+        )
+
+
 def get_parent_level(level):
     m = re.match(r"^\d+$", level)
 
@@ -94,9 +106,15 @@ def get_parent_level(level):
 
 
 class Sequencer:
-    def __init__(self):
+    def __init__(self, slot=None):
+        """
+        :param slot: The UUT slot, for a sequencer created by ParallelSequencer.
+        """
+        self.slot = slot
         self.tests = TestList()
         self._status = "Idle"
+        # Notified on every change of status, so run_once can wait while paused
+        self._status_changed = threading.Condition()
         self.active_test = None
         self.ABORT = False
         self.test_attempts = 0
@@ -108,9 +126,16 @@ class Sequencer:
         self.tests_skipped = 0
         self._skip_tests = set([])
         self.context = ContextStack()
+        self.test_tree = TestTreeIndex(self.tests)
+        # Number of tests the context stack has moved past
+        self._tests_completed = 0
+        # Test lists and classes with a fixture_scope other than "test" that have
+        # been set up, in order
+        self._fixtures = []
         self.context_data = {}
         self.end_status = "N/A"
-        self.reporting_service = CSVWriter()
+        # A slot's reports only include the messages published while it is running
+        self.reporting_service = CSVWriter() if slot is None else CSVWriter(self)
 
         # Sequencer behaviour. Don't ask the user when things to wrong, just marks tests as failed.
         # This does not change the behaviour of tests that call out to the user. They will still block as required.
@@ -160,57 +185,50 @@ class Sequencer:
                 )
             else:
                 self._status = val
+            with self._status_changed:
+                self._status_changed.notify_all()
+
+    def wait_while_paused(self, timeout=None):
+        """
+        Block until the sequence is running or aborted.
+
+        :return: False if timeout seconds passed first, otherwise True
+        """
+        with self._status_changed:
+            return self._status_changed.wait_for(
+                lambda: self._status in ("Running", "Aborted"), timeout
+            )
 
     def load(self, val):
         self.tests.append(val)
         self.context.push(self.tests)
         self.end_status = "N/A"
+        self.test_tree = TestTreeIndex(self.tests)
+        self._tests_completed = 0
 
     def count_tests(self):
         """Get the total number of tests"""
-        return sum(
-            1
-            for test in test_list_repr(self.context[0].testlist)
-            if test.get("test_type") == "test"
-        )
+        return self.test_tree.test_count
 
     def tests_completed(self):
-        """Count the number of tests remaining"""
-        current_index = "0"
-        search_index = 0
-
-        for index, test in enumerate(self.context):
-            if index == 0:
-                pass
-            elif index == 1:
-                current_index = str(test.index + 1)
-            else:
-                current_index += "." + str(test.index + 1)
-
-        try:
-            for index, test in enumerate(test_list_repr(self.context[0].testlist)):
-                if test.get("test_type") == "test":
-                    search_index += 1
-                if test.get("level") == current_index:
-                    return search_index
-
-        except IndexError:
+        """
+        Count the number of tests completed, including the test in progress.
+        Returns 0 when no sequence is loaded or once it has finished.
+        """
+        if not self.context:
             return 0
-
-        return 0
+        top = self.context.top()
+        if top.index < len(top.testlist) and isinstance(top.current(), TestClass):
+            return self._tests_completed + 1
+        return self._tests_completed
 
     def get_tree(self):
         """Get the test tree as a list"""
-
-        tree = []
-        tests = test_list_repr(self.context[0].testlist)
-
-        for test in tests:
-            if len(test.get("level")) != 0:
-                tree.append(["", ""])
-                tree[-1][0] = test.get("level")
-                tree[-1][1] = test.get("test_name")
-        return tree
+        return [
+            [test["level"], test["test_name"]]
+            for test in self.test_tree.entries
+            if len(test["level"]) != 0
+        ]
 
     def run_sequence(self):
         """
@@ -222,11 +240,14 @@ class Sequencer:
         try:
             self.run_once()
         finally:
-            while self.context:
-                top = self.context.top()
-                if isinstance(top.current(), TestList):
-                    top.current().exit()
-                self.context.pop()
+            try:
+                self._tear_down_fixtures()
+            finally:
+                while self.context:
+                    top = self.context.top()
+                    if isinstance(top.current(), TestList):
+                        top.current().exit()
+                    self.context.pop()
 
         self.reporting_service.uninstall()
 
@@ -262,17 +283,24 @@ class Sequencer:
                             data=top.testlist,
                             test_index=self.levels(),
                         )
+                        if len(self.context) <= 1:
+                            # The end of the sequence
+                            self._tear_down_fixtures()
+                        elif self._fixture_scope(top.testlist) == "list":
+                            self._tear_down_fixtures([top.testlist])
                         top.testlist.exit()
                         if self.context:
                             self.context.top().index += 1
                     elif isinstance(top.current(), TestClass):
                         if self.run_test():
                             top.index += 1
+                            self._tests_completed += 1
                         else:
                             if not self.retry_prompt():
                                 # mark the test as failed and continue. else will loop and try again
                                 self.tests_failed += 1
                                 top.index += 1
+                                self._tests_completed += 1
                     elif isinstance(top.current(), TestList):
                         pub.sendMessage(
                             "TestList_Start",
@@ -293,9 +321,10 @@ class Sequencer:
                     self._handle_sequence_abort()
                     return
             elif self.status != "Aborted":
-                time.sleep(0.1)
+                self.wait_while_paused()
             else:
                 return
+        self._tear_down_fixtures()
         self.status = "Finished"
 
     def run_test(self):
@@ -331,13 +360,20 @@ class Sequencer:
                     break
                 self.chk_fail, self.chk_pass = 0, 0
                 # Run the test
+                per_test = []
                 try:
-                    for index_context, current_level in enumerate(self.context):
-                        current_level.current().set_up()
+                    for current_level in self.context:
+                        item = current_level.current()
+                        if self._fixture_scope(item) == "test":
+                            per_test.append(item)
+                            item.set_up()
+                        elif not any(item is fixture for fixture in self._fixtures):
+                            item.set_up()
+                            self._fixtures.append(item)
                     active_test.test()
                 finally:
-                    for current_level in self.context[index_context::-1]:
-                        current_level.current().tear_down()
+                    for item in reversed(per_test):
+                        item.tear_down()
                 if not self.chk_fail:
                     active_test_status = "PASS"
                     self.tests_passed += 1
@@ -356,6 +392,7 @@ class Sequencer:
                 if self.ABORT:  # Program force quit
                     active_test_status = "ERROR"
                     raise SequenceAbort("Sequence Aborted")
+                self._tear_down_context_fixtures()
                 pub.sendMessage(
                     "Test_Exception",
                     exception=sys.exc_info()[1],
@@ -371,6 +408,7 @@ class Sequencer:
                 active_test_status = "ERROR"
                 if self.ABORT:  # Program force quit
                     raise SequenceAbort("Sequence Aborted")
+                self._tear_down_context_fixtures()
                 pub.sendMessage(
                     "Test_Exception",
                     exception=sys.exc_info()[1],
@@ -379,6 +417,8 @@ class Sequencer:
 
             # Retry Logic
             pub.sendMessage("Test_Retry", data=active_test, test_index=self.levels())
+        # A test's set_up is never kept beyond the test itself
+        self._tear_down_fixtures([active_test])
         pub.sendMessage(
             "Test_Complete",
             data=active_test,
@@ -387,6 +427,31 @@ class Sequencer:
         )
         return active_test_status == "PASS"
 
+    @staticmethod
+    def _fixture_scope(item):
+        scope = item.fixture_scope
+        if scope not in FIXTURE_SCOPES:
+            raise ValueError(
+                "Invalid fixture_scope {!r} for {}, expected one of {}".format(
+                    scope, item.test_desc, ", ".join(FIXTURE_SCOPES)
+                )
+            )
+        return scope
+
+    def _tear_down_fixtures(self, items=None):
+        """
+        Tear down scoped fixtures, in the reverse order they were set up.
+        :param items: Only tear down these test lists or classes. Default is all.
+        """
+        for fixture in reversed(self._fixtures[:]):
+            if items is None or any(fixture is item for item in items):
+                self._fixtures.remove(fixture)
+                fixture.tear_down()
+
+    def _tear_down_context_fixtures(self):
+        """After a test raised, scoped fixtures of the current test are set up again"""
+        self._tear_down_fixtures([level.current() for level in self.context])
+
     def retry_prompt(self):
         """Prompt the user when something goes wrong.
 
@@ -422,3 +487,119 @@ class Sequencer:
         if not chk.result:
             raise CheckFail("Check function returned failure, aborting test")
         return chk.result
+
+
+class ParallelSequencer:
+    """
+    Run the same test sequence on several UUTs at once, for example the boards
+    of a panel.
+
+    Each slot has its own Sequencer, with its own context stack, check counts,
+    context_data["serial_number"] and CSV report. The slots are run on a thread
+    pool, with fixate.config.current_sequencer() set to the slot's sequencer, so
+    checks and reports in a test are for the UUT the test is running on.
+
+    Instruments shared between slots must be leased in the test scripts with
+    fixate.drivers.lease. A "Slot_Update" message, with the slot_status()
+    of every slot, is sent whenever a test or a slot's sequence completes.
+    """
+
+    def __init__(self, serial_numbers, max_workers=None):
+        """
+        :param serial_numbers: Mapping of slot name to the serial number of its UUT
+        :param max_workers: Maximum number of slots to run at once. Default is every slot.
+        """
+        self.sequencers = {}
+        for slot, serial_number in serial_numbers.items():
+            sequencer = Sequencer(slot=slot)
+            sequencer.context_data["slot"] = slot
+            sequencer.context_data["serial_number"] = serial_number
+            self.sequencers[slot] = sequencer
+        self.max_workers = max_workers or len(self.sequencers)
+        # Tests completed by each slot, only updated from the slot's own thread
+        self._progress = {slot: 0 for slot in self.sequencers}
+
+    @property
+    def non_interactive(self):
+        return all(seq.non_interactive for seq in self.sequencers.values())
+
+    @non_interactive.setter
+    def non_interactive(self, val):
+        for seq in self.sequencers.values():
+            seq.non_interactive = val
+
+    def load(self, test_factory):
+        """
+        :param test_factory: Called once per slot to create its tests, since
+         test instances keep state between set_up, test and tear_down.
+        """
+        for slot, sequencer in self.sequencers.items():
+            sequencer.load(test_factory())
+            self._progress[slot] = 0
+
+    def run_sequence(self):
+        """
+        Run the sequence of every slot, and wait for them all to finish
+        :return: dict of slot name to the sequencer's end_status
+        """
+        pub.subscribe(self._test_complete, "Test_Complete")
+        pub.subscribe(self._sequence_complete, "Sequence_Complete")
+        try:
+            with ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="fixate-slot"
+            ) as pool:
+                futures = [
+                    pool.submit(self._run_slot, sequencer)
+                    for sequencer in self.sequencers.values()
+                ]
+            for future in futures:
+                future.result()
+        finally:
+            pub.unsubscribe(self._test_complete, "Test_Complete")
+            pub.unsubscribe(self._sequence_complete, "Sequence_Complete")
+        return {slot: seq.end_status for slot, seq in self.sequencers.items()}
+
+    @staticmethod
+    def _run_slot(sequencer):
+        with fixate.config.use_sequencer(sequencer):
+            sequencer.run_sequence()
+
+    def abort(self):
+        """Abort every slot that hasn't finished"""
+        for sequencer in self.sequencers.values():
+            if sequencer.status not in ["Finished", "Aborted"]:
+                with fixate.config.use_sequencer(sequencer):
+                    sequencer._handle_sequence_abort()
+
+    def slot_status(self):
+        """The progress of each slot, as a list of dicts in slot order"""
+        return [
+            {
+                "slot": slot,
+                "serial_number": sequencer.context_data.get("serial_number"),
+                "status": sequencer.status,
+                "end_status": sequencer.end_status,
+                "tests_completed": self._progress[slot],
+                "test_count": sequencer.count_tests(),
+            }
+            for slot, sequencer in self.sequencers.items()
+        ]
+
+    def _current_slot(self):
+        sequencer = fixate.config.current_sequencer()
+        for slot, seq in self.sequencers.items():
+            if seq is sequencer:
+                return slot
+        return None
+
+    def _test_complete(self, data, test_index, status):
+        slot = self._current_slot()
+        if slot is not None:
+            self._progress[slot] = self.sequencers[slot].tests_completed()
+            pub.sendMessage("Slot_Update", slots=self.slot_status())
+
+    def _sequence_complete(
+        self, status, passed, failed, error, skipped, sequence_status
+    ):
+        if self._current_slot() is not None:
+            pub.sendMessage("Slot_Update", slots=self.slot_status())
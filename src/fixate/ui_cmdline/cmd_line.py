@@ -8,7 +8,7 @@ from queue import Queue
 from fixate.core.exceptions import UserInputError
 from fixate.core.common import ExcThread
 from fixate.core.checks import CheckResult
-from fixate.config import RESOURCES
+from fixate.config import current_sequencer
 import fixate.config
 
 wrapper = textwrap.TextWrapper(width=75)
@@ -95,6 +95,7 @@ def register_cmd_line():
     pub.subscribe(_print_test_skip, "Test_Skip")
     pub.subscribe(_print_test_retry, "Test_Retry")
     pub.subscribe(_user_action, "UI_action")
+    pub.subscribe(_print_slot_update, "Slot_Update")
     key_hook.install()
 
     return
@@ -263,9 +264,7 @@ def _print_sequence_end(status, passed, failed, error, skipped, sequence_status)
     print("#" * wrapper.width)
     print(reformat_text("Sequence {}".format(sequence_status)))
     # print("Sequence {}".format(sequence_status))
-    post_sequence_info = RESOURCES["SEQUENCER"].context_data.get(
-        "_post_sequence_info", {}
-    )
+    post_sequence_info = current_sequencer().context_data.get("_post_sequence_info", {})
     if post_sequence_info:
         print("-" * wrapper.width)
         print("IMPORTANT INFORMATION")
@@ -292,7 +291,7 @@ def _print_test_start(data, test_index):
 
 
 def _print_test_complete(data, test_index, status):
-    sequencer = RESOURCES["SEQUENCER"]
+    sequencer = current_sequencer()
     print("-" * wrapper.width)
     print(
         reformat_text(
@@ -307,6 +306,17 @@ def _print_test_complete(data, test_index, status):
     print("-" * wrapper.width)
 
 
+def _print_slot_update(slots):
+    """One column per UUT slot of a ParallelSequencer"""
+    columns = [
+        "{slot} {serial_number}: {tests_completed}/{test_count} {status}".format(**slot)
+        for slot in slots
+    ]
+    print("=" * wrapper.width)
+    print(" | ".join(columns))
+    print("=" * wrapper.width)
+
+
 def _print_test_skip(data, test_index):
     print("\nTest Marked as skip")
 
@@ -10,7 +10,7 @@ from PyQt5 import QtCore, QtGui, QtWidgets
 from PyQt5.QtCore import QObject, QThread, pyqtSignal, Qt, QRectF
 from pubsub import pub
 import fixate.config
-from fixate.config import RESOURCES
+from fixate.config import current_sequencer
 from fixate.core.checks import CheckResult
 from fixate.core.exceptions import UserInputError, SequenceAbort
 from . import layout
@@ -104,6 +104,9 @@ class FixateGUI(QtWidgets.QMainWindow, layout.Ui_FixateUI):
     sig_button_reset = pyqtSignal()
     sig_progress_set_max = pyqtSignal(int)
 
+    # Progress of each UUT slot, when run with --slots
+    sig_slot_update = pyqtSignal(list)
+
     """Class Constructor and destructor"""
 
     def __init__(self, worker, application):
@@ -122,6 +125,14 @@ class FixateGUI(QtWidgets.QMainWindow, layout.Ui_FixateUI):
         self.TestTree.header().setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)
         self.TestTree.header().setSectionResizeMode(1, QtWidgets.QHeaderView.Fixed)
 
+        # A progress bar per UUT slot, side by side above the main progress bar.
+        # Created by the first Slot_Update, so there is nothing to show without --slots.
+        self.slot_bars = {}
+        self.SlotLayout = QtWidgets.QHBoxLayout()
+        self.FrameLayout.insertLayout(
+            self.FrameLayout.indexOf(self.ProgressBar), self.SlotLayout
+        )
+
         self.dialog = None
         self.image_scene = QtWidgets.QGraphicsScene()
         self.ImageView.set_scene(self.image_scene)
@@ -183,6 +194,7 @@ class FixateGUI(QtWidgets.QMainWindow, layout.Ui_FixateUI):
         self.sig_image_clear.connect(self.on_image_clear)
         self.sig_button_reset.connect(self.on_button_reset)
         self.sig_progress_set_max.connect(self.on_progress_set_max)
+        self.sig_slot_update.connect(self.on_slot_update)
 
     """Pubsub handlers for setup and teardown
        These are run in the main thread"""
@@ -212,11 +224,25 @@ class FixateGUI(QtWidgets.QMainWindow, layout.Ui_FixateUI):
 
         pub.subscribe(self._topic_UI_block_start, "UI_block_start")
         pub.subscribe(self._topic_UI_block_end, "UI_block_end")
+        pub.subscribe(self._topic_Slot_Update, "Slot_Update")
 
     def _topic_Test_Start(self, data, test_index):
         self._print_test_start(data, test_index)
         self.sig_indicator_start.emit()
 
+    def _topic_Slot_Update(self, slots):
+        if self.closing:
+            return
+
+        self.sig_slot_update.emit(slots)
+
+    def _shows_tree(self):
+        """
+        The test tree and progress bar follow the worker's sequencer. When run with --slots,
+        that is the first slot, and the other slots are only shown by their slot progress bars.
+        """
+        return current_sequencer() is self.worker.worker.sequencer
+
     def _topic_UI_block_end(self):
         self.sig_image_clear.emit()
         self.sig_active_clear.emit()
@@ -682,6 +708,20 @@ class FixateGUI(QtWidgets.QMainWindow, layout.Ui_FixateUI):
     def on_progress_set_max(self, test_count):
         self.ProgressBar.setMaximum(test_count)
 
+    def on_slot_update(self, slots):
+        for slot in slots:
+            bar = self.slot_bars.get(slot["slot"])
+            if bar is None:
+                bar = QtWidgets.QProgressBar(self.MainWindow)
+                self.slot_bars[slot["slot"]] = bar
+                self.SlotLayout.addWidget(bar)
+            bar.setMaximum(max(slot["test_count"], 1))
+            bar.setValue(slot["tests_completed"])
+            # %v and %m are the value and maximum of the bar
+            bar.setFormat("{slot} {serial_number}: %v/%m {status}".format(**slot))
+            if slot["end_status"] in ["FAILED", "ERROR"]:
+                bar.setStyleSheet(ERROR_STYLE)
+
     """Thread listener, called from the sequencer thread"""
 
     def _completion_code(self, code):
@@ -864,7 +904,7 @@ class FixateGUI(QtWidgets.QMainWindow, layout.Ui_FixateUI):
             return
 
         self.sig_history_update.emit("#" * wrapper.width)
-        post_sequence_info = RESOURCES["SEQUENCER"].context_data.get(
+        post_sequence_info = current_sequencer().context_data.get(
             "_post_sequence_info", {}
         )
         if post_sequence_info:
@@ -890,29 +930,31 @@ class FixateGUI(QtWidgets.QMainWindow, layout.Ui_FixateUI):
         if self.closing:
             return
 
-        self.sig_progress.emit()
         self.sig_history_update.emit("*" * wrapper.width)
         self.sig_history_update.emit(
             self.reformat_text("Test {}: {}".format(test_index, data.test_desc))
         )
         self.sig_history_update.emit("-" * wrapper.width)
-        self.sig_label_update.emit(test_index, data.test_desc)
-        self.sig_tree_update.emit(test_index, "In Progress")
+        if self._shows_tree():
+            self.sig_progress.emit()
+            self.sig_label_update.emit(test_index, data.test_desc)
+            self.sig_tree_update.emit(test_index, "In Progress")
 
     def _topic_TestList_Start(self, data, test_index):
         if self.closing:
             return
 
-        self.sig_progress_set_max.emit(self.worker.worker.get_task_count())
-        self.sig_tree_init.emit(self.worker.worker.get_test_tree())
-        self.sig_progress.emit()
+        if self._shows_tree():
+            self.sig_progress_set_max.emit(self.worker.worker.get_task_count())
+            self.sig_tree_init.emit(self.worker.worker.get_test_tree())
+            self.sig_progress.emit()
         self._print_test_start(data, test_index)
 
     def _topic_Test_Complete(self, data, test_index, status):
         if self.closing:
             return
 
-        sequencer = RESOURCES["SEQUENCER"]
+        sequencer = current_sequencer()
         self.sig_history_update.emit("-" * wrapper.width)
         self.sig_history_update.emit(
             self.reformat_text(
@@ -926,7 +968,7 @@ class FixateGUI(QtWidgets.QMainWindow, layout.Ui_FixateUI):
         )
         self.sig_history_update.emit("-" * wrapper.width)
 
-        if status.upper() in ["ERROR", "SKIPPED"]:
+        if status.upper() in ["ERROR", "SKIPPED"] or not self._shows_tree():
             return
 
         if sequencer.chk_fail == 0:
@@ -939,7 +981,8 @@ class FixateGUI(QtWidgets.QMainWindow, layout.Ui_FixateUI):
             return
 
         self.sig_history_update.emit("\nTest Marked as skip")
-        self.sig_tree_update.emit(test_index, "Skipped")
+        if self._shows_tree():
+            self.sig_tree_update.emit(test_index, "Skipped")
 
     def _topic_Test_Retry(self, data, test_index):
         if self.closing:
@@ -953,10 +996,11 @@ class FixateGUI(QtWidgets.QMainWindow, layout.Ui_FixateUI):
         if self.closing:
             return
 
-        if isinstance(exception, SequenceAbort):
-            self.sig_tree_update.emit(test_index, "Aborted")
-        else:
-            self.sig_tree_update.emit(test_index, "Error")
+        if self._shows_tree():
+            if isinstance(exception, SequenceAbort):
+                self.sig_tree_update.emit(test_index, "Aborted")
+            else:
+                self.sig_tree_update.emit(test_index, "Error")
         self.sig_history_update.emit("")
         self.sig_history_update.emit("!" * wrapper.width)
         self.sig_active_update.emit("!" * wrapper.width)
@@ -0,0 +1,154 @@
+"""
+Micro-benchmark of the FTDI bit-bang frame encoders in fixate.drivers.ftdi
+
+Compares FTDI2xx._serial_shift_bit_bang, which encodes one bit at a time, with
+the table driven FTDI2xx._serial_shift_bit_bang_table used by
+serial_shift_bit_bang, for shift register chains of different lengths. No FTDI
+device is opened.
+
+Run from the repository root:
+
+    python test/benchmark_ftdi_encoder.py --output ftdi_encoder.json
+
+The results are written as JSON, so they can be compared between releases.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import types
+
+import fixate
+
+CHAIN_BYTES = (1, 5, 40)
+
+
+def import_ftdi():
+    """
+    Import fixate.drivers.ftdi. The encoders don't call the FTDI library, so
+    if it isn't installed, a placeholder is used to allow the import.
+    """
+    try:
+        from fixate.drivers import ftdi
+    except ImportError:
+        placeholder = types.ModuleType("fixate.drivers._ftdi")
+        placeholder.ftdI2xx = None
+        sys.modules["fixate.drivers._ftdi"] = placeholder
+        from fixate.drivers import ftdi
+    return ftdi
+
+
+def make_encoder(ftdi, bytes_required, invert_mask=0):
+    """An FTDI2xx configured as per FTDIAddressHandler, without opening a device"""
+    encoder = ftdi.FTDI2xx.__new__(ftdi.FTDI2xx)
+    encoder.bit_mode = ftdi.BIT_MODE.FT_BITMODE_ASYNC_BITBANG
+    encoder.bb_bytes = bytes_required
+    encoder.bb_data = 4
+    encoder.bb_clk = 2
+    encoder.bb_latch = 1
+    encoder.bb_inv_mask = invert_mask
+    encoder.bb_chains = (encoder.bb_data,)
+    encoder._bb_table = []
+    encoder._bb_table_key = None
+    encoder._bb_data_tables = {}
+    return encoder
+
+
+def measure(func, values):
+    """Call func for each value, and return timing statistics per call in seconds"""
+    times = []
+    for value in values:
+        start = time.perf_counter()
+        func(value)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return {
+        "iterations": len(times),
+        "mean_s": sum(times) / len(times),
+        "median_s": times[len(times) // 2],
+        "min_s": times[0],
+    }
+
+
+def bench_chain(ftdi, bytes_required, iterations):
+    encoder = make_encoder(ftdi, bytes_required)
+    rng = random.Random(bytes_required)
+    values = [rng.getrandbits(bytes_required * 8) for _ in range(iterations)]
+    for value in values[:10]:
+        assert encoder._serial_shift_bit_bang(
+            value, bytes_required, 0
+        ) == encoder._serial_shift_bit_bang_table(value, bytes_required, 0)
+
+    results = {}
+    results["table_build"] = measure(
+        lambda _: make_encoder(ftdi, bytes_required)._bit_bang_table(0),
+        range(max(1, iterations // 100)),
+    )
+    results["per_bit"] = measure(
+        lambda value: encoder._serial_shift_bit_bang(value, bytes_required, 0),
+        values,
+    )
+    results["table"] = measure(
+        lambda value: encoder._serial_shift_bit_bang_table(value, bytes_required, 0),
+        values,
+    )
+    results["speedup"] = results["per_bit"]["median_s"] / results["table"]["median_s"]
+
+    # three chains on D2, D3 and D4, interleaved into one frame
+    chains = make_encoder(ftdi, bytes_required)
+    chains.bb_chains = (4, 8, 16)
+    results["three_chains"] = measure(
+        lambda value: chains._serial_shift_chains(
+            (value, value, value), bytes_required, 0
+        ),
+        values,
+    )
+    return results
+
+
+def run(chain_bytes=CHAIN_BYTES, iterations=2000):
+    ftdi = import_ftdi()
+    return {
+        "fixate_version": fixate.__version__,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "benchmarks": [
+            {
+                "bytes": bytes_required,
+                "results": bench_chain(ftdi, bytes_required, iterations),
+            }
+            for bytes_required in chain_bytes
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--output", "-o", help="JSON file to write results to")
+    parser.add_argument("--iterations", "-n", type=int, default=2000)
+    parser.add_argument(
+        "--bytes", type=int, nargs="+", default=CHAIN_BYTES, metavar="N"
+    )
+    args = parser.parse_args()
+
+    report = run(args.bytes, args.iterations)
+    for bench in report["benchmarks"]:
+        results = bench["results"]
+        print(
+            f"bytes={bench['bytes']} "
+            f"per_bit={results['per_bit']['median_s'] * 1e6:.1f}us "
+            f"table={results['table']['median_s'] * 1e6:.1f}us "
+            f"speedup={results['speedup']:.1f}x"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Measure the relay chain update rate of an FTDIAddressHandler on real hardware
+
+Each mode shifts alternating patterns out to the chain and reports the time
+per update, including the USB transfer. Requires an FTDI device wired to a
+shift register chain. MPSSE needs a Hi-Speed device (FT232H, FT2232H) wired
+as documented on FTDIAddressHandler.
+
+Run from the repository root:
+
+    python test/benchmark_ftdi_update_rate.py "Relay Jig" --pins 40 --modes async sync
+
+The results are written as JSON, so they can be compared between releases.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+
+import fixate
+from fixate.drivers.handlers import FTDIAddressHandler
+
+from benchmark_ftdi_encoder import measure
+
+MODES = ("async", "sync", "mpsse")
+
+
+def bench_mode(description, pins, mode, iterations, clock_rate):
+    handler = FTDIAddressHandler(
+        [f"P{i}" for i in range(pins)],
+        description,
+        mode=mode,
+        clock_rate=clock_rate,
+    )
+    every_other = handler.pin_list[::2]
+    patterns = [every_other, handler.pin_list[1::2]]
+    try:
+        # Open the device before timing
+        handler.set_pins([])
+        result = measure(lambda i: handler.set_pins(patterns[i % 2]), range(iterations))
+    finally:
+        handler.close()
+    result["updates_per_s"] = 1 / result["median_s"]
+    return result
+
+
+def run(description, pins, modes=MODES, iterations=1000, clock_rate=1_000_000):
+    return {
+        "fixate_version": fixate.__version__,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "ftdi_description": description,
+        "pins": pins,
+        "benchmarks": [
+            {
+                "mode": mode,
+                "results": bench_mode(description, pins, mode, iterations, clock_rate),
+            }
+            for mode in modes
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("description", help="FTDI description, as for ftdi.open")
+    parser.add_argument("--pins", type=int, default=40)
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    parser.add_argument("--clock-rate", type=int, default=1_000_000)
+    parser.add_argument("--output", "-o", help="JSON file to write results to")
+    parser.add_argument("--iterations", "-n", type=int, default=1000)
+    args = parser.parse_args()
+
+    report = run(
+        args.description, args.pins, args.modes, args.iterations, args.clock_rate
+    )
+    for bench in report["benchmarks"]:
+        results = bench["results"]
+        print(
+            f"mode={bench['mode']} "
+            f"median={results['median_s'] * 1e6:.1f}us "
+            f"rate={results['updates_per_s']:.0f}/s"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Micro-benchmarks for the switching engine in fixate._switching
+
+Synthetic jigs are built from relay matrix modules, each with 16 pins and a
+RelayMatrixMux with one signal per pin. Every 4 modules share an in-memory
+AddressHandler, similar to a chain of shift registers on a single FTDI.
+
+Run from the repository root:
+
+    python test/benchmark_switching.py --output switching.json
+
+The results are written as JSON, so they can be compared between releases.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import time
+from typing import Callable
+
+import fixate
+from fixate import (
+    JigDriver,
+    MuxGroup,
+    PinValueAddressHandler,
+    RelayMatrixMux,
+    generate_pin_group,
+)
+
+MODULE_COUNTS = (1, 16, 64)
+MODULES_PER_HANDLER = 4
+
+
+class MemoryHandler(PinValueAddressHandler):
+    """Stand-in for FTDIAddressHandler that keeps the last value written"""
+
+    def __init__(self, pins):
+        super().__init__(pins)
+        self.value = 0
+        self.writes = 0
+
+    def _update_output(self, value):
+        self.value = value
+        self.writes += 1
+
+
+def relay_matrix_mux(designator):
+    pins = generate_pin_group(designator, prefix="RM")
+
+    class BenchRelayMatrix(RelayMatrixMux):
+        # We are benchmarking CPU time, not waiting for relays
+        clearing_time = 0.0
+        pin_list = pins
+        map_list = tuple((f"RM{designator}_SIG{i}", pin) for i, pin in enumerate(pins))
+
+    return BenchRelayMatrix()
+
+
+def make_jig(modules, compiled):
+    class BenchMuxGroup(MuxGroup):
+        def __init__(self):
+            for designator in range(1, modules + 1):
+                setattr(self, f"rm{designator}", relay_matrix_mux(designator))
+
+    handlers = [
+        MemoryHandler(
+            [
+                pin
+                for designator in range(
+                    first, min(first + MODULES_PER_HANDLER, modules + 1)
+                )
+                for pin in generate_pin_group(designator, prefix="RM")
+            ]
+        )
+        for first in range(1, modules + 1, MODULES_PER_HANDLER)
+    ]
+    return JigDriver(BenchMuxGroup, handlers, compiled=compiled)
+
+
+def measure(func: Callable[[], object], iterations: int) -> dict:
+    """Call func iterations times, and return timing statistics per call in seconds"""
+    times = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return {
+        "iterations": iterations,
+        "mean_s": sum(times) / iterations,
+        "median_s": times[iterations // 2],
+        "min_s": times[0],
+    }
+
+
+def bench_jig(modules, compiled, iterations):
+    results = {}
+    results["construction"] = measure(
+        lambda: make_jig(modules, compiled), max(1, iterations // 100)
+    )
+
+    jig = make_jig(modules, compiled)
+    muxes = jig.mux.get_multiplexers()
+    # sweep every signal on a single mux, which is typical of a test script
+    sweep_mux = muxes[-1]
+    signals = sweep_mux.all_signals()
+    sweep = iter(signals * (iterations // len(signals) + 1))
+    results["multiplex"] = measure(lambda: sweep_mux(next(sweep)), iterations)
+
+    # switch one signal on every mux, then reset them all
+    def switch_all():
+        for mux in muxes[:-1]:
+            mux(mux.all_signals()[1], trigger_update=False)
+        muxes[-1](muxes[-1].all_signals()[1])
+
+    results["multiplex_all"] = measure(switch_all, max(1, iterations // 10))
+    switch_all()
+    results["mux_group_reset"] = measure(jig.mux.reset, max(1, iterations // 10))
+
+    pins = muxes[0].pin_list
+    results["debug_set_pins"] = measure(
+        lambda: jig.debug_set_pins(on=pins[:2], off=pins[2:]), iterations
+    )
+
+    vam = jig.virtual_map
+    results["dispatch"] = {
+        "handlers": len(jig._handlers),
+        "handler_writes": vam.handler_writes,
+        "suppressed_writes": vam.suppressed_writes,
+    }
+    results["transition_cache"] = sweep_mux.transition_cache_info()._asdict()
+    return results
+
+
+def run(module_counts=MODULE_COUNTS, iterations=2000):
+    results = []
+    for modules in module_counts:
+        for compiled in (False, True):
+            results.append(
+                {
+                    "modules": modules,
+                    "pins": modules * 16,
+                    "compiled": compiled,
+                    "results": bench_jig(modules, compiled, iterations),
+                }
+            )
+    return {
+        "fixate_version": fixate.__version__,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "benchmarks": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--output", "-o", help="JSON file to write results to")
+    parser.add_argument("--iterations", "-n", type=int, default=2000)
+    parser.add_argument(
+        "--modules", type=int, nargs="+", default=MODULE_COUNTS, metavar="N"
+    )
+    args = parser.parse_args()
+
+    report = run(args.modules, args.iterations)
+    for bench in report["benchmarks"]:
+        timing = {
+            name: f"{result['median_s'] * 1e6:.1f}us"
+            for name, result in bench["results"].items()
+            if "median_s" in result
+        }
+        print(f"modules={bench['modules']} compiled={bench['compiled']} {timing}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -93,6 +93,37 @@ def test_basicfail(tmpdir):
     compare_logs(os.path.join(log_dir, "basicfail.csv"), log_path)
 
 
+@pytest.mark.parametrize("script,return_code", [("basicpass", 5), ("basicfail", 10)])
+def test_slots(tmpdir, script, return_code):
+    script_path = os.path.join(script_dir, script + ".py")
+    log_path = os.path.join(str(tmpdir), "logfile.csv")
+    ret = subprocess.call(
+        [
+            sys.executable,
+            "-m",
+            "fixate",
+            "-p",
+            script_path,
+            "-c",
+            local_config,
+            "--slots",
+            "A=0123456789",
+            "B=0123456788",
+            "--log-file",
+            log_path,
+            "--non-interactive",
+            "--disable-logs",
+        ]
+    )
+    assert ret == return_code
+    # Each slot writes the same log as a single sequence, to its own file
+    for slot in "AB":
+        compare_logs(
+            os.path.join(log_dir, script + ".csv"),
+            os.path.join(str(tmpdir), f"logfile-{slot}.csv"),
+        )
+
+
 basichierachy_data = [
     # the basic hierarchy test script has a test list with enter/exit, setup & teardown,
     # along with a single test which has a setup & tear down. By setting the "fail_flag"
@@ -1,9 +1,18 @@
+import os
+import sys
+import threading
 import time
 import unittest
+from types import SimpleNamespace
 from unittest.mock import MagicMock, call
+import pytest
 from pubsub import pub
 import fixate
 from fixate.core.common import TestList as FixateTL, TestClass as FixateTC
+from fixate.core.exceptions import CheckFail
+from fixate.core.checks import chk_true
+from fixate.main import FixateWorker, ReturnCodes, get_parser, parallel_return_code
+from fixate.sequencer import Sequencer, ParallelSequencer
 
 
 def sleep_100m():
@@ -265,3 +274,379 @@ class TestSequencerTests(unittest.TestCase):
         self.mock_master = None
         pub.unsubscribe(self.abort_on_error, "UI_req")
         self.test_cls.clear_tests()
+
+
+class ProgressTest(FixateTC):
+    """Records the sequencer progress when run"""
+
+    attempts = 1
+
+    def __init__(self, seq, name, progress, fail=False):
+        super().__init__()
+        self.seq = seq
+        self.test_desc = name
+        self.progress = progress
+        self.fail = fail
+
+    def test(self):
+        self.progress.append(
+            (self.test_desc, self.seq.tests_completed(), self.seq.count_tests())
+        )
+        if self.fail:
+            raise ValueError("Test failed")
+
+
+def make_progress_sequencer():
+    seq = Sequencer()
+    seq.non_interactive = True
+    seq.reporting_service = MagicMock()
+    progress = []
+    skipped = ProgressTest(seq, "t3", progress)
+    skipped.skip = True
+    seq.load(
+        FixateTL(
+            [
+                ProgressTest(seq, "t1", progress),
+                FixateTL(
+                    [
+                        ProgressTest(seq, "t2", progress, fail=True),
+                        skipped,
+                    ]
+                ),
+                ProgressTest(seq, "t4", progress),
+            ]
+        )
+    )
+    return seq, progress
+
+
+def test_sequencer_test_tree_built_on_load():
+    seq, _ = make_progress_sequencer()
+    assert seq.count_tests() == 4
+    assert seq.get_tree() == [
+        ["1", "t1"],
+        ["2", "Test List"],
+        ["2.1", "t2"],
+        ["2.2", "t3"],
+        ["3", "t4"],
+    ]
+    assert seq.tests_completed() == 0
+
+
+def test_sequencer_tests_completed_during_run():
+    seq, progress = make_progress_sequencer()
+    seq.status = "Running"
+    seq.run_once()
+
+    assert seq.status == "Finished"
+    # a failed test and a skipped test still count as completed
+    assert progress == [("t1", 1, 4), ("t2", 2, 4), ("t4", 4, 4)]
+    assert seq.tests_failed == 1
+    assert seq.tests_skipped == 1
+
+
+def test_sequencer_resume_from_pause():
+    seq, progress = make_progress_sequencer()
+    started = []
+    seq.tests[0][0].test = lambda: started.append(time.monotonic())
+    seq.status = "Paused"
+    runner = threading.Thread(target=seq.run_once)
+    runner.start()
+    try:
+        time.sleep(0.05)
+        assert not started
+
+        resumed = time.monotonic()
+        seq.status = "Running"
+        runner.join(timeout=5)
+        assert not runner.is_alive()
+    finally:
+        if runner.is_alive():
+            seq._handle_sequence_abort()
+            runner.join(timeout=5)
+
+    assert seq.status == "Finished"
+    # No polling interval before the first test starts
+    assert started[0] - resumed < 0.05
+
+
+def test_sequencer_abort_while_paused():
+    seq, progress = make_progress_sequencer()
+    seq.status = "Paused"
+    runner = threading.Thread(target=seq.run_once)
+    runner.start()
+    time.sleep(0.01)
+    seq._handle_sequence_abort()
+    runner.join(timeout=1)
+
+    assert not runner.is_alive()
+    assert progress == []
+    assert seq.status == "Aborted"
+
+
+def test_sequencer_wait_while_paused_timeout():
+    seq, _ = make_progress_sequencer()
+    seq.status = "Paused"
+    assert not seq.wait_while_paused(timeout=0.01)
+    seq.status = "Running"
+    assert seq.wait_while_paused(timeout=0.01)
+
+
+class ScopedTest(SubclassOfFixateTest):
+    """Scoped Test"""
+
+    attempts = 2
+
+    def __init__(self, num, mock_obj, failures=(), scope="test"):
+        super().__init__(num, mock_obj)
+        self.failures = list(failures)
+        self.fixture_scope = scope
+
+    def test(self):
+        super().test()
+        if self.failures:
+            raise self.failures.pop(0)
+
+
+def run_scoped(test_list):
+    seq = Sequencer()
+    seq.non_interactive = True
+    seq.reporting_service = MagicMock()
+    seq.load(test_list)
+    seq.status = "Running"
+    seq.run_once()
+    return seq
+
+
+def scoped_list(scope, tests, num, mock_obj):
+    test_list = Lst(tests, num, mock_obj)
+    test_list.fixture_scope = scope
+    return test_list
+
+
+def test_fixture_scope_list():
+    mock = MagicMock()
+    run_scoped(scoped_list("list", [ScopedTest(2, mock), ScopedTest(3, mock)], 1, mock))
+    assert mock.mock_calls == [
+        call.list_enter(1),
+        call.list_setup(1),
+        call.test_setup(2),
+        call.test_test(2),
+        call.test_tear_down(2),
+        call.test_setup(3),
+        call.test_test(3),
+        call.test_tear_down(3),
+        call.list_tear_down(1),
+        call.list_exit(1),
+    ]
+
+
+def test_fixture_scope_default_per_test():
+    mock = MagicMock()
+    run_scoped(Lst([ScopedTest(2, mock), ScopedTest(3, mock)], 1, mock))
+    assert mock.mock_calls.count(call.list_setup(1)) == 2
+    assert mock.mock_calls.count(call.list_tear_down(1)) == 2
+
+
+def test_fixture_scope_sequence():
+    mock = MagicMock()
+    seq = run_scoped(
+        Lst(
+            [
+                scoped_list("sequence", [ScopedTest(3, mock)], 2, mock),
+                ScopedTest(4, mock),
+            ],
+            1,
+            mock,
+        )
+    )
+    assert seq.status == "Finished"
+    # The list is only torn down at the end of the sequence, after it has exited
+    assert mock.mock_calls[-8:] == [
+        call.list_exit(2),
+        call.list_setup(1),
+        call.test_setup(4),
+        call.test_test(4),
+        call.test_tear_down(4),
+        call.list_tear_down(1),
+        call.list_tear_down(2),
+        call.list_exit(1),
+    ]
+    assert mock.mock_calls.count(call.list_setup(2)) == 1
+
+
+def test_fixture_scope_kept_on_check_fail():
+    mock = MagicMock()
+    seq = run_scoped(
+        scoped_list("list", [ScopedTest(2, mock, failures=[CheckFail()])], 1, mock)
+    )
+    assert mock.mock_calls.count(call.test_test(2)) == 2
+    assert mock.mock_calls.count(call.list_setup(1)) == 1
+    assert seq.tests_passed == 1
+
+
+def test_fixture_scope_reestablished_on_exception():
+    mock = MagicMock()
+    seq = run_scoped(
+        scoped_list("list", [ScopedTest(2, mock, failures=[ValueError()])], 1, mock)
+    )
+    assert mock.mock_calls == [
+        call.list_enter(1),
+        call.list_setup(1),
+        call.test_setup(2),
+        call.test_test(2),
+        call.test_tear_down(2),
+        call.list_tear_down(1),
+        call.list_setup(1),
+        call.test_setup(2),
+        call.test_test(2),
+        call.test_tear_down(2),
+        call.list_tear_down(1),
+        call.list_exit(1),
+    ]
+    assert seq.tests_passed == 1
+
+
+def test_fixture_scope_test_class_kept_across_attempts():
+    mock = MagicMock()
+    run_scoped(
+        Lst(
+            [ScopedTest(2, mock, failures=[CheckFail()], scope="list")],
+            1,
+            mock,
+        )
+    )
+    assert mock.mock_calls.count(call.test_test(2)) == 2
+    assert mock.mock_calls.count(call.test_setup(2)) == 1
+    assert mock.mock_calls.count(call.test_tear_down(2)) == 1
+
+
+def test_fixture_scope_invalid():
+    mock = MagicMock()
+    seq = run_scoped(scoped_list("module", [ScopedTest(2, mock)], 1, mock))
+    assert call.test_test(2) not in mock.mock_calls
+    assert seq.tests_failed == 1
+
+
+class SlotTest(FixateTC):
+    """Checks the serial number of the slot it's run on, once every slot has started"""
+
+    attempts = 1
+
+    def __init__(self, barrier):
+        super().__init__()
+        self.barrier = barrier
+
+    def test(self):
+        self.barrier.wait(timeout=5)
+        serial_number = fixate.config.current_sequencer().context_data["serial_number"]
+        chk_true(serial_number != "BAD", "serial number")
+
+
+def make_parallel_sequencer(serial_numbers):
+    parallel = ParallelSequencer(serial_numbers)
+    parallel.non_interactive = True
+    for seq in parallel.sequencers.values():
+        seq.reporting_service = MagicMock()
+    barrier = threading.Barrier(len(serial_numbers))
+    parallel.load(lambda: FixateTL([SlotTest(barrier), SlotTest(barrier)]))
+    return parallel
+
+
+def test_parallel_sequencer_runs_slots_concurrently():
+    parallel = make_parallel_sequencer({"A": "SN1", "B": "BAD", "C": "SN3"})
+    updates = []
+
+    def slot_update(slots):
+        updates.append(slots)
+
+    pub.subscribe(slot_update, "Slot_Update")
+    try:
+        # The barrier in each test would time out if the slots ran one at a time
+        result = parallel.run_sequence()
+    finally:
+        pub.unsubscribe(slot_update, "Slot_Update")
+
+    assert result == {"A": "PASSED", "B": "FAILED", "C": "PASSED"}
+    seq_a, seq_b = parallel.sequencers["A"], parallel.sequencers["B"]
+    assert (seq_a.tests_passed, seq_a.tests_failed) == (2, 0)
+    assert (seq_b.tests_passed, seq_b.tests_failed) == (0, 2)
+    assert seq_a.context_data["slot"] == "A"
+    # 2 tests and the end of the sequence, for 3 slots
+    assert len(updates) == 9
+    assert updates[-1] == parallel.slot_status()
+    assert [status["tests_completed"] for status in updates[-1]] == [2, 2, 2]
+    assert updates[-1][1] == {
+        "slot": "B",
+        "serial_number": "BAD",
+        "status": "Finished",
+        "end_status": "FAILED",
+        "tests_completed": 2,
+        "test_count": 2,
+    }
+
+
+def test_parallel_sequencer_current_sequencer_restored():
+    parallel = make_parallel_sequencer({"A": "SN1"})
+    before = fixate.config.current_sequencer()
+    with fixate.config.use_sequencer(parallel.sequencers["A"]):
+        assert fixate.config.current_sequencer() is parallel.sequencers["A"]
+    assert fixate.config.current_sequencer() is before
+
+
+@pytest.mark.parametrize(
+    "results,return_code",
+    [
+        ([("Finished", "PASSED"), ("Finished", "PASSED")], ReturnCodes.PASS),
+        ([("Finished", "PASSED"), ("Finished", "FAILED")], ReturnCodes.FAIL),
+        ([("Finished", "ERROR"), ("Finished", "FAILED")], ReturnCodes.ERROR),
+        ([("Aborted", "ERROR"), ("Finished", "PASSED")], ReturnCodes.ABORTED),
+    ],
+)
+def test_parallel_return_code(results, return_code):
+    sequencers = [
+        SimpleNamespace(status=status, end_status=end_status)
+        for status, end_status in results
+    ]
+    assert parallel_return_code(sequencers) == return_code
+
+
+def test_worker_slots_load_the_script_for_each_slot(monkeypatch):
+    script = os.path.join(os.path.dirname(__file__), "scripts", "basicpass.py")
+    args = get_parser().parse_args(["-p", script, "--slots", "A=SN1", "B=SN2"])
+    monkeypatch.setitem(fixate.config.RESOURCES, "SEQUENCER", Sequencer())
+    worker = FixateWorker(fixate.config.RESOURCES["SEQUENCER"], script, args)
+    worker._create_parallel_sequencer({"A": "SN1", "B": "SN2"}, worker._load_test_data)
+
+    seq_a, seq_b = worker.parallel.sequencers.values()
+    # the script's TEST_SEQUENCE, wrapped in a TestList by Sequencer.load
+    (test_a,) = seq_a.tests.tests[0].tests
+    (test_b,) = seq_b.tests.tests[0].tests
+    # each slot runs tests from its own import of the script
+    assert test_a is not test_b
+    assert type(test_a) is not type(test_b)
+    # code outside of a slot, and the UI, follow the first slot
+    assert worker.sequencer is seq_a
+    assert fixate.config.RESOURCES["SEQUENCER"] is seq_a
+
+
+def test_csv_writer_slot_filters_messages(tmp_path, monkeypatch):
+    parallel = ParallelSequencer({"A": "SN1", "B": "SN2"})
+    seq_a = parallel.sequencers["A"]
+    writer = seq_a.reporting_service
+    listeners = {topic: listener for listener, topic in writer._topics}
+    module = MagicMock(__file__="panel_script.py")
+    monkeypatch.setitem(sys.modules, "module.loaded_tests", module)
+    monkeypatch.setattr(
+        fixate.config, "log_file", str(tmp_path / "log.csv"), raising=False
+    )
+
+    with fixate.config.use_sequencer(parallel.sequencers["B"]):
+        listeners["Sequence_Update"](status="Running")
+    assert writer.csv_queue.empty()
+
+    with fixate.config.use_sequencer(seq_a):
+        listeners["Sequence_Update"](status="Running")
+    assert writer.csv_path == str(tmp_path / "log-A.csv")
+    assert writer.data["serial_number"] == "SN1"
+    assert not writer.csv_queue.empty()
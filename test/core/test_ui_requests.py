@@ -1,7 +1,9 @@
+import threading
+import time
 import unittest
 from unittest.mock import MagicMock
 from pubsub import pub
-from fixate.core.ui import _user_req_input, _float_validate, user_serial
+from fixate.core.ui import _user_req_input, _float_validate, user_ok, user_serial
 
 
 class MockUserDriver(MagicMock):
@@ -61,3 +63,40 @@ class TestUserRequest(unittest.TestCase):
         self.mock.test_value = 123
         resp = user_serial("message", None)
         self.assertEqual(resp[1], self.mock.test_value)
+
+
+class TestConcurrentRequests(unittest.TestCase):
+    """Slots of a ParallelSequencer prompting at the same time"""
+
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.open_requests = 0
+        self.most_open_requests = 0
+        pub.subscribe(self.answer_later, "UI_req")
+
+    def tearDown(self):
+        pub.unsubscribe(self.answer_later, "UI_req")
+
+    def answer_later(self, msg, q):
+        with self.lock:
+            self.open_requests += 1
+            self.most_open_requests = max(self.most_open_requests, self.open_requests)
+
+        def answer():
+            time.sleep(0.02)
+            with self.lock:
+                self.open_requests -= 1
+            q.put(("Result", msg))
+
+        threading.Thread(target=answer).start()
+
+    def test_requests_one_at_a_time(self):
+        threads = [
+            threading.Thread(target=user_ok, args=("slot {}".format(slot),))
+            for slot in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(self.most_open_requests, 1)
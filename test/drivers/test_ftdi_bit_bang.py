@@ -0,0 +1,343 @@
+import importlib
+import random
+import sys
+import types
+
+import pytest
+
+from fixate.core.exceptions import ParameterError
+
+
+class FakeFTD2XX:
+    """Stand-in for the FTD2XX library, which records the data written"""
+
+    def __init__(self):
+        self.written = []
+        self.bit_modes = []
+        self.modes = []
+        self.read_sizes = []
+
+    def FT_Write(self, handle, buffer, size, bytes_written):
+        self.written.append(buffer.raw[:size])
+        return 0
+
+    def FT_SetBitMode(self, handle, mask, mode):
+        self.bit_modes.append(mask.value)
+        self.modes.append(mode.value)
+        return 0
+
+    def FT_Read(self, handle, buffer, size, bytes_read):
+        self.read_sizes.append(size.value)
+        bytes_read._obj.value = size.value
+        return 0
+
+    def __getattr__(self, name):
+        return lambda *args: 0
+
+
+@pytest.fixture
+def ftd2xx():
+    """Import fixate.drivers.ftdi with a FakeFTD2XX in place of the library"""
+    dll = FakeFTD2XX()
+    saved = {
+        name: sys.modules.pop(name, None)
+        for name in ("fixate.drivers._ftdi", "fixate.drivers.ftdi")
+    }
+    sys.modules["fixate.drivers._ftdi"] = types.SimpleNamespace(ftdI2xx=dll)
+    try:
+        yield importlib.import_module("fixate.drivers.ftdi"), dll
+    finally:
+        for name, module in saved.items():
+            sys.modules.pop(name, None)
+            if module is not None:
+                sys.modules[name] = module
+
+
+@pytest.fixture
+def ftdi(ftd2xx):
+    module, dll = ftd2xx
+    driver = module.FTDI2xx(b"Fake FTDI")
+    driver.configure_bit_bang(
+        module.BIT_MODE.FT_BITMODE_ASYNC_BITBANG, bytes_required=5
+    )
+    dll.bit_modes.clear()
+    dll.modes.clear()
+    return driver
+
+
+@pytest.mark.parametrize("invert_mask", range(8))
+@pytest.mark.parametrize("bb_mask", [0, 0x70])
+def test_table_encoder_matches_per_bit_encoder(ftdi, invert_mask, bb_mask):
+    ftdi.configure_bit_bang(
+        ftdi.bit_mode,
+        bytes_required=5,
+        latch_mask=4,
+        data_mask=1,
+        clk_mask=2,
+        invert_mask=invert_mask,
+    )
+    rng = random.Random(invert_mask)
+    for bytes_required in (1, 2, 5):
+        for value in [0, (1 << bytes_required * 8) - 1] + [
+            rng.getrandbits(bytes_required * 8) for _ in range(20)
+        ]:
+            assert ftdi._serial_shift_bit_bang_table(
+                value, bytes_required, bb_mask
+            ) == bytes(ftdi._serial_shift_bit_bang(value, bytes_required, bb_mask))
+
+
+def test_serial_shift_bit_bang_writes_frame(ftd2xx, ftdi):
+    _, dll = ftd2xx
+    ftdi.serial_shift_bit_bang(0b1000_0001, bytes_required=1)
+
+    # data=4, clk=2, latch=1. Each bit sets data, then clocks it in.
+    bit_one = bytes([4, 6])
+    bit_zero = bytes([0, 2])
+    assert dll.written == [
+        b"\x00" + bit_one + bit_zero * 6 + bit_one + bytes([0, 1, 0])
+    ]
+
+
+def test_serial_shift_bit_bang_cbus_mode(ftd2xx, ftdi):
+    module, dll = ftd2xx
+    ftdi.configure_bit_bang(module.BIT_MODE.FT_BITMODE_CBUS_BITBANG, bytes_required=1)
+    dll.bit_modes.clear()
+    ftdi.serial_shift_bit_bang(0x5A)
+
+    assert dll.written == []
+    assert dll.bit_modes == list(ftdi._serial_shift_bit_bang(0x5A, 1, bb_mask=0x70))
+
+
+def test_table_rebuilt_when_masks_change(ftdi):
+    table = ftdi._bit_bang_table(0)
+    assert len(table) == 256
+    assert all(len(frame) == 16 for frame in table)
+    assert ftdi._bit_bang_table(0) is table
+
+    ftdi.bb_inv_mask = ftdi.bb_clk
+    assert ftdi._bit_bang_table(0) is not table
+
+
+def test_table_encoder_value_too_large(ftdi):
+    with pytest.raises(ParameterError):
+        ftdi._serial_shift_bit_bang_table(1 << 16, 2, 0)
+
+
+def test_encoder_benchmark_runs(ftd2xx):
+    import benchmark_ftdi_encoder
+
+    report = benchmark_ftdi_encoder.run(chain_bytes=(1, 5), iterations=20)
+    assert [bench["bytes"] for bench in report["benchmarks"]] == [1, 5]
+    for bench in report["benchmarks"]:
+        assert bench["results"]["table"]["iterations"] == 20
+
+
+def test_sync_bit_bang_reads_back_frame(ftd2xx, ftdi):
+    module, dll = ftd2xx
+    ftdi.configure_bit_bang(module.BIT_MODE.FT_BITMODE_SYNC_BITBANG, bytes_required=2)
+    dll.written.clear()
+    ftdi.serial_shift_bit_bang(0x1234)
+
+    assert dll.written == [ftdi._serial_shift_bit_bang_table(0x1234, 2, 0)]
+    assert dll.read_sizes == [len(dll.written[0])]
+
+
+@pytest.fixture
+def mpsse(ftd2xx, ftdi):
+    module, dll = ftd2xx
+    ftdi.configure_bit_bang(
+        module.BIT_MODE.FT_BITMODE_MPSSE,
+        bytes_required=2,
+        clk_mask=1,
+        data_mask=2,
+        latch_mask=8,
+        clock_rate=6_000_000,
+    )
+    return ftdi
+
+
+def test_mpsse_configure(ftd2xx, mpsse):
+    module, dll = ftd2xx
+    assert dll.modes == [0x00, 0x02]
+    # 60 MHz / ((1 + 4) * 2) = 6 MHz
+    assert dll.written == [
+        bytes([0x8A, 0x97, 0x8D, 0x85, 0x86, 4, 0, 0x80, 0x00, 0b1011])
+    ]
+
+
+def test_mpsse_clock_rate_rounded_down(ftd2xx, ftdi):
+    module, dll = ftd2xx
+    ftdi.configure_bit_bang(
+        module.BIT_MODE.FT_BITMODE_MPSSE,
+        bytes_required=1,
+        clk_mask=1,
+        data_mask=2,
+        latch_mask=8,
+        clock_rate=7_000_000,
+    )
+    # 30 MHz / 7 MHz is 4.3, so the divisor rounds up to 4, giving 6 MHz
+    assert dll.written[0][5:7] == bytes([4, 0])
+
+
+def test_mpsse_serial_shift(ftd2xx, mpsse):
+    module, dll = ftd2xx
+    dll.written.clear()
+    mpsse.serial_shift_bit_bang(0xA55A)
+
+    assert dll.written == [
+        # clock 2 bytes out on the falling edge, MSB first
+        bytes([0x11, 1, 0, 0xA5, 0x5A])
+        # latch high, then low
+        + bytes([0x80, 0x08, 0b1011, 0x80, 0x00, 0b1011])
+    ]
+    assert dll.read_sizes == []
+
+
+def test_mpsse_inverted(ftd2xx, ftdi):
+    module, dll = ftd2xx
+    ftdi.configure_bit_bang(
+        module.BIT_MODE.FT_BITMODE_MPSSE,
+        bytes_required=1,
+        clk_mask=1,
+        data_mask=2,
+        latch_mask=8,
+        invert_mask=0b111,
+    )
+    dll.written.clear()
+    ftdi.serial_shift_bit_bang(0x0F)
+
+    assert dll.written == [
+        # clock idles high, so data changes on the rising edge
+        bytes([0x10, 0, 0, 0xF0])
+        + bytes([0x80, 0b0011, 0b1011, 0x80, 0b1011, 0b1011])
+    ]
+
+
+@pytest.mark.parametrize(
+    "masks",
+    [
+        dict(clk_mask=2, data_mask=4, latch_mask=1),
+        dict(clk_mask=1, data_mask=2, latch_mask=2),
+        dict(clk_mask=1, data_mask=2, latch_mask=0x100),
+    ],
+)
+def test_mpsse_invalid_pins(ftd2xx, ftdi, masks):
+    module, _ = ftd2xx
+    with pytest.raises(ValueError):
+        ftdi.configure_bit_bang(
+            module.BIT_MODE.FT_BITMODE_MPSSE, bytes_required=1, **masks
+        )
+
+
+@pytest.mark.parametrize("mode", ["async", "sync", "mpsse"])
+def test_handler_modes(ftd2xx, monkeypatch, mode):
+    from fixate.drivers.handlers import FTDIAddressHandler
+
+    module, dll = ftd2xx
+    monkeypatch.setattr(module, "open", lambda ftdi_description: module.FTDI2xx(b""))
+    handler = FTDIAddressHandler([f"p{i}" for i in range(10)], "Fake", mode=mode)
+    handler.set_pins(["p0"])
+
+    expected_mode = {"async": 0x01, "sync": 0x04, "mpsse": 0x02}[mode]
+    assert dll.modes[-1] == expected_mode
+    if mode == "mpsse":
+        assert dll.written[-1][:5] == bytes([0x11, 1, 0, 0x00, 0x01])
+    else:
+        assert dll.written[-1] == handler._ftdi._serial_shift_bit_bang_table(1, 2, 0)
+
+
+def test_handler_invalid_mode():
+    from fixate.drivers.handlers import FTDIAddressHandler
+
+    with pytest.raises(ValueError, match="Unknown FTDI mode"):
+        FTDIAddressHandler(["p0"], "Fake", mode="fast")
+
+
+def reference_chains_frame(values, bytes_required, data_masks, clk, latch, inv):
+    """Encode several chains one bit at a time"""
+    frame = [inv]
+    for bit in reversed(range(bytes_required * 8)):
+        data = sum(mask for mask, value in zip(data_masks, values) if value >> bit & 1)
+        frame += [data ^ inv, (data + clk) ^ inv]
+    return bytes(frame + [inv, latch ^ inv, inv])
+
+
+@pytest.mark.parametrize("invert_mask", [0b000, 0b001, 0b110])
+def test_chains_frame(ftd2xx, ftdi, invert_mask):
+    module, dll = ftd2xx
+    data_masks = (4, 8, 32)
+    ftdi.configure_bit_bang(
+        module.BIT_MODE.FT_BITMODE_ASYNC_BITBANG,
+        bytes_required=3,
+        chain_data_masks=data_masks,
+        invert_mask=invert_mask,
+    )
+    dll.written.clear()
+    rng = random.Random(invert_mask)
+    for _ in range(10):
+        values = [rng.getrandbits(24) for _ in data_masks]
+        ftdi.serial_shift_bit_bang_chains(values)
+        assert dll.written[-1] == reference_chains_frame(
+            values, 3, data_masks, 2, 1, ftdi.bb_inv_mask
+        )
+    # one USB write per update
+    assert len(dll.written) == 10
+
+
+def test_single_chain_frame_matches_table_encoder(ftdi):
+    for value in (0, 0xFFFF, 0x1234):
+        assert ftdi._serial_shift_chains([value], 2, 0) == (
+            ftdi._serial_shift_bit_bang_table(value, 2, 0)
+        )
+
+
+def test_chains_require_value_per_chain(ftd2xx, ftdi):
+    module, _ = ftd2xx
+    ftdi.configure_bit_bang(
+        module.BIT_MODE.FT_BITMODE_ASYNC_BITBANG,
+        bytes_required=1,
+        chain_data_masks=(4, 8),
+    )
+    with pytest.raises(ValueError, match="2 chains"):
+        ftdi.serial_shift_bit_bang_chains([1])
+    with pytest.raises(ValueError, match="serial_shift_bit_bang_chains"):
+        ftdi.serial_shift_bit_bang(1)
+
+
+@pytest.mark.parametrize("chain_data_masks", [(4, 4), (4, 2), (4, 12), (4, 0)])
+def test_invalid_chain_data_masks(ftd2xx, ftdi, chain_data_masks):
+    module, _ = ftd2xx
+    with pytest.raises(ValueError, match="Chain data masks"):
+        ftdi.configure_bit_bang(
+            module.BIT_MODE.FT_BITMODE_ASYNC_BITBANG,
+            bytes_required=1,
+            chain_data_masks=chain_data_masks,
+        )
+
+
+def test_multi_chain_handler(ftd2xx, monkeypatch):
+    from fixate.drivers.handlers import MultiChainFTDIAddressHandler
+
+    module, dll = ftd2xx
+    monkeypatch.setattr(module, "open", lambda ftdi_description: module.FTDI2xx(b""))
+    handler = MultiChainFTDIAddressHandler(
+        {
+            4: [f"a{i}" for i in range(16)],
+            8: [f"b{i}" for i in range(4)],
+        },
+        "Fake",
+    )
+    assert handler.pin_list[15:17] == ("a15", "b0")
+
+    handler.set_pins(["a1", "a15", "b0", "b3"])
+    assert handler._ftdi.bb_bytes == 2
+    assert dll.written[-1] == reference_chains_frame(
+        [0x8002, 0b1001], 2, (4, 8), 2, 1, 0
+    )
+
+
+def test_multi_chain_handler_no_mpsse():
+    from fixate.drivers.handlers import MultiChainFTDIAddressHandler
+
+    with pytest.raises(ValueError, match="single chain"):
+        MultiChainFTDIAddressHandler({4: ["a0"], 8: ["b0"]}, "Fake", mode="mpsse")
@@ -0,0 +1,140 @@
+import time
+
+import pytest
+
+from fixate.drivers.handlers import FTDIAddressHandler
+
+
+class FakeFTDI:
+    """Records the values shifted out by an FTDIAddressHandler"""
+
+    def __init__(self, fail=False):
+        self.shifted = []
+        self.fail = fail
+        self.closed = False
+
+    def serial_shift_bit_bang(self, value):
+        if self.fail:
+            raise IOError("USB write failed")
+        self.shifted.append((time.monotonic(), value))
+
+    def close(self):
+        self.closed = True
+
+    @property
+    def values(self):
+        return [value for _, value in self.shifted]
+
+
+def make_handler(min_write_interval=0.0):
+    handler = FTDIAddressHandler(
+        ["p0", "p1", "p2"], "Fake FTDI", min_write_interval=min_write_interval
+    )
+    handler._ftdi = fake = FakeFTDI()
+    return handler, fake
+
+
+def test_identical_writes_skipped():
+    handler, fake = make_handler()
+    handler.set_pins(["p0"])
+    handler.set_pins(["p0"])
+    handler.set_pins([])
+    handler.set_pins([])
+
+    assert fake.values == [0b001, 0b000]
+    assert handler.writes == 2
+    assert handler.skipped_writes == 2
+    assert handler.elided_writes == 2
+
+
+def test_first_write_not_skipped():
+    # The shift registers could hold anything before the first write
+    handler, fake = make_handler()
+    handler.set_pins([])
+    assert fake.values == [0]
+
+
+def test_writes_in_interval_merged():
+    handler, fake = make_handler(min_write_interval=0.05)
+    handler.set_pins(["p0"])
+    handler.set_pins(["p0", "p1"])
+    handler.set_pins(["p0", "p1", "p2"])
+    # only the first is shifted straight away
+    assert fake.values == [0b001]
+
+    handler.flush()
+    assert fake.values == [0b001, 0b111]
+    assert handler.merged_writes == 1
+    assert fake.shifted[1][0] - fake.shifted[0][0] >= 0.05
+
+
+def test_pending_write_shifted_by_timer():
+    handler, fake = make_handler(min_write_interval=0.02)
+    handler.set_pins(["p0"])
+    handler.set_pins(["p1"])
+    time.sleep(0.1)
+    assert fake.values == [0b001, 0b010]
+
+
+def test_merge_back_to_latched_value():
+    handler, fake = make_handler(min_write_interval=0.05)
+    handler.set_pins(["p0"])
+    handler.set_pins(["p0", "p1"])
+    handler.set_pins(["p0"])
+    handler.flush()
+    # the pending write is replaced by the value already latched
+    assert fake.values == [0b001, 0b001]
+
+
+def test_break_phase_not_merged_with_make():
+    handler, fake = make_handler(min_write_interval=0.05)
+    handler.set_pins(["p0"])
+    # break-before-make, as sent by the VirtualAddressMap
+    handler.set_pins([])
+    handler.set_pins(["p1"])
+    handler.flush()
+
+    assert fake.values == [0b001, 0b000, 0b010]
+    assert handler.merged_writes == 0
+    break_time, make_time = fake.shifted[1][0], fake.shifted[2][0]
+    assert make_time - break_time >= 0.05
+
+
+def test_break_time_not_shortened():
+    handler, fake = make_handler(min_write_interval=0.05)
+    handler.set_pins(["p0"])
+    # The break is delayed until the interval has passed
+    handler.set_pins([])
+    time.sleep(0.08)
+    requested_break = 0.08
+    handler.set_pins(["p1"])
+    handler.flush()
+
+    assert fake.values == [0b001, 0b000, 0b010]
+    break_time, make_time = fake.shifted[1][0], fake.shifted[2][0]
+    assert make_time - break_time >= requested_break
+
+
+def test_close_flushes_and_forgets_latched_value():
+    handler, fake = make_handler(min_write_interval=0.05)
+    handler.set_pins(["p0"])
+    handler.set_pins(["p1"])
+    handler.close()
+    assert fake.values == [0b001, 0b010]
+    assert fake.closed
+
+    handler._ftdi = reopened = FakeFTDI()
+    handler.set_pins(["p1"])
+    handler.flush()
+    assert reopened.values == [0b010]
+
+
+def test_timer_write_error_raised_on_next_write():
+    handler, fake = make_handler(min_write_interval=0.01)
+    handler.set_pins(["p0"])
+    fake.fail = True
+    handler.set_pins(["p1"])
+    time.sleep(0.05)
+
+    with pytest.raises(IOError, match="USB write failed"):
+        handler.set_pins(["p2"])
@@ -0,0 +1,147 @@
+import threading
+import time
+
+import pytest
+
+from fixate.drivers import (
+    DriverManager,
+    InstrumentArbiter,
+    LeaseTimeoutError,
+    lease_stats,
+)
+
+
+class Dmm:
+    pass
+
+
+class Pps:
+    pass
+
+
+def wait_queued(arbiter, count):
+    deadline = time.monotonic() + 5
+    while len(arbiter._waiting) < count:
+        assert time.monotonic() < deadline, "lease was never requested"
+        time.sleep(0.001)
+
+
+def lease_in_thread(arbiter, granted, name, *drivers, **kwargs):
+    def run():
+        with arbiter.lease(*drivers, **kwargs):
+            granted.append(name)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_lease_exclusive_and_reentrant():
+    arbiter = InstrumentArbiter()
+    dmm, pps = Dmm(), Pps()
+    granted = []
+
+    with arbiter.lease(dmm, pps):
+        # re-entrant within the thread that holds the lease
+        with arbiter.lease(dmm):
+            pass
+        thread = lease_in_thread(arbiter, granted, "other", pps, dmm)
+        wait_queued(arbiter, 1)
+        assert not granted
+    thread.join(timeout=5)
+    assert granted == ["other"]
+    assert not arbiter._owners
+
+
+def test_lease_priority_then_request_order():
+    arbiter = InstrumentArbiter()
+    dmm = Dmm()
+    granted = []
+
+    with arbiter.lease(dmm):
+        threads = [lease_in_thread(arbiter, granted, "low", dmm)]
+        wait_queued(arbiter, 1)
+        threads.append(lease_in_thread(arbiter, granted, "low2", dmm))
+        wait_queued(arbiter, 2)
+        threads.append(lease_in_thread(arbiter, granted, "high", dmm, priority=1))
+        wait_queued(arbiter, 3)
+    for thread in threads:
+        thread.join(timeout=5)
+    assert granted == ["high", "low", "low2"]
+
+
+def test_lease_not_overtaken_by_later_request():
+    arbiter = InstrumentArbiter()
+    dmm, pps = Dmm(), Pps()
+    granted = []
+
+    with arbiter.lease(dmm):
+        first = lease_in_thread(arbiter, granted, "both", dmm, pps)
+        wait_queued(arbiter, 1)
+        # pps is free, but the earlier lease is waiting for it
+        second = lease_in_thread(arbiter, granted, "pps", pps)
+        wait_queued(arbiter, 2)
+        time.sleep(0.01)
+        assert not granted
+    first.join(timeout=5)
+    second.join(timeout=5)
+    assert granted == ["both", "pps"]
+
+
+def test_lease_timeout():
+    arbiter = InstrumentArbiter()
+    dmm = Dmm()
+    errors = []
+
+    def run():
+        try:
+            with arbiter.lease(dmm, timeout=0.01):
+                pass
+        except LeaseTimeoutError as e:
+            errors.append(e)
+
+    with arbiter.lease(dmm):
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join(timeout=5)
+    assert len(errors) == 1
+    assert "Dmm" in str(errors[0])
+    assert not arbiter._waiting
+
+
+def test_lease_stats():
+    arbiter = InstrumentArbiter()
+    dmm, pps = Dmm(), Pps()
+    arbiter.register(pps, name="pps")
+    granted = []
+
+    with arbiter.lease(dmm, pps):
+        with arbiter.lease(dmm):
+            pass
+        thread = lease_in_thread(arbiter, granted, "other", dmm)
+        wait_queued(arbiter, 1)
+        time.sleep(0.02)
+    thread.join(timeout=5)
+
+    stats = arbiter.stats()
+    assert [s.name for s in stats] == ["Dmm", "pps"]
+    dmm_stats, pps_stats = stats
+    # the nested lease isn't counted again
+    assert (dmm_stats.leases, dmm_stats.contended) == (2, 1)
+    assert dmm_stats.max_wait >= 0.02
+    assert dmm_stats.mean_wait == pytest.approx(dmm_stats.wait_time / 2)
+    assert dmm_stats.held_time >= 0.02
+    assert (pps_stats.leases, pps_stats.contended) == (1, 0)
+
+    arbiter.reset_stats()
+    assert sorted((s.name, s.leases) for s in arbiter.stats()) == [
+        ("Dmm", 0),
+        ("pps", 0),
+    ]
+
+
+def test_driver_manager_lease():
+    dm = DriverManager(bench_dmm=Dmm())
+    with dm.lease("bench_dmm"):
+        pass
+    assert "bench_dmm" in [stats.name for stats in lease_stats()]
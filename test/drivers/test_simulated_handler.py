@@ -0,0 +1,84 @@
+import pytest
+
+from fixate import JigDriver, MuxGroup, RelayMatrixMux, VirtualMux
+from fixate.drivers.handlers import SimulatedAddressHandler
+
+
+class RelayMux(RelayMatrixMux):
+    clearing_time = 0.01
+    pin_list = ("r0", "r1")
+    map_list = (("sig_r0", "r0"), ("sig_r1", "r1"))
+
+
+class PlainMux(VirtualMux):
+    pin_list = ("r0", "r1")
+    map_list = (("sig_r0", "r0"), ("sig_r1", "r1"))
+
+
+def make_jig(mux_class, **kwargs):
+    class Group(MuxGroup):
+        def __init__(self):
+            self.mux = mux_class()
+
+    handler = SimulatedAddressHandler(
+        ["r0", "r1"] + [f"x{i}" for i in range(14)], **kwargs
+    )
+    return JigDriver(Group, [handler]), handler
+
+
+def test_simulated_handler_records_writes():
+    jig, handler = make_jig(
+        RelayMux, fixed_latency=1e-3, byte_latency=1e-4, realtime=False
+    )
+    jig.mux.mux("sig_r0")
+    jig.mux.mux("sig_r1")
+
+    # 16 pins is 2 bytes
+    assert handler.latency == pytest.approx(1.2e-3)
+    assert [write.value for write in handler.writes] == [0b01, 0b00, 0b10]
+    assert handler.total_latency == pytest.approx(3 * 1.2e-3)
+    assert handler.value == 0b10
+    assert handler.writes[1].start - handler.writes[0].start < 1e-3
+
+
+def test_simulated_handler_realtime():
+    jig, handler = make_jig(PlainMux, fixed_latency=0.01, byte_latency=0.0)
+    jig.mux.mux("sig_r0")
+    write = handler.writes[0]
+    assert jig.mux.mux._last_update_time - write.start >= 0.01
+
+
+def test_simulated_handler_break_before_make():
+    jig, handler = make_jig(
+        RelayMux,
+        realtime=False,
+        break_before_make_pins=["r0", "r1"],
+        break_time=0.01,
+    )
+    jig.mux.mux("sig_r0")
+    jig.mux.mux("sig_r1")
+    assert handler.value == 0b10
+
+
+def test_simulated_handler_break_before_make_violation():
+    jig, handler = make_jig(
+        PlainMux, realtime=False, break_before_make_pins=["r0", "r1"]
+    )
+    jig.mux.mux("sig_r0")
+    with pytest.raises(ValueError, match=r"\['r1'\] turned on in the same write"):
+        jig.mux.mux("sig_r1")
+
+
+def test_simulated_handler_break_time_violation():
+    class FastRelayMux(RelayMux):
+        clearing_time = 0.0
+
+    jig, handler = make_jig(
+        FastRelayMux,
+        realtime=False,
+        break_before_make_pins=["r0", "r1"],
+        break_time=0.01,
+    )
+    jig.mux.mux("sig_r0")
+    with pytest.raises(ValueError, match="after a break"):
+        jig.mux.mux("sig_r1")
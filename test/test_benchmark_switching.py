@@ -0,0 +1,26 @@
+import json
+
+import benchmark_switching
+
+
+def test_benchmark_runs():
+    """A quick run of the switching benchmarks, so they don't break unnoticed."""
+    report = benchmark_switching.run(module_counts=(1, 5), iterations=20)
+
+    # The report must be serialisable, since that is how it's saved.
+    json.dumps(report)
+    assert len(report["benchmarks"]) == 4
+    for bench in report["benchmarks"]:
+        results = bench["results"]
+        assert results["multiplex"]["iterations"] == 20
+        # 5 modules is 2 handlers
+        assert results["dispatch"]["handlers"] == (1 if bench["modules"] == 1 else 2)
+        # the sweep repeats signals, so there must be cache hits
+        assert results["transition_cache"]["hits"] > 0
+
+
+def test_make_jig_handler_value():
+    jig = benchmark_switching.make_jig(5, compiled=True)
+    jig.mux.rm5("RM5_SIG0")
+    # module 5 is the first module on the second handler
+    assert jig._handlers[1].value == 1
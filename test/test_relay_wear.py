@@ -0,0 +1,105 @@
+import threading
+import time
+
+from fixate._relay_wear import RelayWearLog, main
+from fixate._switching import JigDriver, MuxGroup, VirtualMux, AddressHandler
+
+
+class NullHandler(AddressHandler):
+    def set_pins(self, pins):
+        pass
+
+
+class MuxA(VirtualMux):
+    pin_list = ("a0", "a1")
+    map_list = (("sig_a1", "a0", "a1"), ("sig_a2", "a1"))
+
+
+class Group(MuxGroup):
+    def __init__(self):
+        self.mux_a = MuxA()
+
+
+def make_jig():
+    return JigDriver(Group, [NullHandler(("a0", "a1", "b0"))])
+
+
+def test_relay_wear_log_add_and_top(tmp_path):
+    log = RelayWearLog(tmp_path / "wear.db")
+    log.add("jig1", {"a0": 3, "a1": 1, "a2": 0})
+    log.add("jig1", {"a1": 5})
+    log.add("jig2", {"a0": 2})
+
+    assert log.top() == [("jig1", "a1", 6), ("jig1", "a0", 3), ("jig2", "a0", 2)]
+    assert log.top(n=1, jig="jig2") == [("jig2", "a0", 2)]
+    assert log.jigs() == ["jig1", "jig2"]
+
+
+def test_actuation_counts():
+    jig = make_jig()
+    # not counted until enabled
+    jig.mux.mux_a("sig_a1")
+    jig.virtual_map.enable_actuation_count()
+    assert jig.virtual_map.actuation_counts() == {}
+
+    jig.mux.mux_a("sig_a2")
+    jig.mux.mux_a("sig_a1")
+    jig.mux.mux_a("")
+    jig.mux.mux_a("sig_a1")
+    assert jig.virtual_map.actuation_counts() == {"a0": 2, "a1": 1}
+
+
+def test_actuation_flush(tmp_path):
+    log = RelayWearLog(tmp_path / "wear.db")
+    jig = make_jig()
+    jig.virtual_map.enable_actuation_count(log, "jig1")
+    jig.mux.mux_a("sig_a1")
+    jig.virtual_map.flush_actuations()
+    assert log.top() == [("jig1", "a0", 1), ("jig1", "a1", 1)]
+
+    # only the change since the last flush is added
+    jig.mux.mux_a("")
+    jig.mux.mux_a("sig_a2")
+    jig.close()
+    assert log.top() == [("jig1", "a1", 2), ("jig1", "a0", 1)]
+    assert jig.virtual_map._flush_timer is None
+
+
+def test_actuation_flush_timer_during_close(tmp_path):
+    """A flush from the timer that is still running when close() is called"""
+    flushing = threading.Event()
+    release = threading.Event()
+
+    class BlockingLog(RelayWearLog):
+        def add(self, jig, counts):
+            if threading.current_thread() is not threading.main_thread():
+                flushing.set()
+                release.wait(timeout=5)
+            super().add(jig, counts)
+
+    jig = make_jig()
+    jig.virtual_map.enable_actuation_count(
+        BlockingLog(tmp_path / "wear.db"), "jig1", flush_interval=0.001
+    )
+    jig.mux.mux_a("sig_a1")
+    assert flushing.wait(timeout=5)
+
+    closer = threading.Thread(target=jig.close)
+    closer.start()
+    while jig.virtual_map._flush_timer is not None:
+        time.sleep(0.001)
+    release.set()
+    closer.join(timeout=5)
+
+    # the expiring timer didn't schedule another after close
+    assert jig.virtual_map._flush_timer is None
+    assert not [t for t in threading.enumerate() if isinstance(t, threading.Timer)]
+
+
+def test_relay_wear_report(tmp_path, capsys):
+    path = tmp_path / "wear.db"
+    RelayWearLog(path).add("jig1", {"RELAY_1": 10, "RELAY_2": 20})
+    main([str(path), "--top", "1"])
+    out = capsys.readouterr().out.splitlines()
+    assert out[0].split() == ["Jig", "Pin", "Actuations"]
+    assert out[1:] == ["jig1  RELAY_2  20"]
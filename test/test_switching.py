@@ -1,5 +1,5 @@
 from fixate._switching import (
-    _generate_bit_sets,
+    _tree_addresses,
     VirtualMux,
     _bit_generator,
     PinSetState,
@@ -15,34 +15,14 @@ from fixate._switching import (
     JigDriver,
 )
 
+import threading
+import time
 import pytest
 
 ################################################################
 # helper to generate data
 
 
-def test_generate_bit_sets_empty():
-    assert list(_generate_bit_sets([])) == []
-
-
-def test_generate_bit_sets_one_bit():
-    assert list(_generate_bit_sets(["b0"])) == [set(), {"b0"}]
-
-
-def test_generate_bit_sets_multiple_bits():
-    expected = [
-        set(),
-        {"b0"},
-        {"b1"},
-        {"b1", "b0"},
-        {"b2"},
-        {"b2", "b0"},
-        {"b2", "b1"},
-        {"b2", "b1", "b0"},
-    ]
-    assert list(_generate_bit_sets(["b0", "b1", "b2"])) == expected
-
-
 def test_bit_generator():
     """b1, b10, b100, b1000, ..."""
     bit_gen = _bit_generator()
@@ -207,6 +187,14 @@ def test_VirtualMux_larger_tree_map():
     }
 
 
+NESTED_MAP_TREE = (
+    "a0",
+    ("a1_b0", "a1_b1", "a1_b2", None),
+    ("a2_b0", ("a2_b1_c0", "a2_b1_c1"), "a2_b2", "a2_b3"),
+    "a3",
+)
+
+
 def test_VirtualMux_nested_tree_map():
     class NestedVirtualMux(VirtualMux):
         # Final mapping:
@@ -247,6 +235,117 @@ def test_VirtualMux_nested_tree_map():
     }
 
 
+def _generate_bit_sets(bits):
+    """
+    Create subsets of bits, representing bits of a list of integers
+
+    This is easier to explain with an example
+    list(generate_bit_set(["x0", "x1"])) -> [set(), {'x0'}, {'x1'}, {'x0', 'x1'}]
+    """
+    int_list = range(1 << len(bits)) if len(bits) != 0 else range(0)
+    return (
+        {bit for i, bit in enumerate(bits) if (1 << i) & index} for index in int_list
+    )
+
+
+def test_generate_bit_sets_empty():
+    assert list(_generate_bit_sets([])) == []
+
+
+def test_generate_bit_sets_one_bit():
+    assert list(_generate_bit_sets(["b0"])) == [set(), {"b0"}]
+
+
+def test_generate_bit_sets_multiple_bits():
+    expected = [
+        set(),
+        {"b0"},
+        {"b1"},
+        {"b1", "b0"},
+        {"b2"},
+        {"b2", "b0"},
+        {"b2", "b1"},
+        {"b2", "b1", "b0"},
+    ]
+    assert list(_generate_bit_sets(["b0", "b1", "b2"])) == expected
+
+
+def _reference_map_tree(tree, pins, fixed_pins=frozenset()):
+    """The original set based implementation of VirtualMux._map_tree"""
+    signal_map = dict()
+    bits_at_this_level = (len(tree) - 1).bit_length()
+    for signal_or_tree, pins_for_signal in zip(
+        tree, _generate_bit_sets(pins[:bits_at_this_level])
+    ):
+        if signal_or_tree is None:
+            continue
+        if isinstance(signal_or_tree, str):
+            signal_map[signal_or_tree] = frozenset(pins_for_signal) | fixed_pins
+        else:
+            signal_map.update(
+                _reference_map_tree(
+                    signal_or_tree,
+                    pins[bits_at_this_level:],
+                    frozenset(pins_for_signal) | fixed_pins,
+                )
+            )
+    return signal_map
+
+
+@pytest.mark.parametrize(
+    "pin_list, map_tree",
+    [
+        (("x0", "x1", "x2", "x3", "x4"), NESTED_MAP_TREE),
+        # not enough pins for the whole tree
+        (("x0", "x1", "x2"), NESTED_MAP_TREE),
+        (("x0",), ("a", "b", "c")),
+        # single entry levels
+        (("x0", "x1"), ("a", ("b",), ("c", ("d",)))),
+        (tuple(f"x{i}" for i in range(10)), tuple(f"s{i}" for i in range(1000))),
+    ],
+)
+def test_map_tree_matches_reference(pin_list, map_tree):
+    class Mux(VirtualMux):
+        pass
+
+    Mux.pin_list = pin_list
+    Mux.map_tree = map_tree
+    expected = _reference_map_tree(map_tree, pin_list)
+    expected[""] = frozenset()
+    assert Mux()._signal_map == expected
+
+
+def test_tree_addresses():
+    assert _tree_addresses(("a", "b", ("c", "d")), 3) == {
+        "a": 0,
+        "b": 1,
+        "c": 2,
+        "d": 6,
+    }
+
+
+def test_map_tree_cache_dir(tmp_path):
+    class Mux(VirtualMux):
+        pin_list = ("x0", "x1", "x2", "x3", "x4")
+        map_tree = NESTED_MAP_TREE
+        map_tree_cache_dir = tmp_path
+
+    expected = Mux()._signal_map
+    assert len(list(tmp_path.iterdir())) == 1
+
+    # The second instance should load from the cache
+    def fail(*args, **kwargs):
+        raise AssertionError("signal map should be loaded from the cache")
+
+    Mux._map_tree = fail
+    assert Mux()._signal_map == expected
+
+    # A change to the definition doesn't use the old cache file
+    Mux.pin_list = ("x0", "x1", "x2", "x3", "y4")
+    with pytest.raises(AssertionError):
+        Mux()
+
+
 def test_empty_signal_should_not_be_defined():
     class BadMux1(VirtualMux):
         pin_list = ["x"]
@@ -540,6 +639,147 @@ def test_virtual_address_map_multiple_handlers():
     assert xy.updates[2] == frozenset("x")
 
 
+def test_virtual_address_map_skips_unchanged_handlers():
+    ab = HandlerAB()
+    xy = HandlerXY()
+    vam = VirtualAddressMap([ab, xy])
+    vam.add_update(PinUpdate(final=PinSetState(on=frozenset("ax"))))
+    assert (len(ab.updates), len(xy.updates)) == (1, 1)
+
+    # only handler ab has a pin change
+    vam.add_update(PinUpdate(final=PinSetState(on=frozenset("b"))))
+    assert (len(ab.updates), len(xy.updates)) == (2, 1)
+    assert ab.updates[-1] == frozenset("ab")
+    assert (vam.handler_writes, vam.suppressed_writes) == (3, 1)
+
+
+def test_virtual_address_map_rewrites_after_handler_error():
+    class FailingHandler(TestHandler):
+        fail = True
+
+        def set_pins(self, pins):
+            if self.fail:
+                raise IOError
+            super().set_pins(pins)
+
+    handler = FailingHandler("ab")
+    vam = VirtualAddressMap([handler])
+    with pytest.raises(IOError):
+        vam.add_update(PinUpdate(final=PinSetState(on=frozenset("a"))))
+
+    # the active pins are unchanged by the retry, but the handler state is
+    # unknown, so it must still be written.
+    handler.fail = False
+    vam.add_update(PinUpdate(final=PinSetState(on=frozenset("ab"))))
+    vam.add_update(PinUpdate(final=PinSetState(off=frozenset("b"))))
+    assert handler.updates == [frozenset("ab"), frozenset("a")]
+
+
+class BarrierHandler(TestHandler):
+    """Each write waits for the other handlers, so it only passes if written concurrently"""
+
+    def __init__(self, pins, barrier, error=None):
+        super().__init__(pins)
+        self.barrier = barrier
+        self.error = error
+
+    def set_pins(self, pins):
+        self.barrier.wait(timeout=5)
+        super().set_pins(pins)
+        if self.error is not None:
+            raise self.error
+
+
+def test_virtual_address_map_concurrent_dispatch():
+    barrier = threading.Barrier(2)
+    ab = BarrierHandler("ab", barrier)
+    xy = BarrierHandler("xy", barrier)
+    vam = VirtualAddressMap([ab, xy], concurrent_dispatch=True)
+    vam.add_update(
+        PinUpdate(
+            setup=PinSetState(on=frozenset("ax")),
+            final=PinSetState(on=frozenset("by")),
+        )
+    )
+    assert ab.updates == [frozenset("a"), frozenset("ab")]
+    assert xy.updates == [frozenset("x"), frozenset("xy")]
+    vam.close()
+
+
+def test_virtual_address_map_concurrent_dispatch_error():
+    barrier = threading.Barrier(2)
+    ab = BarrierHandler("ab", barrier, error=IOError("ab"))
+    xy = BarrierHandler("xy", barrier, error=ValueError("xy"))
+    vam = VirtualAddressMap([ab, xy], concurrent_dispatch=True)
+    with pytest.raises(IOError, match="ab"):
+        vam.add_update(PinUpdate(final=PinSetState(on=frozenset("ax"))))
+    # Both handlers were still written before the error was raised
+    assert ab.updates == [frozenset("a")]
+    assert xy.updates == [frozenset("x")]
+    vam.close()
+
+
+def test_virtual_address_map_deferred_settle():
+    ab = HandlerAB()
+    vam = VirtualAddressMap([ab], deferred_settle=True)
+    update = PinUpdate(
+        setup=PinSetState(on=frozenset("a")),
+        final=PinSetState(on=frozenset("b")),
+        minimum_change_time=0.2,
+    )
+    start = time.monotonic()
+    vam.add_update(update)
+    # Only the setup phase is written, and we don't wait for the change time
+    assert ab.updates == [frozenset("a")]
+    assert time.monotonic() - start < 0.2
+    assert vam.settled_at() >= start + 0.2
+
+    vam.wait_settled()
+    assert time.monotonic() - start >= 0.2
+    assert ab.updates == [frozenset("a"), frozenset("ab")]
+    vam.close()
+
+
+def test_virtual_address_map_deferred_settle_timer():
+    ab = HandlerAB()
+    vam = VirtualAddressMap([ab], deferred_settle=True)
+    vam.add_update(
+        PinUpdate(
+            setup=PinSetState(on=frozenset("a")),
+            final=PinSetState(on=frozenset("b")),
+            minimum_change_time=0.01,
+        )
+    )
+    # without calling wait_settled, the timer thread writes the final phase.
+    deadline = time.monotonic() + 5.0
+    while len(ab.updates) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert ab.updates == [frozenset("a"), frozenset("ab")]
+
+
+def test_virtual_address_map_deferred_settle_error():
+    class FailOnSecondHandler(TestHandler):
+        def set_pins(self, pins):
+            super().set_pins(pins)
+            if len(self.updates) == 2:
+                raise IOError
+
+    handler = FailOnSecondHandler("ab")
+    vam = VirtualAddressMap([handler], deferred_settle=True)
+    vam.add_update(
+        PinUpdate(
+            setup=PinSetState(on=frozenset("a")),
+            final=PinSetState(on=frozenset("b")),
+            minimum_change_time=0.01,
+        )
+    )
+    time.sleep(0.1)
+    with pytest.raises(IOError):
+        vam.wait_settled()
+    # The error is only raised once
+    vam.wait_settled()
+
+
 # ###############################################################
 # Jig Driver
 
@@ -592,3 +832,616 @@ def test_pin_update_or():
         2.0,
     )
     assert expected == a | b
+
+
+# ###############################################################
+# Compiled pin masks
+
+
+class ValueHandler(PinValueAddressHandler):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values = []
+
+    def _update_output(self, value):
+        self.values.append(value)
+
+
+def test_virtual_address_map_pin_mask():
+    vam = VirtualAddressMap([HandlerAB(), HandlerXY()])
+    assert vam.pin_mask(frozenset("ax")) == 0b0101
+    assert vam.mask_pins(0b1010) == frozenset("by")
+    with pytest.raises(ValueError, match="unknown pin"):
+        vam.pin_mask(frozenset("az"))
+
+
+def test_virtual_address_map_unknown_pin_raises():
+    vam = VirtualAddressMap([HandlerAB()])
+    with pytest.raises(ValueError):
+        vam.add_update(PinUpdate(final=PinSetState(on=frozenset("x"))))
+
+
+def test_virtual_address_map_pin_value_handler_offset():
+    """A PinValueAddressHandler that isn't the first handler gets the right value"""
+    xy = ValueHandler("xy")
+    vam = VirtualAddressMap([HandlerAB(), xy])
+    vam.add_update(PinUpdate(final=PinSetState(on=frozenset("by"))))
+    assert xy.values == [0b10]
+    vam.add_update(PinUpdate(final=PinSetState(on=frozenset("x"), off=frozenset("y"))))
+    assert xy.values == [0b10, 0b01]
+
+
+def HandlerA0A1():
+    return TestHandler(("a0", "a1"))
+
+
+@pytest.mark.parametrize("compiled", [False, True])
+def test_jig_driver_compiled(compiled):
+    class RMMux(RelayMatrixMux):
+        pin_list = ("a", "b")
+        map_list = (("sig1", "a"), ("sig2", "b"))
+
+    class Group(MuxGroup):
+        def __init__(self):
+            self.mux_a = MuxA()
+            self.rm = RMMux()
+
+    rm_handler = ValueHandler("ab")
+    a_handler = HandlerA0A1()
+    jig = JigDriver(Group, [a_handler, rm_handler], compiled=compiled)
+    jig.mux.mux_a("sig_a2", trigger_update=False)
+    jig.mux.rm("sig2")
+    assert jig.active_pins() == frozenset({"a1", "b"})
+    assert a_handler.updates[-1] == frozenset({"a1"})
+    # the break-before-make setup phase doesn't change any pins, so isn't sent
+    assert rm_handler.values == [0b10]
+
+    jig.debug_set_pins(on={"a0"}, off={"a1"})
+    assert jig.active_pins() == frozenset({"a0", "b"})
+    jig.reset()
+    assert jig.active_pins() == frozenset()
+
+
+def test_virtual_mux_transition_cache():
+    updates = []
+    mux_a = MuxA(lambda x, y: updates.append((x, y)))
+    for _ in range(3):
+        mux_a("sig_a1")
+        mux_a("sig_a2")
+
+    # ""->sig_a1, sig_a1->sig_a2 and sig_a2->sig_a1 are calculated once each
+    info = mux_a.transition_cache_info()
+    assert (info.hits, info.misses) == (3, 3)
+    assert updates[1] == updates[3] == updates[5]
+
+
+def test_virtual_mux_transition_cache_disabled():
+    class StatefulMux(MuxA):
+        transition_cache_size = 0
+        count = 0
+
+        def _calculate_pins(self, old_signal, new_signal):
+            self.count += 1
+            return super()._calculate_pins(old_signal, new_signal)
+
+    mux = StatefulMux(lambda x, y: None)
+    mux("sig_a1")
+    mux("sig_a1")
+    assert mux.count == 2
+    assert mux.transition_cache_info().hits == 0
+
+
+class MuxB(VirtualMux):
+    pin_list = ("b0", "b1")
+    map_list = (("sig_b1", "b0"), ("sig_b2", "b1"))
+
+
+class GroupAB(MuxGroup):
+    def __init__(self):
+        self.mux_a = MuxA()
+        self.mux_b = MuxB()
+
+
+@pytest.mark.parametrize("compiled", [False, True])
+def test_jig_driver_switch_after_close(compiled):
+    handler = TestHandler(("a0", "a1", "b0", "b1"))
+    jig = JigDriver(GroupAB, [handler], compiled=compiled)
+    jig.mux.mux_a("sig_a1")
+    jig.close()
+
+    # the handler may reopen with the relays in any state
+    jig.mux.mux_a("sig_a1")
+    assert handler.updates == [frozenset({"a0", "a1"})] * 2
+
+
+def test_jig_driver_transaction():
+    handler = TestHandler(("a0", "a1", "b0", "b1", "x"))
+    jig = JigDriver(GroupAB, [handler])
+    jig.mux.mux_a("sig_a2")
+    handler.updates.clear()
+
+    with jig.transaction():
+        jig.mux.mux_a("sig_a1")
+        jig.mux.mux_b("sig_b1")
+        jig.mux.mux_a("")
+        jig.mux.mux_b("sig_b2")
+        jig.debug_set_pin("x", True)
+        assert handler.updates == []
+
+    # intermediate states are collapsed into a single write
+    assert handler.updates == [frozenset({"b1", "x"})]
+    assert jig.mux.active_signals() == ["MuxA('')", "MuxB('sig_b2')"]
+
+
+def test_jig_driver_transaction_rollback():
+    handler = TestHandler(("a0", "a1", "b0", "b1"))
+    jig = JigDriver(GroupAB, [handler])
+    jig.mux.mux_a("sig_a2")
+
+    with pytest.raises(RuntimeError):
+        with jig.transaction():
+            jig.mux.mux_a("sig_a1")
+            jig.mux.mux_b("sig_b1")
+            raise RuntimeError
+
+    assert handler.updates == [frozenset({"a1"})]
+    assert jig.mux.active_signals() == ["MuxA('sig_a2')", "MuxB('')"]
+
+    # muxes behave normally after the transaction
+    jig.mux.mux_b("sig_b1")
+    assert jig.active_pins() == frozenset({"a1", "b0"})
+
+
+def test_jig_driver_nested_transaction():
+    handler = TestHandler(("a0", "a1", "b0", "b1"))
+    jig = JigDriver(GroupAB, [handler], compiled=True)
+
+    with jig.transaction():
+        jig.mux.mux_a("sig_a1")
+        with jig.transaction():
+            jig.mux.mux_b("sig_b1")
+            jig.mux.mux_a("sig_a2")
+        assert handler.updates == []
+
+    assert handler.updates == [frozenset({"a1", "b0"})]
+
+
+def test_jig_driver_nested_transaction_rollback():
+    handler = TestHandler(("a0", "a1", "b0", "b1"))
+    jig = JigDriver(GroupAB, [handler], compiled=True)
+    jig.mux.mux_b("sig_b2")
+    handler.updates.clear()
+
+    with jig.transaction():
+        jig.mux.mux_a("sig_a1")
+        with pytest.raises(RuntimeError):
+            with jig.transaction():
+                jig.mux.mux_a("sig_a2")
+                jig.mux.mux_b("sig_b1")
+                jig.debug_set_pin("a1", True)
+                raise RuntimeError
+        # the inner block is undone, the outer block's changes are kept
+        assert jig.mux.active_signals() == ["MuxA('sig_a1')", "MuxB('sig_b2')"]
+
+    assert handler.updates == [frozenset({"a0", "a1", "b1"})]
+    assert jig.active_pins() == frozenset({"a0", "a1", "b1"})
+
+    # both muxes switch normally afterwards
+    jig.mux.mux_a("sig_a2")
+    jig.mux.mux_b("sig_b1")
+    assert jig.active_pins() == frozenset({"a1", "b0"})
+
+
+def test_trace_disabled_by_default():
+    jig = JigDriver(GroupAB, [TestHandler(("a0", "a1", "b0", "b1"))])
+    assert jig.virtual_map._tracer is None
+
+
+@pytest.mark.parametrize("compiled", [False, True])
+def test_trace_records_update(compiled):
+    handlers = [TestHandler(("a0", "a1")), TestHandler(("b0", "b1"))]
+    jig = JigDriver(GroupAB, handlers, compiled=compiled)
+    tracer = jig.virtual_map.enable_trace()
+
+    jig.mux.mux_a("sig_a1")
+    jig.mux.mux_a("sig_a2")
+
+    first, second = tracer.records()
+    assert first.sources == ("MuxA('sig_a1')",)
+    assert first.final == PinSetState(on=frozenset({"a0", "a1"}))
+    assert second.final == PinSetState(off=frozenset({"a0"}))
+    # every handler is written the first time, then only when its pins change
+    assert len(first.handler_writes) == 2
+    assert [w.handler for w in second.handler_writes] == ["0:TestHandler"]
+    assert second.start <= second.handler_writes[0].start <= second.end
+
+
+def test_trace_collated_sources_and_settle():
+    class SlowMuxA(RelayMatrixMux):
+        clearing_time = 0.01
+        pin_list = ("a0", "a1")
+        map_list = (("sig_a1", "a0"), ("sig_a2", "a1"))
+
+    class Group(MuxGroup):
+        def __init__(self):
+            self.mux_a = SlowMuxA()
+            self.mux_b = MuxB()
+
+    jig = JigDriver(Group, [TestHandler(("a0", "a1", "b0", "b1"))])
+    tracer = jig.virtual_map.enable_trace()
+    jig.mux.mux_a("sig_a1")
+    with jig.transaction():
+        jig.mux.mux_b("sig_b1")
+        jig.mux.mux_a("sig_a2")
+
+    record = tracer.records()[-1]
+    assert set(record.sources) == {"SlowMuxA('sig_a2')", "MuxB('sig_b1')"}
+    # only pins that actually change are recorded in each phase
+    assert record.setup == PinSetState(off=frozenset({"a0"}))
+    assert record.final == PinSetState(on=frozenset({"a1", "b0"}))
+    assert record.settle_time >= 0.01
+    assert [w.phase for w in record.handler_writes] == ["setup", "final"]
+
+
+def test_trace_ring_buffer():
+    jig = JigDriver(GroupAB, [TestHandler(("a0", "a1", "b0", "b1"))])
+    tracer = jig.virtual_map.enable_trace(max_records=3)
+    for signal in ["sig_a1", "sig_a2", "", "sig_a1", "sig_a2"]:
+        jig.mux.mux_a(signal)
+    assert [r.sources for r in tracer.records()] == [
+        ("MuxA('')",),
+        ("MuxA('sig_a1')",),
+        ("MuxA('sig_a2')",),
+    ]
+
+    jig.virtual_map.disable_trace()
+    jig.mux.mux_a("sig_a1")
+    assert len(tracer.records()) == 3
+
+
+def test_trace_export(tmp_path):
+    import json
+
+    jig = JigDriver(GroupAB, [TestHandler(("a0", "a1")), TestHandler(("b0", "b1"))])
+    tracer = jig.virtual_map.enable_trace()
+    jig.mux.mux_a("sig_a1")
+    jig.mux.mux_b("sig_b2")
+
+    tracer.write_json_lines(tmp_path / "trace.jsonl")
+    lines = (tmp_path / "trace.jsonl").read_text().splitlines()
+    assert [json.loads(line)["final"]["on"] for line in lines] == [
+        ["a0", "a1"],
+        ["b1"],
+    ]
+
+    tracer.write_chrome_trace(tmp_path / "trace.json")
+    events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    names = {e["args"]["name"] for e in events if e["ph"] == "M"}
+    assert names == {"update", "settle", "0:TestHandler", "1:TestHandler"}
+    assert [e["name"] for e in events if e["ph"] == "X" and e["tid"] == 0] == [
+        "MuxA('sig_a1')",
+        "MuxB('sig_b2')",
+    ]
+
+
+def test_jig_driver_route():
+    handler = TestHandler(("a0", "a1", "b0", "b1"))
+    jig = JigDriver(GroupAB, [handler])
+    jig.route("sig_b2")
+    jig.route("sig_a1")
+    assert jig.mux.active_signals() == ["MuxA('sig_a1')", "MuxB('sig_b2')"]
+    assert jig.active_pins() == frozenset({"a0", "a1", "b1"})
+
+    with pytest.raises(ValueError, match="not defined"):
+        jig.route("sig_c1")
+    with pytest.raises(ValueError, match="not defined"):
+        jig.route("")
+
+
+def test_jig_driver_route_ambiguous():
+    class MuxC(VirtualMux):
+        pin_list = ("c0",)
+        map_list = (("sig_a1", "c0"), ("sig_c1", "c0"))
+
+    class Group(MuxGroup):
+        def __init__(self):
+            self.mux_a = MuxA()
+            self.mux_c = MuxC()
+
+    jig = JigDriver(Group, [TestHandler(("a0", "a1", "c0"))])
+    assert jig.ambiguous_signals() == {"sig_a1": (jig.mux.mux_a, jig.mux.mux_c)}
+    with pytest.raises(ValueError, match="ambiguous.*MuxA, MuxC"):
+        jig.route("sig_a1")
+    jig.route("sig_c1")
+    assert jig.active_pins() == frozenset({"c0"})
+
+
+class MuxShared(VirtualMux):
+    """Shares pin a1 with MuxA"""
+
+    pin_list = ("a1", "s0")
+    map_list = (("sig_s1", "s0"), ("sig_s2", "a1"))
+
+
+class GroupShared(MuxGroup):
+    def __init__(self):
+        self.mux_a = MuxA()
+        self.mux_b = MuxB()
+        self.mux_s = MuxShared()
+
+
+def test_jig_driver_shared_pins():
+    jig = JigDriver(GroupShared, [TestHandler(("a0", "a1", "b0", "b1", "s0"))])
+    assert jig.shared_pins() == {"a1": (jig.mux.mux_a, jig.mux.mux_s)}
+
+    jig = JigDriver(GroupAB, [TestHandler(("a0", "a1", "b0", "b1"))])
+    assert jig.shared_pins() == {}
+
+
+@pytest.mark.parametrize("compiled", [False, True])
+def test_jig_driver_shared_pin_conflict(compiled):
+    jig = JigDriver(
+        GroupShared, [TestHandler(("a0", "a1", "b0", "b1", "s0"))], compiled=compiled
+    )
+    jig.mux.mux_a("sig_a1", trigger_update=False)
+    jig.mux.mux_b("sig_b1", trigger_update=False)
+    with pytest.raises(ValueError, match="on and off"):
+        jig.mux.mux_s("sig_s1")
+
+
+@pytest.mark.parametrize("compiled", [False, True])
+def test_jig_driver_exclusive_mux_conflicts(compiled):
+    handler = TestHandler(("a0", "a1", "b0", "b1"))
+    jig = JigDriver(GroupAB, [handler], compiled=compiled)
+
+    # exclusive muxes are not checked against each other
+    jig.mux.mux_a("sig_a1", trigger_update=False)
+    jig.mux.mux_b("sig_b1")
+    assert jig.virtual_map._check_conflicts is False
+    assert jig.active_pins() == frozenset({"a0", "a1", "b0"})
+
+    # but the same mux twice, or a debug update, is still checked
+    jig.mux.mux_a("sig_a2", trigger_update=False)
+    with pytest.raises(ValueError, match="on and off"):
+        jig.mux.mux_a("")
+
+    jig.mux.mux_b("sig_b2", trigger_update=False)
+    with pytest.raises(ValueError, match="on and off"):
+        jig.debug_set_pins(on=["b0"])
+
+
+def test_virtual_mux_update_on_and_off_raises():
+    class BadMux(VirtualMux):
+        pin_list = ("x0",)
+        map_list = (("sig_x", "x0"),)
+
+        def _calculate_pins(self, old_signal, new_signal):
+            return PinSetState(), PinSetState(off=self._pin_set, on=self._pin_set)
+
+    with pytest.raises(ValueError, match="BadMux\\('sig_x'\\) turns"):
+        BadMux(lambda update, trigger: None)("sig_x")
+
+
+@pytest.mark.parametrize("compiled", [False, True])
+def test_jig_driver_snapshot_restore(compiled):
+    handler = TestHandler(("a0", "a1", "b0", "b1", "x"))
+    jig = JigDriver(GroupAB, [handler], compiled=compiled)
+    jig.mux.mux_a("sig_a1")
+    jig.debug_set_pin("x", True)
+    snapshot = jig.snapshot()
+    assert snapshot.active_pins == frozenset({"a0", "a1", "x"})
+
+    jig.mux.mux_a("sig_a2")
+    jig.mux.mux_b("sig_b1")
+    jig.debug_set_pin("x", False)
+    handler.updates.clear()
+
+    jig.restore(snapshot)
+    # one update, which only changes the pins that differ
+    assert handler.updates == [frozenset({"a0", "a1", "x"})]
+    assert jig.mux.active_signals() == ["MuxA('sig_a1')", "MuxB('')"]
+
+    # restoring again has nothing to do
+    jig.restore(snapshot)
+    assert len(handler.updates) == 1
+
+    # muxes keep working from the restored state
+    jig.mux.mux_b("sig_b2")
+    assert jig.active_pins() == frozenset({"a0", "a1", "b1", "x"})
+
+
+def test_jig_driver_restore_break_before_make():
+    class RelayMuxA(RelayMatrixMux):
+        clearing_time = 0.01
+        pin_list = ("a0", "a1")
+        map_list = (("sig_a1", "a0"), ("sig_a2", "a1"))
+
+    class Group(MuxGroup):
+        def __init__(self):
+            self.mux_a = RelayMuxA()
+
+    handler = TestHandler(("a0", "a1"))
+    jig = JigDriver(Group, [handler])
+    jig.mux.mux_a("sig_a1")
+    tracer = jig.virtual_map.enable_trace()
+    with jig.preserve_state():
+        jig.mux.mux_a("sig_a2")
+        assert jig.active_pins() == frozenset({"a1"})
+
+    assert jig.active_pins() == frozenset({"a0"})
+    assert handler.updates[-2:] == [frozenset(), frozenset({"a0"})]
+    restore = tracer.records()[-1]
+    assert restore.sources == ("restore",)
+    assert restore.settle_time >= 0.01
+
+
+def test_jig_driver_snapshot_includes_pending():
+    handler = TestHandler(("a0", "a1", "b0", "b1"))
+    jig = JigDriver(GroupAB, [handler])
+    jig.mux.mux_a("sig_a1", trigger_update=False)
+    snapshot = jig.snapshot()
+    assert snapshot.active_pins == frozenset({"a0", "a1"})
+
+    # restore supersedes the pending update
+    jig.mux.mux_b("sig_b1", trigger_update=False)
+    jig.restore(snapshot)
+    assert handler.updates == [frozenset({"a0", "a1"})]
+    assert jig.mux.active_signals() == ["MuxA('sig_a1')", "MuxB('')"]
+
+
+def test_jig_driver_preserve_state_nested_and_raises():
+    handler = TestHandler(("a0", "a1", "b0", "b1"))
+    jig = JigDriver(GroupAB, [handler])
+    with pytest.raises(RuntimeError):
+        with jig.preserve_state():
+            jig.mux.mux_a("sig_a1")
+            with jig.preserve_state():
+                jig.mux.mux_b("sig_b1")
+            assert jig.active_pins() == frozenset({"a0", "a1"})
+            raise RuntimeError
+    assert jig.active_pins() == frozenset()
+
+
+def test_jig_driver_snapshot_inside_transaction():
+    handler = TestHandler(("a0", "a1", "b0", "b1"))
+    jig = JigDriver(GroupAB, [handler])
+    snapshot = jig.snapshot()
+    entered = False
+
+    with jig.transaction():
+        jig.mux.mux_a("sig_a1")
+        with pytest.raises(RuntimeError, match="snapshot inside a transaction"):
+            jig.snapshot()
+        # fails on entry, rather than restoring mismatched signals and pins
+        with pytest.raises(RuntimeError, match="snapshot inside a transaction"):
+            with jig.preserve_state():
+                entered = True
+        with pytest.raises(RuntimeError, match="restore a snapshot inside"):
+            jig.restore(snapshot)
+    assert not entered
+    # the transaction is unaffected
+    assert handler.updates == [frozenset({"a0", "a1"})]
+
+
+def test_jig_driver_preserve_state_around_transaction():
+    handler = TestHandler(("a0", "a1", "b0", "b1"))
+    jig = JigDriver(GroupAB, [handler])
+    jig.mux.mux_b("sig_b1")
+
+    with jig.preserve_state():
+        with jig.transaction():
+            jig.mux.mux_a("sig_a1")
+            jig.mux.mux_b("sig_b2")
+        assert jig.active_pins() == frozenset({"a0", "a1", "b1"})
+
+    assert jig.active_pins() == frozenset({"b0"})
+    assert jig.mux.active_signals() == ["MuxA('')", "MuxB('sig_b1')"]
+
+
+class InputHandler(PinValueAddressHandler):
+    def __init__(self, pins, input_pins):
+        super().__init__(pins, input_pins)
+        self.input_value = 0
+        self.reads = 0
+
+    def _update_output(self, value):
+        pass
+
+    def _read_input(self):
+        self.reads += 1
+        return self.input_value
+
+
+class PinInputHandler(AddressHandler):
+    """Reads by pin name, rather than value"""
+
+    def __init__(self, input_pins):
+        super().__init__((), input_pins)
+        self.active = set()
+
+    def read_pins(self):
+        return self.active
+
+
+def test_virtual_address_map_read_inputs():
+    value_handler = InputHandler(("a0",), ("in0", "in1", "in2"))
+    pin_handler = PinInputHandler(("in3",))
+    vam = VirtualAddressMap([value_handler, AddressHandler(("b0",)), pin_handler])
+
+    assert vam.active_inputs() == frozenset()
+    value_handler.input_value = 0b101
+    pin_handler.active = {"in3"}
+    assert vam.active_inputs() == frozenset({"in0", "in2", "in3"})
+    assert vam.read_input("in2") is True
+    assert vam.read_input("in1") is False
+    # every read goes to the handler when there is no ttl
+    assert value_handler.reads == 4
+
+    with pytest.raises(ValueError, match="unknown input pin 'a0'"):
+        vam.read_input("a0")
+
+
+def test_virtual_address_map_duplicate_input_raises():
+    with pytest.raises(ValueError, match="'in0' is defined by more than one"):
+        VirtualAddressMap([PinInputHandler(("in0",)), PinInputHandler(("in0",))])
+
+
+def test_jig_driver_input_ttl():
+    handler = InputHandler(("a0", "a1", "b0", "b1"), ("ready",))
+    jig = JigDriver(GroupAB, [handler], input_ttl=60)
+    assert jig.read_input("ready") is False
+    handler.input_value = 1
+    # cached
+    assert jig.read_input("ready") is False
+    assert handler.reads == 1
+    assert jig.read_input("ready", max_age=0) is True
+    jig.virtual_map.update_input()
+    assert handler.reads == 3
+
+
+def test_virtual_address_map_input_callbacks():
+    handler = InputHandler((), ("in0", "in1"))
+    vam = VirtualAddressMap([handler])
+    changes = []
+    ready_changes = []
+    vam.add_input_callback(lambda pin, value: changes.append((pin, value)))
+    vam.add_input_callback(
+        lambda pin, value: ready_changes.append((pin, value)), pins=["in1"]
+    )
+
+    # no callback for the first read, there is nothing to compare with
+    handler.input_value = 0b01
+    vam.update_input()
+    handler.input_value = 0b10
+    vam.update_input()
+    vam.update_input()
+    assert changes == [("in0", False), ("in1", True)]
+    assert ready_changes == [("in1", True)]
+
+    with pytest.raises(ValueError, match="unknown input pin"):
+        vam.add_input_callback(print, pins=["nope"])
+
+
+def test_virtual_address_map_input_poller():
+    handler = InputHandler((), ("ready",))
+    vam = VirtualAddressMap([handler])
+    became_ready = threading.Event()
+    vam.add_input_callback(lambda pin, value: value and became_ready.set())
+
+    # read the starting value, so the poller reports the change
+    vam.update_input()
+    vam.start_input_poller(0.001)
+    handler.input_value = 1
+    assert became_ready.wait(1)
+    vam.close()
+    assert vam._poller is None
+
+
+def test_virtual_address_map_input_poller_error():
+    handler = InputHandler((), ("ready",))
+    handler._read_input = lambda: 1 / 0
+    vam = VirtualAddressMap([handler])
+    vam.start_input_poller(0.001)
+    vam._poller.join(1)
+    with pytest.raises(ZeroDivisionError):
+        vam.read_input("ready")